@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import User, Admin, Customer, Restaurant, Reservation, Review, Tags
+from .models import User, Admin, Customer, Restaurant, Reservation, Review, Tags, Table, OutboxEmail
 from django.contrib.auth.admin import UserAdmin
 
 # Register your models here.
@@ -13,10 +13,36 @@ class CustomUserAdmin(UserAdmin):
     list_display = ['username', 'email', 'role', 'banned', 'is_staff', 'is_active']
     list_filter = ['role', 'banned', 'is_staff', 'is_active']
 
+class ReviewAdmin(admin.ModelAdmin):
+    # Review.__str__ reads customer.user and restaurant
+    list_select_related = ['customer__user', 'restaurant']
+
+class TableAdmin(admin.ModelAdmin):
+    list_display = ['number', 'restaurant', 'capacity', 'x', 'y', 'is_active']
+    list_filter = ['is_active', 'capacity']
+    list_select_related = ['restaurant']
+    search_fields = ['restaurant__name', 'number']
+
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'restaurant', 'date', 'time', 'guest_count', 'status']
+    list_filter = ['status', 'date']
+    # Reservation.__str__ reads restaurant
+    list_select_related = ['restaurant']
+    search_fields = ['name', 'email', 'restaurant__name']
+    raw_id_fields = ['customer', 'restaurant']
+
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to_email', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['to_email', 'subject']
+    readonly_fields = ['created_at', 'sent_at']
+
 admin.site.register(User, CustomUserAdmin)
 admin.site.register(Admin)
 admin.site.register(Customer)
 admin.site.register(Restaurant)
-admin.site.register(Reservation)
-admin.site.register(Review)
-admin.site.register(Tags)
\ No newline at end of file
+admin.site.register(Reservation, ReservationAdmin)
+admin.site.register(Review, ReviewAdmin)
+admin.site.register(Tags)
+admin.site.register(Table, TableAdmin)
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RrAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rr_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,44 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from rr_app.services.reservation_lifecycle import LIFECYCLE_BATCH_SIZE, advance_reservations
+
+
+class Command(BaseCommand):
+    help = 'Complete reservations whose sitting has ended, in batches (safe to run concurrently)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=LIFECYCLE_BATCH_SIZE,
+            help=f'Reservations moved per statement (default {LIFECYCLE_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop each transition after this many batches'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        moved = Counter()
+        started = time.perf_counter()
+
+        for batch in advance_reservations(options['batch_size'], options['max_batches']):
+            transition = f'{batch.transition.from_status} -> {batch.transition.to_status}'
+            moved[transition] += batch.count
+            if batch.count and options['verbosity'] > 1:
+                self.stdout.write(f'{transition}: {batch.count} reservations in {batch.seconds * 1000:.0f} ms')
+
+        elapsed = time.perf_counter() - started
+        total = sum(moved.values())
+        for transition, count in moved.items():
+            self.stdout.write(f'{transition}: {count}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully moved {total} reservations in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f}/s)'
+            )
+        )
@@ -0,0 +1,51 @@
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rr_app.models import Restaurant
+from rr_app.services.reservation_export import EXPORT_FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Export a restaurant's reservations for a date range as CSV or iCalendar, streamed row by row"
+
+    def add_arguments(self, parser):
+        parser.add_argument('restaurant', type=int, help='Restaurant id')
+        parser.add_argument('--start', type=date.fromisoformat, help='First date, YYYY-MM-DD (default today)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last date, YYYY-MM-DD (default --start)')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument(
+            '--status',
+            action='append',
+            dest='statuses',
+            help='Only export reservations with this status (can be repeated)'
+        )
+        parser.add_argument('--output', '-o', help='File to write (default stdout)')
+
+    def handle(self, *args, **options):
+        restaurant = Restaurant.objects.filter(id=options['restaurant']).only('id', 'name').first()
+        if restaurant is None:
+            raise CommandError(f"Restaurant {options['restaurant']} does not exist")
+        start = options['start'] or timezone.localdate()
+        end = options['end'] or start
+        if end < start:
+            raise CommandError('--end must not be before --start')
+
+        lines = export_lines(
+            options['format'], restaurant.id, start, end, options['statuses'],
+            calendar_name=f'{restaurant.name} reservations',
+        )
+        # newline='' keeps the CRLF line endings of both formats intact
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for line in lines:
+                output.write(line)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if options['output']:
+            self.stdout.write(
+                self.style.SUCCESS(f"Successfully exported {restaurant.name} reservations to {options['output']}")
+            )
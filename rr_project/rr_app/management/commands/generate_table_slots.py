@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from rr_app.services.slots import SLOT_HORIZON_DAYS, generate_slots, prune_slots
+
+
+class Command(BaseCommand):
+    help = 'Generate the bookable table slots for the coming days from restaurant opening hours'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=SLOT_HORIZON_DAYS,
+            help=f'Number of days ahead to generate, starting today (default {SLOT_HORIZON_DAYS})',
+        )
+        parser.add_argument(
+            '--restaurant',
+            type=int,
+            action='append',
+            dest='restaurants',
+            help='Only generate slots for this restaurant id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        pruned = prune_slots()
+        created = generate_slots(days=options['days'], restaurant_ids=options['restaurants'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully generated {created} table slots ({pruned} past slots removed)')
+        )
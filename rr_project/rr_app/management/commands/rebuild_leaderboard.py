@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from rr_app.services.leaderboard import refresh_leaderboard
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached top restaurants leaderboard shown on the dashboard'
+
+    def handle(self, *args, **options):
+        state = refresh_leaderboard()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully ranked {len(state["ranking"])} restaurants for the leaderboard')
+        )
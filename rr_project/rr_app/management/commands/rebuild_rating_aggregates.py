@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rr_app.models import Restaurant
+from rr_app.services.restaurant_service import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored avg_rating, review_count and rating_sum of restaurants from their reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restaurant',
+            type=int,
+            action='append',
+            help='Only rebuild the given restaurant id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.all()
+        if options['restaurant']:
+            restaurants = restaurants.filter(id__in=options['restaurant'])
+
+        with transaction.atomic():
+            updated_count = rebuild_rating_aggregates(restaurants)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt rating aggregates for {updated_count} restaurants')
+        )
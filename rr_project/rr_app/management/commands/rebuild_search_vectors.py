@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from rr_app.services.restaurant_service import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored full-text search vector of every restaurant'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restaurant',
+            type=int,
+            action='append',
+            help='Only rebuild the given restaurant id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        updated_count = update_search_vectors(options['restaurant'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully rebuilt search vectors for {updated_count} restaurants')
+        )
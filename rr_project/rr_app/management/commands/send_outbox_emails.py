@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rr_app.services.email_outbox import OUTBOX_BATCH_SIZE, drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send the queued outbox emails in batches over one SMTP connection, with retries and dead-lettering'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help=f'Emails claimed per batch (default {OUTBOX_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of exiting once it is empty'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between polls with --loop (default 5)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent = retried = dead = expired = 0
+            for result in drain_outbox(options['batch_size'], options['max_batches']):
+                sent += result.sent
+                retried += result.retried
+                dead += result.dead
+                expired += result.expired
+
+            if sent or retried or dead or expired or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Successfully sent {sent} emails ({retried} to retry, {dead} dead-lettered, {expired} expired)'
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .utils.query_budget import (
+    N_PLUS_ONE_THRESHOLD, QueryBudgetExceeded, QueryRecorder, get_query_budget,
+)
+
+
+logger = logging.getLogger('rr_app.queries')
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the SQL queries of every request, compare them with the view's
+    @query_budget and look for repeated query shapes (N+1).
+
+    Violations are logged as warnings, or raised as QueryBudgetExceeded when
+    QUERY_BUDGET_STRICT is set (meant for the test settings). Enabled with
+    QUERY_BUDGET_ENABLED, which defaults to DEBUG.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.strict = getattr(settings, 'QUERY_BUDGET_STRICT', False)
+        self.threshold = getattr(settings, 'QUERY_BUDGET_N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+
+        match = request.resolver_match
+        if match is None:
+            return response
+
+        response['X-Query-Count'] = str(recorder.count)
+        problems = recorder.problems(get_query_budget(match.func), self.threshold)
+        if problems:
+            message = f'{request.method} {request.path} ({match.view_name}): ' + '; '.join(problems)
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
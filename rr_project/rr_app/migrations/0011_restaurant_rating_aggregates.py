@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0010_alter_restaurant_price_max_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='avg_rating',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_sum',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['-avg_rating', '-created_at'], name='restaurant_rating_idx'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE rr_app_restaurant AS r
+                SET review_count = s.review_count,
+                    rating_sum = s.rating_sum,
+                    avg_rating = ROUND(s.rating_sum / s.review_count, 2)
+                FROM (
+                    SELECT restaurant_id, COUNT(*) AS review_count, SUM(rating) AS rating_sum
+                    FROM rr_app_review
+                    WHERE restaurant_id IS NOT NULL
+                    GROUP BY restaurant_id
+                ) AS s
+                WHERE s.restaurant_id = r.id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:17
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0011_restaurant_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='restaurant_search_idx'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE rr_app_restaurant AS r
+                SET search_vector =
+                    setweight(to_tsvector('english', COALESCE(r.name, '')), 'A') ||
+                    setweight(to_tsvector('english',
+                        COALESCE((
+                            SELECT string_agg(c.name, ' ')
+                            FROM rr_app_cuisine c
+                            JOIN rr_app_cuisine_restaurant cr ON cr.cuisine_id = c.id
+                            WHERE cr.restaurant_id = r.id
+                        ), '') || ' ' ||
+                        COALESCE((
+                            SELECT string_agg(t.tag, ' ')
+                            FROM rr_app_tags t
+                            JOIN rr_app_tags_restaurants tr ON tr.tags_id = t.id
+                            WHERE tr.restaurant_id = r.id
+                        ), '')
+                    ), 'B') ||
+                    setweight(to_tsvector('english', COALESCE(r.description, '')), 'C') ||
+                    setweight(to_tsvector('english', COALESCE(r.address, '')), 'D');
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
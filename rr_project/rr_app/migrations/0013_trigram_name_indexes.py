@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:18
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0012_restaurant_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='cuisine',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='cuisine_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='restaurant_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0013_trigram_name_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='restaurant',
+            name='restaurant_rating_idx',
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['customer', '-date', '-id'], name='reservation_customer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['-avg_rating', '-id'], name='restaurant_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['restaurant', '-rating', '-id'], name='review_restaurant_rating_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:24
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def order_price_bounds(apps, schema_editor):
+    """numrange() refuses a lower bound above the upper one; swap inverted prices first"""
+    Restaurant = apps.get_model('rr_app', 'Restaurant')
+    # Postgres evaluates every SET expression against the old row, so this swaps the two
+    Restaurant.objects.filter(price_max__gt=0, price_min__gt=models.F('price_max')).update(
+        price_min=models.F('price_max'), price_max=models.F('price_min'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0014_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(order_price_bounds, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='restaurant',
+            name='price_range',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(price_max__gt=0, then=models.Func(models.F('price_min'), models.F('price_max'), models.Value('[]'), function='numrange', output_field=django.contrib.postgres.fields.ranges.DecimalRangeField())), default=None, output_field=django.contrib.postgres.fields.ranges.DecimalRangeField()), output_field=django.contrib.postgres.fields.ranges.DecimalRangeField()),
+        ),
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['price_range'], name='restaurant_price_range_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0015_restaurant_price_range'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='restaurant',
+            index=models.Index(fields=['opening_time', 'closing_time'], name='restaurant_hours_idx'),
+        ),
+    ]
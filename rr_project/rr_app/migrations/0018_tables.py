@@ -0,0 +1,66 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:31
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The layout that used to be hardcoded in restaurant_detail.html: (number, capacity, x, y).
+# Frozen here so the migration keeps doing what it did; the layout new
+# restaurants get is services/floor_plan.DEFAULT_TABLE_LAYOUT.
+DEFAULT_LAYOUT = [
+    ('1', 2, 100, 80),
+    ('2', 2, 200, 80),
+    ('3', 4, 80, 180),
+    ('4', 4, 200, 180),
+    ('5', 4, 140, 300),
+    ('6', 6, 360, 200),
+    ('7', 6, 320, 350),
+    ('8', 8, 340, 120),
+]
+
+
+def create_default_tables(apps, schema_editor):
+    Restaurant = apps.get_model('rr_app', 'Restaurant')
+    Table = apps.get_model('rr_app', 'Table')
+    Table.objects.bulk_create(
+        Table(restaurant_id=restaurant_id, number=number, capacity=capacity, x=x, y=y)
+        for restaurant_id in Restaurant.objects.values_list('id', flat=True).iterator()
+        for number, capacity, x, y in DEFAULT_LAYOUT
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0017_review_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reservation',
+            name='duration_minutes',
+            field=models.PositiveSmallIntegerField(default=120, help_text='How long the tables are held'),
+        ),
+        migrations.CreateModel(
+            name='Table',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.CharField(max_length=10)),
+                ('capacity', models.PositiveSmallIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('x', models.PositiveIntegerField(default=0)),
+                ('y', models.PositiveIntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True, help_text='Inactive tables are hidden from the floor plan')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tables', to='rr_app.restaurant')),
+            ],
+            options={
+                'ordering': ['restaurant', 'capacity', 'number'],
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'number'), name='table_unique_number')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(fields=['restaurant', 'date'], name='reservation_rest_date_idx'),
+        ),
+        migrations.RunPython(create_default_tables, migrations.RunPython.noop),
+    ]
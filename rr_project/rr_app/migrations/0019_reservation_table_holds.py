@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:33
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+import django.db.models.deletion
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+
+
+# Hold the tables of upcoming active reservations. Where old data already
+# double-books a table the earliest booking keeps it.
+BACKFILL_HOLDS_SQL = """
+    INSERT INTO rr_app_reservationtable (reservation_id, table_id, sitting)
+    SELECT r.id, t.id, tstzrange(
+        (r.date + r.time) AT TIME ZONE 'UTC',
+        (r.date + r.time + make_interval(mins => r.duration_minutes)) AT TIME ZONE 'UTC',
+        '[)'
+    )
+    FROM rr_app_reservation r
+    JOIN rr_app_table t ON t.restaurant_id = r.restaurant_id AND t.number = ANY(r.table_numbers)
+    WHERE r.status IN ('PENDING', 'CONFIRMED') AND r.date >= CURRENT_DATE - 1
+    ORDER BY r.created_at, r.id
+    ON CONFLICT DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0018_tables'),
+    ]
+
+    operations = [
+        # The exclusion constraint compares table_id with = inside a GiST index
+        BtreeGistExtension(),
+        migrations.CreateModel(
+            name='ReservationTable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sitting', django.contrib.postgres.fields.ranges.DateTimeRangeField()),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='held_tables', to='rr_app.reservation')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='rr_app.table')),
+            ],
+            options={
+                'constraints': [django.contrib.postgres.constraints.ExclusionConstraint(expressions=[('table', '='), ('sitting', '&&')], name='reservation_table_no_overlap')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_HOLDS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0019_reservation_table_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start', models.TimeField()),
+                ('state', models.CharField(choices=[('FREE', 'Free'), ('BOOKED', 'Booked')], default='FREE', max_length=10)),
+                ('reservation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='slots', to='rr_app.reservation')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='rr_app.restaurant')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='rr_app.table')),
+            ],
+            options={
+                'ordering': ['date', 'start', 'table'],
+                'indexes': [models.Index(fields=['restaurant', 'date', 'start'], name='table_slot_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('table', 'date', 'start'), name='table_slot_unique')],
+            },
+        ),
+    ]
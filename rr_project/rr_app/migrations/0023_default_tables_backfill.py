@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:54
+
+from django.db import migrations
+
+
+# services/floor_plan.DEFAULT_TABLE_LAYOUT as of this migration: (number, capacity, x, y).
+# Frozen on purpose; editing the runtime layout must not change what this backfill did.
+DEFAULT_LAYOUT = [
+    ('1', 2, 100, 80),
+    ('2', 2, 200, 80),
+    ('3', 4, 80, 180),
+    ('4', 4, 200, 180),
+    ('5', 4, 140, 300),
+    ('6', 6, 360, 200),
+    ('7', 6, 320, 350),
+    ('8', 8, 340, 120),
+]
+
+
+def create_missing_tables(apps, schema_editor):
+    """Restaurants added after 0018 were never given tables"""
+    Restaurant = apps.get_model('rr_app', 'Restaurant')
+    Table = apps.get_model('rr_app', 'Table')
+    Table.objects.bulk_create(
+        Table(restaurant_id=restaurant_id, number=number, capacity=capacity, x=x, y=y)
+        for restaurant_id in Restaurant.objects.filter(tables__isnull=True).values_list('id', flat=True).iterator()
+        for number, capacity, x, y in DEFAULT_LAYOUT
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0022_email_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0023_default_tables_backfill'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='restaurant',
+            constraint=models.CheckConstraint(condition=models.Q(('price_max', 0), ('price_min__lte', models.F('price_max')), _connector='OR'), name='restaurant_price_min_lte_max', violation_error_message='The minimum price cannot be higher than the maximum price.'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rr_app', '0024_restaurant_price_check'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxemail',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, help_text='Dropped instead of sent after this', null=True),
+        ),
+    ]
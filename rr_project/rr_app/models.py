@@ -2,7 +2,12 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
-from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import ArrayField, DecimalRangeField, DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from datetime import datetime, timezone as dt_timezone
 import uuid
 import random
 import string
@@ -87,19 +92,73 @@ class Restaurant(models.Model):
     )
     price_min = models.DecimalField(max_digits=8, decimal_places=2, default=0, help_text="Minimum food price")
     price_max = models.DecimalField(max_digits=8, decimal_places=2, default=0, help_text="Maximum food price")
+    # [price_min, price_max] as a numrange for index-driven overlap filtering; NULL when no prices are set
+    price_range = models.GeneratedField(
+        expression=models.Case(
+            models.When(
+                price_max__gt=0,
+                then=models.Func(
+                    models.F('price_min'), models.F('price_max'), models.Value('[]'),
+                    function='numrange',
+                    output_field=DecimalRangeField(),
+                ),
+            ),
+            default=None,
+            output_field=DecimalRangeField(),
+        ),
+        output_field=DecimalRangeField(),
+        db_persist=True,
+    )
     image = models.ImageField(upload_to='restaurants/', blank=True, null=True)
     description = models.TextField()
     max_guest_count = models.IntegerField()
     opening_time = models.TimeField(null=True, blank=True, help_text="Restaurant opening time")
     closing_time = models.TimeField(null=True, blank=True, help_text="Restaurant closing time")
+
+    # Denormalized review aggregates, kept current by the Review signals
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    # Weighted full-text document over name, cuisines, tags, description and address
+    search_vector = SearchVectorField(null=True, editable=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-avg_rating', '-id'], name='restaurant_rating_idx'),
+            GinIndex(fields=['search_vector'], name='restaurant_search_idx'),
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='restaurant_name_trgm_idx'),
+            GistIndex(fields=['price_range'], name='restaurant_price_range_idx'),
+            models.Index(fields=['opening_time', 'closing_time'], name='restaurant_hours_idx'),
+        ]
+        constraints = [
+            # numrange() raises for a lower bound above the upper one; also checked by
+            # model validation, so the admin and ModelForms report it on the form
+            models.CheckConstraint(
+                condition=models.Q(price_max=0) | models.Q(price_min__lte=models.F('price_max')),
+                name='restaurant_price_min_lte_max',
+                violation_error_message='The minimum price cannot be higher than the maximum price.',
+            ),
+        ]
+
+    # Columns maintained with atomic UPDATEs from signals.py
+    DERIVED_FIELDS = ('avg_rating', 'review_count', 'rating_sum', 'search_vector')
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # Derived columns are maintained with atomic UPDATEs, so a stale
+        # instance must never write them back over newer values.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and not f.generated and f.name not in self.DERIVED_FIELDS
+            ]
+        super().save(*args, **kwargs)
     
     def to_dict(self):
         return {
@@ -111,8 +170,9 @@ class Restaurant(models.Model):
             "is_open_now": self.is_open_now,
             "opening_time": self.opening_time.strftime("%I:%M %p") if self.opening_time else None,
             "closing_time": self.closing_time.strftime("%I:%M %p") if self.closing_time else None,
-            "avg_rating": getattr(self, "avg_rating", 0),
-            "review_count": getattr(self, "review_count", 0),
+            "avg_rating": self.avg_rating,
+            "review_count": self.review_count,
+            "bookmark_count": getattr(self, "bookmark_count", 0),
             "image": self.image.url if self.image else None,
             "cuisines": [{"name": c.name, "id": c.id} for c in self.cuisines.all()],
             "tags": [{"tag": t.tag, "id": t.id} for t in self.tags.all()],
@@ -120,7 +180,10 @@ class Restaurant(models.Model):
     
     @property
     def is_open_now(self):
-        """Check if restaurant is currently open"""
+        """
+        Check if restaurant is currently open.
+        Keep in sync with restaurant_service.open_at_q(), its SQL counterpart.
+        """
         if not self.opening_time or not self.closing_time:
             return False
         
@@ -149,10 +212,38 @@ class Cuisine(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='cuisine_name_trgm_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+
+class Table(models.Model):
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='tables'
+    )
+    # Matches the values stored in Reservation.table_numbers
+    number = models.CharField(max_length=10)
+    capacity = models.PositiveSmallIntegerField(validators=[MinValueValidator(1)])
+    # Position on the floor plan, in pixels from the top-left corner
+    x = models.PositiveIntegerField(default=0)
+    y = models.PositiveIntegerField(default=0)
+    is_active = models.BooleanField(default=True, help_text="Inactive tables are hidden from the floor plan")
+
+    class Meta:
+        ordering = ['restaurant', 'capacity', 'number']
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'number'], name='table_unique_number'),
+        ]
+
+    def __str__(self):
+        return f"Table {self.number} ({self.capacity} seats)"
+
+
 class Reservation(models.Model):
     customer = models.ForeignKey(
         Customer,
@@ -166,6 +257,7 @@ class Reservation(models.Model):
     guest_count = models.IntegerField()
     date = models.DateField()
     time = models.TimeField()
+    duration_minutes = models.PositiveSmallIntegerField(default=120, help_text="How long the tables are held")
     notes = models.TextField(blank=True, null=True)
     table_numbers = ArrayField(
         models.CharField(),
@@ -193,11 +285,116 @@ class Reservation(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', '-date', '-id'], name='reservation_customer_date_idx'),
+            models.Index(fields=['restaurant', 'date'], name='reservation_rest_date_idx'),
+            # Only upcoming and unfinished reservations; see services/reservation_lifecycle.py
+            models.Index(
+                fields=['date', 'time'],
+                condition=models.Q(status__in=['PENDING', 'CONFIRMED']),
+                name='reservation_active_date_idx',
+            ),
+        ]
 
     def __str__(self):
         restaurant_name = self.restaurant.name if self.restaurant else 'Unknown Restaurant'
         return f"{self.name} - {self.guest_count} guests at {restaurant_name} on {self.date} at {self.time} [{self.status}]"
 
+    @property
+    def can_cancel(self):
+        """Active and not started yet (see services.booking.cancel_reservation)"""
+        start = datetime.combine(self.date, self.time, tzinfo=dt_timezone.utc)
+        return self.status in ('PENDING', 'CONFIRMED') and start > timezone.now()
+
+    @property
+    def sitting(self):
+        """[start, end) of the time the tables are held, as a tstzrange value"""
+        start = datetime.combine(self.date, self.time, tzinfo=dt_timezone.utc)
+        return DateTimeTZRange(start, start + timezone.timedelta(minutes=self.duration_minutes), '[)')
+
+
+class ReservationTable(models.Model):
+    """
+    One table held by an active reservation for its sitting. The exclusion
+    constraint makes PostgreSQL reject two holds on the same table with
+    overlapping sittings, however many bookings race for it.
+    """
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.CASCADE,
+        related_name='held_tables'
+    )
+    table = models.ForeignKey(
+        Table,
+        on_delete=models.CASCADE,
+        related_name='holds'
+    )
+    sitting = DateTimeRangeField()
+
+    class Meta:
+        constraints = [
+            ExclusionConstraint(
+                name='reservation_table_no_overlap',
+                expressions=[('table', RangeOperators.EQUAL), ('sitting', RangeOperators.OVERLAPS)],
+                index_type='GIST',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Table {self.table_id} held by reservation {self.reservation_id}"
+
+
+
+class TableSlot(models.Model):
+    """
+    Bookable inventory: one row per table and SLOT_MINUTES slot, generated
+    ahead of time from the opening hours (see services/slots.py). Bookings
+    claim the rows covering their sitting with SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    SLOT_MINUTES = 30
+
+    FREE = 'FREE'
+    BOOKED = 'BOOKED'
+
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='slots'
+    )
+    table = models.ForeignKey(
+        Table,
+        on_delete=models.CASCADE,
+        related_name='slots'
+    )
+    date = models.DateField()
+    start = models.TimeField()
+    state = models.CharField(
+        max_length=10,
+        choices=[
+            (FREE, 'Free'),
+            (BOOKED, 'Booked'),
+        ],
+        default=FREE
+    )
+    reservation = models.ForeignKey(
+        Reservation,
+        on_delete=models.SET_NULL,
+        related_name='slots',
+        null=True,
+        blank=True
+    )
+
+    class Meta:
+        ordering = ['date', 'start', 'table']
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'date', 'start'], name='table_slot_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['restaurant', 'date', 'start'], name='table_slot_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"Table {self.table_id} on {self.date} at {self.start} [{self.state}]"
 
 class Review(models.Model):
     customer = models.ForeignKey(
@@ -223,6 +420,9 @@ class Review(models.Model):
 
     class Meta:
         ordering = ['-rating']
+        indexes = [
+            models.Index(fields=['restaurant', '-created_at', '-id'], name='review_restaurant_created_idx'),
+        ]
         
     def __str__(self):
         customer_name = self.customer.user.get_full_name() if self.customer else "Anonymous"
@@ -241,4 +441,49 @@ class Tags(models.Model):
         ordering = ['tag']
         
     def __str__(self):
-        return self.tag
\ No newline at end of file
+        return self.tag
+
+### Email
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent. Views enqueue rows and return straight away;
+    the send_outbox_emails command delivers them (see services/email_outbox.py).
+    """
+    PENDING = 'PENDING'
+    SENT = 'SENT'
+    DEAD = 'DEAD'
+
+    subject = models.CharField(max_length=255)
+    to_email = models.EmailField()
+    from_email = models.CharField(max_length=255)
+    body_text = models.TextField()
+    body_html = models.TextField(blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            (PENDING, 'Pending'),
+            (SENT, 'Sent'),
+            (DEAD, 'Dead'),
+        ],
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text='Dropped instead of sent after this')
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='PENDING'),
+                name='outbox_pending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email} [{self.status}]"
@@ -0,0 +1,155 @@
+"""
+Table availability.
+
+A table is taken at a given time when an active (pending or confirmed)
+reservation listing its number overlaps the requested sitting. Each
+reservation holds its tables for `duration_minutes` from its start time, so
+a late reservation on the previous day can still hold a table after
+midnight, and a late sitting can run into the next day's reservations.
+
+Where the slot inventory covers the sitting (services/slots.py) the answer
+is one indexed lookup of the slot rows. Otherwise the day's reservations are
+loaded in one query and put into an IntervalIndex, so checking a sitting
+costs a bisect plus the overlapping reservations instead of a scan of the
+whole day.
+"""
+from bisect import bisect_left
+from datetime import date as date_type, time as time_type, timedelta
+
+from django.utils import timezone
+
+from ..models import Reservation, Table
+from .slots import slot_availability
+from .soft_holds import held_by_others
+
+
+DEFAULT_DINING_MINUTES = 120
+MAX_DINING_MINUTES = 6 * 60
+ACTIVE_RESERVATION_STATUSES = ('PENDING', 'CONFIRMED')
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def minutes_since_midnight(value):
+    return value.hour * 60 + value.minute
+
+
+class IntervalIndex:
+    """
+    Static index of half-open [start, end) intervals.
+
+    Intervals are sorted by start and paired with the running maximum of their
+    ends, so an overlap query bisects to the last interval starting before
+    the query ends and walks back only while an earlier interval can still
+    reach the query start.
+    """
+
+    def __init__(self, intervals):
+        # intervals: iterable of (start, end, payload)
+        self.intervals = sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+        self.starts = [start for start, _, _ in self.intervals]
+        self.max_ends = []
+        reach = float('-inf')
+        for _, end, _ in self.intervals:
+            reach = max(reach, end)
+            self.max_ends.append(reach)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def overlapping(self, start, end):
+        """Yield the payload of every interval overlapping [start, end)"""
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] > start:
+            interval_start, interval_end, payload = self.intervals[i]
+            if interval_end > start:
+                yield payload
+            i -= 1
+
+
+def reservation_index(restaurant_id, date, exclude_reservation_id=None):
+    """
+    IntervalIndex over the active reservations that can overlap a sitting
+    starting on `date`, in minutes relative to midnight of `date`: those of
+    the day before, the day and the day after (sittings are shorter than a
+    day). Payloads are the reserved table numbers.
+    """
+    day_before, day_after = date - timedelta(days=1), date + timedelta(days=1)
+    reservations = Reservation.objects.filter(
+        restaurant_id=restaurant_id,
+        date__in=[day_before, date, day_after],
+        status__in=ACTIVE_RESERVATION_STATUSES,
+    )
+    if exclude_reservation_id is not None:
+        reservations = reservations.exclude(pk=exclude_reservation_id)
+
+    intervals = []
+    rows = reservations.values_list('date', 'time', 'duration_minutes', 'table_numbers')
+    for reservation_date, time, duration, table_numbers in rows:
+        if not table_numbers:
+            continue
+        start = minutes_since_midnight(time)
+        if reservation_date == day_before:
+            start -= MINUTES_PER_DAY
+        elif reservation_date == day_after:
+            start += MINUTES_PER_DAY
+        intervals.append((start, start + duration, table_numbers))
+    return IntervalIndex(intervals)
+
+
+def reserved_table_numbers(index, start, duration):
+    reserved = set()
+    for table_numbers in index.overlapping(start, start + duration):
+        reserved.update(table_numbers)
+    return reserved
+
+
+def get_table_availability(restaurant_id, date, time, duration=DEFAULT_DINING_MINUTES, session_key=None):
+    """
+    Every active table of the restaurant with its floor plan position and
+    whether it is free for a sitting of `duration` minutes from `time` on `date`.
+    Uses two queries when the slot inventory covers the sitting and three
+    otherwise, regardless of the number of tables or reservations. Tables
+    soft-held by a session other than `session_key` are not free.
+    """
+    inventory = slot_availability(restaurant_id, date, time, duration)
+    tables = list(
+        Table.objects.filter(restaurant_id=restaurant_id, is_active=True)
+        .values('id', 'number', 'capacity', 'x', 'y')
+    )
+
+    reserved = set()
+    if any(table['id'] not in inventory for table in tables):
+        index = reservation_index(restaurant_id, date)
+        reserved = reserved_table_numbers(index, minutes_since_midnight(time), duration)
+
+    availability = [
+        dict(table, available=inventory.get(table['id'], table['number'] not in reserved))
+        for table in tables
+    ]
+    free = [table['number'] for table in availability if table['available']]
+    held = held_by_others(restaurant_id, free, date, time, duration, session_key)
+    for table in availability:
+        if table['number'] in held:
+            table['available'] = False
+    return availability
+
+
+def get_free_tables(restaurant_id, date, time, duration=DEFAULT_DINING_MINUTES, session_key=None):
+    """Only the free tables, as returned by get_table_availability()"""
+    tables = get_table_availability(restaurant_id, date, time, duration, session_key)
+    return [table for table in tables if table['available']]
+
+
+def parse_sitting(params, now=None):
+    """
+    Read date, time and duration from a QueryDict, defaulting to now and
+    DEFAULT_DINING_MINUTES. Raises ValueError for malformed values.
+    """
+    now = now or timezone.localtime()
+    date = date_type.fromisoformat(params['date']) if params.get('date') else now.date()
+    time = time_type.fromisoformat(params['time']) if params.get('time') else now.time()
+    duration = int(params.get('duration') or DEFAULT_DINING_MINUTES)
+    if not 0 < duration <= MAX_DINING_MINUTES:
+        raise ValueError(f'duration must be between 1 and {MAX_DINING_MINUTES} minutes.')
+    return date, time, duration
@@ -0,0 +1,162 @@
+"""
+Table holds for reservations.
+
+Every active reservation holds its tables through ReservationTable rows,
+one per table, carrying the reservation's sitting as a tstzrange. The
+`reservation_table_no_overlap` exclusion constraint (btree_gist) rejects a
+hold that overlaps another hold on the same table, so two concurrent
+bookings of the same table cannot both commit and no application lock is
+needed. Bookings of different tables never wait on each other.
+
+Where the slot inventory has been generated (services/slots.py) a booking
+first claims its slots with SKIP LOCKED, so two bookers racing for the same
+table get an answer straight away instead of the second one waiting on the
+first one's constraint check.
+"""
+from django.db import IntegrityError, connection, transaction
+
+from ..models import ReservationTable, Table
+from .availability import ACTIVE_RESERVATION_STATUSES
+from .reservation_calendar import invalidate_calendar
+from .slots import claim_slots, release_slots
+
+
+NO_OVERLAP_CONSTRAINT = 'reservation_table_no_overlap'
+
+# Cancel, drop the table holds and free the slots in one statement. Only the
+# owner's active reservations that have not started yet can be cancelled.
+CANCEL_RESERVATION_SQL = """
+    WITH cancelled AS (
+        UPDATE rr_app_reservation r
+        SET status = 'CANCELLED'
+        FROM rr_app_customer c
+        WHERE r.id = %(reservation)s
+          AND r.customer_id = c.id
+          AND c.user_id = %(user)s
+          AND r.status IN ('PENDING', 'CONFIRMED')
+          AND r.date + r.time > now() AT TIME ZONE 'UTC'
+        RETURNING r.id, r.restaurant_id
+    ),
+    released_holds AS (
+        DELETE FROM rr_app_reservationtable h
+        USING cancelled
+        WHERE h.reservation_id = cancelled.id
+    ),
+    released_slots AS (
+        UPDATE rr_app_tableslot s
+        SET state = 'FREE', reservation_id = NULL
+        FROM cancelled
+        WHERE s.reservation_id = cancelled.id
+    )
+    SELECT cancelled.restaurant_id, rest.name
+    FROM cancelled
+    LEFT JOIN rr_app_restaurant rest ON rest.id = cancelled.restaurant_id
+"""
+
+
+class BookingError(Exception):
+    def __init__(self, message, table_numbers=()):
+        super().__init__(message)
+        self.table_numbers = list(table_numbers)
+
+
+class TablesTaken(BookingError):
+    pass
+
+
+class UnknownTables(BookingError):
+    pass
+
+
+def _table_sort_key(number):
+    return (0, int(number), '') if number.isdigit() else (1, 0, number)
+
+
+def normalize_table_numbers(table_numbers):
+    """Strip, de-duplicate and sort table numbers ("10" after "9")"""
+    numbers = {str(number).strip() for number in table_numbers or []}
+    numbers.discard('')
+    return sorted(numbers, key=_table_sort_key)
+
+
+def tables_taken(table_numbers):
+    taken = normalize_table_numbers(table_numbers)
+    return TablesTaken(
+        f"Sorry, table {', '.join(taken)} was just taken for that time. Please pick another table.",
+        taken,
+    )
+
+
+def _violates(error, constraint_name):
+    # psycopg2 and psycopg 3 both expose the violated constraint on .diag
+    diag = getattr(error.__cause__, 'diag', None)
+    return getattr(diag, 'constraint_name', None) == constraint_name
+
+
+def hold_tables(reservation):
+    """
+    Replace the table holds of a saved reservation to match its current
+    tables, sitting and status. Inactive reservations release their tables.
+
+    Raises UnknownTables when a number is not an active table of the
+    restaurant, and TablesTaken when another reservation holds one of the
+    tables for an overlapping time. Run it inside the transaction that saved
+    the reservation so a failure rolls the booking back too.
+    """
+    with transaction.atomic():
+        ReservationTable.objects.filter(reservation=reservation).delete()
+        release_slots(reservation)
+        if reservation.status not in ACTIVE_RESERVATION_STATUSES or not reservation.restaurant_id:
+            return []
+
+        numbers = normalize_table_numbers(reservation.table_numbers)
+        tables = list(Table.objects.filter(
+            restaurant_id=reservation.restaurant_id, number__in=numbers, is_active=True,
+        ))
+        missing = set(numbers) - {table.number for table in tables}
+        if missing:
+            missing = normalize_table_numbers(missing)
+            raise UnknownTables(f"Table {', '.join(missing)} does not exist at this restaurant.", missing)
+
+        taken = claim_slots(reservation, tables)
+        if taken:
+            raise tables_taken(taken)
+
+        sitting = reservation.sitting
+        holds = [ReservationTable(reservation=reservation, table=table, sitting=sitting) for table in tables]
+        try:
+            with transaction.atomic():
+                return ReservationTable.objects.bulk_create(holds)
+        except IntegrityError as e:
+            if not _violates(e, NO_OVERLAP_CONSTRAINT):
+                raise
+            taken = set(
+                ReservationTable.objects.filter(table__in=tables, sitting__overlap=sitting)
+                .values_list('table__number', flat=True)
+            ) or numbers
+            raise tables_taken(taken) from e
+
+
+def release_tables(reservation):
+    """Drop every table hold and slot claim of a reservation"""
+    release_slots(reservation)
+    return ReservationTable.objects.filter(reservation=reservation).delete()[0]
+
+
+def cancel_reservation(reservation_id, user):
+    """
+    Cancel one of `user`'s upcoming reservations and free its tables at once,
+    keeping the row. Returns the restaurant name ('' when the restaurant is
+    gone), or None when there was nothing to cancel.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(CANCEL_RESERVATION_SQL, {'reservation': reservation_id, 'user': user.pk})
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        restaurant_id, restaurant_name = row
+        if restaurant_id is not None:
+            # Raw SQL sends no signals
+            transaction.on_commit(lambda: invalidate_calendar(restaurant_id))
+    return restaurant_name or ''
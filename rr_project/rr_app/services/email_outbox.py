@@ -0,0 +1,225 @@
+"""
+Database-backed email outbox.
+
+Requests only insert an OutboxEmail row (enqueue_email), so signing up or
+asking for a reset code never waits on an SMTP handshake. The
+send_outbox_emails command drains the outbox:
+
+- a batch of due rows is claimed with FOR UPDATE SKIP LOCKED and leased, so
+  several workers never send the same email. The lease covers one send
+  (lease_seconds) and is renewed for the rest of the batch before each
+  send, so the emails of a worker that dies are retried minutes later;
+- the batch is sent over one SMTP connection, opened once and reused for
+  every message (and reopened once if the server drops it);
+- failures are retried with exponential backoff and dead-lettered (status
+  DEAD, last error kept) after OUTBOX_MAX_ATTEMPTS;
+- an email with an expires_at (a reset code, a verification link) is
+  dead-lettered instead of sent once that moment has passed, and is not
+  retried past it.
+
+Point EMAIL_HOST/EMAIL_PORT at a local SMTP stand-in (EMAIL_USE_TLS=False)
+to watch the worker without sending real mail.
+"""
+import logging
+import smtplib
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import OutboxEmail
+
+
+logger = logging.getLogger('rr_app.email')
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_BACKOFF_SECONDS = 30
+OUTBOX_MAX_BACKOFF_SECONDS = 60 * 60
+# Added to every lease for the bookkeeping around a send
+OUTBOX_LEASE_MARGIN_SECONDS = 60
+# Assumed per SMTP operation when EMAIL_TIMEOUT is not set
+OUTBOX_DEFAULT_TIMEOUT_SECONDS = 60
+EXPIRED_ERROR = 'Expired before it could be sent'
+
+DrainResult = namedtuple('DrainResult', ['sent', 'retried', 'dead', 'expired'])
+
+
+def enqueue_email(subject, to_email, body_text, body_html='', from_email=None, expires_at=None):
+    """
+    Queue an email for the outbox worker; one INSERT. An email that is
+    useless after `expires_at` (it carries a code that expires) is dropped
+    rather than sent late.
+    """
+    return OutboxEmail.objects.create(
+        subject=subject,
+        to_email=to_email,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        body_text=body_text,
+        body_html=body_html,
+        expires_at=expires_at,
+    )
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts` (1-based): 30s, 1m, 2m, ... capped at an hour"""
+    return timedelta(seconds=min(OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF_SECONDS))
+
+
+def lease_seconds():
+    """
+    How long claimed emails stay invisible to other workers: one send. It
+    may time out, and then the reconnect and the second attempt may time
+    out too, so three EMAIL_TIMEOUTs. The lease of the emails still to send
+    is renewed before each send (extend_lease).
+    """
+    timeout = getattr(settings, 'EMAIL_TIMEOUT', None) or OUTBOX_DEFAULT_TIMEOUT_SECONDS
+    return OUTBOX_LEASE_MARGIN_SECONDS + 3 * timeout
+
+
+def extend_lease(emails, now=None):
+    """Keep `emails` leased to this worker for another lease_seconds()"""
+    now = now or timezone.now()
+    OutboxEmail.objects.filter(pk__in=[email.pk for email in emails], status=OutboxEmail.PENDING).update(
+        next_attempt_at=now + timedelta(seconds=lease_seconds()),
+    )
+
+
+def expire_emails(now=None):
+    """Dead-letter the pending emails past their expires_at; the number dropped"""
+    now = now or timezone.now()
+    return OutboxEmail.objects.filter(status=OutboxEmail.PENDING, expires_at__lte=now).update(
+        status=OutboxEmail.DEAD, last_error=EXPIRED_ERROR,
+    )
+
+
+def claim_batch(batch_size=OUTBOX_BATCH_SIZE, now=None):
+    """Lease up to `batch_size` due emails to this worker"""
+    now = now or timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.filter(status=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+            .order_by('next_attempt_at')
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        if emails:
+            extend_lease(emails, now)
+    return emails
+
+
+def _message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body_text,
+        from_email=email.from_email,
+        to=[email.to_email],
+        connection=connection,
+    )
+    if email.body_html:
+        message.attach_alternative(email.body_html, 'text/html')
+    return message
+
+
+def send_batch(emails, connection):
+    """
+    Send claimed emails over an open connection and record the outcome.
+    Returns a DrainResult.
+    """
+    sent, failed, expired = [], [], []
+    for i, email in enumerate(emails):
+        now = timezone.now()
+        if email.expires_at and email.expires_at <= now:
+            expired.append(email.pk)
+            continue
+        if i:
+            # The previous sends may have used up most of the lease
+            extend_lease(emails[i:], now)
+        try:
+            try:
+                _message(email, connection).send()
+            except smtplib.SMTPServerDisconnected:
+                # Servers close idle connections; retry once on a fresh one
+                connection.close()
+                connection.open()
+                _message(email, connection).send()
+        except Exception as e:
+            logger.warning('Sending email %s to %s failed: %s', email.pk, email.to_email, e)
+            failed.append((email, e))
+        else:
+            sent.append(email.pk)
+
+    return record_results(sent, failed, expired)
+
+
+def record_results(sent, failed, expired=()):
+    """
+    Mark `sent` ids SENT, schedule a retry of (email, error) `failed` or
+    dead-letter it, and dead-letter `expired` ids.
+    """
+    now = timezone.now()
+    if sent:
+        OutboxEmail.objects.filter(pk__in=sent).update(status=OutboxEmail.SENT, sent_at=now, last_error='')
+    if expired:
+        OutboxEmail.objects.filter(pk__in=expired).update(status=OutboxEmail.DEAD, last_error=EXPIRED_ERROR)
+
+    dead = 0
+    for email, error in failed:
+        email.attempts += 1
+        email.last_error = f'{type(error).__name__}: {error}'
+        if email.attempts >= OUTBOX_MAX_ATTEMPTS:
+            email.status = OutboxEmail.DEAD
+            dead += 1
+            logger.error('Email %s to %s dead-lettered after %s attempts', email.pk, email.to_email, email.attempts)
+        elif email.expires_at and now + backoff(email.attempts) >= email.expires_at:
+            # The retry would come too late; don't send a code that no longer works
+            email.status = OutboxEmail.DEAD
+            email.last_error = f'{email.last_error}; {EXPIRED_ERROR}'
+            dead += 1
+        else:
+            email.next_attempt_at = now + backoff(email.attempts)
+    if failed:
+        OutboxEmail.objects.bulk_update(
+            [email for email, _ in failed], ['attempts', 'last_error', 'status', 'next_attempt_at'],
+        )
+    return DrainResult(len(sent), len(failed) - dead, dead, len(expired))
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, max_batches=None):
+    """
+    Send every due email, batch after batch, over a single SMTP connection.
+    Yields a DrainResult per batch, and one for the expired emails dropped
+    beforehand if there were any.
+    """
+    expired = expire_emails()
+    if expired:
+        yield DrainResult(0, 0, 0, expired)
+
+    connection = None
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            emails = claim_batch(batch_size)
+            if not emails:
+                break
+            batches += 1
+            if connection is None:
+                try:
+                    connection = get_connection()
+                    connection.open()
+                except Exception as e:
+                    # The server is unreachable: count it as a failed attempt and stop
+                    logger.error('Could not connect to the email server: %s', e)
+                    yield record_results([], [(email, e) for email in emails])
+                    connection = None
+                    break
+            yield send_batch(emails, connection)
+            if len(emails) < batch_size:
+                break
+    finally:
+        if connection is not None:
+            connection.close()
@@ -0,0 +1,240 @@
+"""
+Precompiled email templates.
+
+An email template is prepared once per process (compile_email, memoized):
+
+- the stylesheets it links with {% static %} (rr_app/css/email-styles.css)
+  are inlined into style="" attributes, since most mail clients drop
+  <link> and <style>; rules that cannot be inlined (@media, :hover) stay
+  in a <style> block for the clients that do read it;
+- a plain-text version is derived from the template source, keeping its
+  {{ variables }}, so no HTML has to be stripped per email;
+- both are compiled into Template objects.
+
+Sending then only renders the two compiled templates with the recipient's
+context. With DEBUG on, templates are prepared on every send so edits show
+up right away.
+"""
+import html
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template import engines
+from django.template.loader import get_template
+
+
+CompiledEmail = namedtuple('CompiledEmail', ['html', 'text'])
+
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+
+STYLESHEET_LINK_RE = re.compile(
+    r'<link\b[^>]*\brel=["\']stylesheet["\'][^>]*\bhref=["\']'
+    r'\{%\s*static\s+["\']([^"\']+)["\']\s*%\}["\'][^>]*>\s*',
+    re.IGNORECASE,
+)
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+# Type and class selectors, optionally combined with descendant combinators
+COMPOUND_RE = re.compile(r'([a-zA-Z][\w-]*)?((?:\.[\w-]+)*)')
+SIMPLE_SELECTOR_RE = re.compile(r'[\w.-]+(?:\s+[\w.-]+)*')
+# Start and end tags (quoted attribute values may contain '>'), and comments left alone
+TAG_RE = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][\w-]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>', re.DOTALL)
+CLASS_ATTR_RE = re.compile(r'\sclass\s*=\s*"([^"]*)"', re.IGNORECASE)
+STYLE_ATTR_RE = re.compile(r'\sstyle\s*=\s*"([^"]*)"', re.IGNORECASE)
+IMPORTANT_RE = re.compile(r'!\s*important$', re.IGNORECASE)
+
+CssRule = namedtuple('CssRule', ['selector', 'declarations'])
+
+
+### CSS inlining
+
+def _css_blocks(css):
+    """(prelude, body) of every top-level block; nested braces stay in the body"""
+    depth, start, prelude = 0, 0, ''
+    for i, char in enumerate(css):
+        if char == '{':
+            if depth == 0:
+                prelude, start = css[start:i].strip(), i + 1
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                yield prelude, css[start:i].strip()
+                start = i + 1
+
+
+def _specificity(rule):
+    return (
+        sum(len(classes) for _, classes in rule.selector),
+        sum(1 for tag, _ in rule.selector if tag),
+    )
+
+
+def parse_stylesheet(css):
+    """
+    Split a stylesheet into the rules that can be inlined, in source order,
+    and the CSS text of everything else.
+    """
+    rules, kept = [], []
+    for prelude, body in _css_blocks(CSS_COMMENT_RE.sub('', css)):
+        if prelude.startswith('@'):
+            kept.append(f'{prelude} {{ {body} }}')
+            continue
+        declarations = [
+            declaration.strip().replace('"', "'")
+            for declaration in body.split(';') if declaration.strip()
+        ]
+        for selector in prelude.split(','):
+            selector = selector.strip()
+            parts = [COMPOUND_RE.fullmatch(part) for part in selector.split()]
+            if not SIMPLE_SELECTOR_RE.fullmatch(selector) or not all(part and part.group(0) for part in parts):
+                kept.append(f'{selector} {{ {body} }}')
+                continue
+            compounds = [
+                (tag and tag.lower(), frozenset(filter(None, classes.split('.'))))
+                for tag, classes in (part.groups() for part in parts)
+            ]
+            rules.append(CssRule(compounds, declarations))
+    return rules, '\n'.join(kept)
+
+
+def _matches(compound, element):
+    tag, classes = compound
+    return (tag is None or tag == element[0]) and classes <= element[1]
+
+
+def _selector_matches(selector, element, ancestors):
+    if not _matches(selector[-1], element):
+        return False
+    remaining = list(selector[:-1])
+    for ancestor in reversed(ancestors):
+        if remaining and _matches(remaining[-1], ancestor):
+            remaining.pop()
+    return not remaining
+
+
+def inline_css(source, rules):
+    """
+    Add the declarations of matching `rules` to the style attribute of each
+    element in `source`. !important declarations are kept with their flag
+    and only give way to a later !important one.
+    """
+    # Later declarations win, as in the cascade: by specificity, then source order
+    rules = sorted(rules, key=_specificity)
+    stack = []
+
+    def replace(match):
+        closing, name, attrs = match.group(1), match.group(2), match.group(3)
+        if name is None:
+            return match.group(0)
+        name = name.lower()
+        if closing:
+            # Close the innermost open element of that name (and anything left open inside it)
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i][0] == name:
+                    del stack[i:]
+                    break
+            return match.group(0)
+
+        class_attr = CLASS_ATTR_RE.search(attrs)
+        element = (name, frozenset(class_attr.group(1).split()) if class_attr else frozenset())
+        declarations = {}
+        for rule in rules:
+            if _selector_matches(rule.selector, element, stack):
+                for declaration in rule.declarations:
+                    name = declaration.split(':', 1)[0].strip().lower()
+                    previous = declarations.get(name)
+                    if previous is None or not IMPORTANT_RE.search(previous) or IMPORTANT_RE.search(declaration):
+                        declarations[name] = declaration
+
+        self_closing = attrs.rstrip().endswith('/')
+        if name not in VOID_ELEMENTS and not self_closing:
+            stack.append(element)
+        if not declarations:
+            return match.group(0)
+
+        style = '; '.join(declarations.values())
+        existing = STYLE_ATTR_RE.search(attrs)
+        if existing:
+            # Inline styles already in the template keep the last word; within one
+            # style attribute an !important declaration still beats a later plain one
+            style = f'{style}; {existing.group(1).strip()}'
+            attrs = STYLE_ATTR_RE.sub('', attrs, count=1)
+        attrs = attrs.rstrip().rstrip('/').rstrip()
+        return f'<{match.group(2)}{attrs} style="{style}"{" /" if self_closing else ""}>'
+
+    return TAG_RE.sub(replace, source)
+
+
+def inline_stylesheets(source):
+    """Replace the template's {% static %} stylesheet links with inline styles"""
+    inline, kept = [], []
+
+    def load(match):
+        path = finders.find(match.group(1))
+        if not path:
+            return match.group(0)
+        with open(path, encoding='utf-8') as f:
+            rules, leftover = parse_stylesheet(f.read())
+        inline.extend(rules)
+        kept.append(leftover)
+        return ''
+
+    source = STYLESHEET_LINK_RE.sub(load, source)
+    source = inline_css(source, inline)
+    kept = '\n'.join(filter(None, kept))
+    if kept:
+        style = f'<style type="text/css">\n{kept}\n</style>\n</head>'
+        source = re.sub(r'</head>', lambda _: style, source, count=1, flags=re.IGNORECASE)
+    return source
+
+
+### Plain text
+
+LOAD_TAG_RE = re.compile(r'\{%\s*load\s[^%]*%\}')
+HIDDEN_RE = re.compile(r'<!--.*?-->|<(head|style|script|svg)\b.*?</\1\s*>|<!DOCTYPE[^>]*>', re.DOTALL | re.IGNORECASE)
+LINK_RE = re.compile(r'<a\b[^>]*\bhref="([^"]*)"[^>]*>(.*?)</a\s*>', re.DOTALL | re.IGNORECASE)
+BLOCK_END_RE = re.compile(r'<br\s*/?>|</(p|div|h[1-6]|li|tr|table)\s*>', re.IGNORECASE)
+ANY_TAG_RE = re.compile(r'<(?:[^>"\']|"[^"]*"|\'[^\']*\')*>')
+
+
+def _link_text(match):
+    href, label = match.group(1), ANY_TAG_RE.sub('', match.group(2)).strip()
+    return label if label == href else f'{label}: {href}'
+
+
+def text_source(source):
+    """A plain-text template with the same variables as the HTML template `source`"""
+    loads = ''.join(LOAD_TAG_RE.findall(source))
+    text = HIDDEN_RE.sub('', LOAD_TAG_RE.sub('', source))
+    text = LINK_RE.sub(_link_text, text)
+    text = BLOCK_END_RE.sub('\n', text)
+    text = html.unescape(ANY_TAG_RE.sub('', text))
+
+    lines = [' '.join(line.split()) for line in text.splitlines()]
+    paragraphs = '\n'.join(lines).strip()
+    paragraphs = re.sub(r'\n{2,}', '\n\n', paragraphs)
+    # Values are not HTML in a text email; keep names like O'Brien unescaped
+    return f'{loads}{{% autoescape off %}}{paragraphs}\n{{% endautoescape %}}'
+
+
+### Compiling and rendering
+
+def _compile_email(template_name):
+    source = get_template(template_name).template.source
+    engine = engines['django']
+    return CompiledEmail(
+        html=engine.from_string(inline_stylesheets(source)),
+        text=engine.from_string(text_source(source)),
+    )
+
+
+compile_email = lru_cache(maxsize=None)(_compile_email)
+
+
+def render_email(template_name, context):
+    """The (html, text) bodies of an email template for one recipient"""
+    compiled = _compile_email(template_name) if settings.DEBUG else compile_email(template_name)
+    return compiled.html.render(context), compiled.text.render(context)
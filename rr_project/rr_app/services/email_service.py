@@ -1,46 +1,59 @@
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+import logging
+from urllib.parse import urljoin
+
 from django.conf import settings
+from django.template.loader import render_to_string
+from django.templatetags.static import static
 from django.urls import reverse
 
+from .email_outbox import enqueue_email
+from .email_rendering import render_email
+
+
+logger = logging.getLogger('rr_app.email')
+
+EMAIL_LOGO = 'rr_app/images/cloche.png'
+
+
+def absolute_static(path):
+    """The URL of a static file for use outside the site, e.g. in an email"""
+    # An absolute STATIC_URL (a CDN) is kept as it is
+    return urljoin(settings.SITE_URL, static(path))
+
 
-def send_email(subject, template_name, context, recipient_email, plain_text_fallback=None):
+def send_email(subject, template_name, context, recipient_email, plain_text_fallback=None, expires_at=None):
     """
-    Generic email sender function for any type of email
+    Generic email sender function for any type of email. The email is
+    rendered now from the precompiled template (see email_rendering) and
+    queued in the outbox; the send_outbox_emails worker delivers it, so the
+    request never waits on the SMTP server.
     
     Args:
         subject: Email subject line
         template_name: Path to HTML email template
-        context: Dictionary of template context variables
+        context: Dictionary of template context variables; `logo_url` is
+            added
         recipient_email: Recipient's email address
-        plain_text_fallback: Optional plain text template path, if None strips HTML
+        plain_text_fallback: Optional plain text template path, if None the
+            text version precompiled from the HTML template is used
+        expires_at: Optional moment after which the email is no longer
+            worth sending (it carries a code that expires)
         
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if email was queued successfully, False otherwise
     """
     try:
-        # Render HTML message
-        html_message = render_to_string(template_name, context)
+        # Render the HTML (styles already inlined) and plain text messages
+        context = {'logo_url': absolute_static(EMAIL_LOGO), **context}
+        html_message, plain_message = render_email(template_name, context)
         
-        # Generate plain text message
         if plain_text_fallback:
             plain_message = render_to_string(plain_text_fallback, context)
-        else:
-            plain_message = strip_tags(html_message)
         
-        # Send email
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[recipient_email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        enqueue_email(subject, recipient_email, plain_message, html_message, expires_at=expires_at)
         return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
+    except Exception:
+        logger.exception('Failed to queue email %r to %s', subject, recipient_email)
         return False
 
 
@@ -68,7 +81,8 @@ def send_verification_email(user, request):
         subject=subject,
         template_name='rr_app/emails/verification_email.html',
         context=context,
-        recipient_email=user.email
+        recipient_email=user.email,
+        expires_at=user.verification_token_expires,
     )
 
 def send_password_reset_code_email(user, reset_code):
@@ -90,5 +104,6 @@ def send_password_reset_code_email(user, reset_code):
         subject=subject,
         template_name='rr_app/emails/password_reset_code_email.html',
         context=context,
-        recipient_email=user.email
+        recipient_email=user.email,
+        expires_at=user.password_reset_code_expires,
     )
\ No newline at end of file
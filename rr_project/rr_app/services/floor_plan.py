@@ -0,0 +1,38 @@
+"""
+Default floor plan for new restaurants.
+
+Bookings need Table rows: without them every table number is unknown and
+no combination can seat a party. Each new restaurant therefore starts with
+the layout every restaurant had when tables moved into the database
+(migration 0018); staff then edit it in the admin.
+
+DEFAULT_TABLE_LAYOUT is the one definition used at runtime. Migrations 0018
+and 0023 keep frozen copies, as migrations must not import app code that
+may change after them.
+"""
+from ..models import Table
+
+
+# (number, capacity, x, y) - x and y are floor plan pixels
+DEFAULT_TABLE_LAYOUT = [
+    ('1', 2, 100, 80),
+    ('2', 2, 200, 80),
+    ('3', 4, 80, 180),
+    ('4', 4, 200, 180),
+    ('5', 4, 140, 300),
+    ('6', 6, 360, 200),
+    ('7', 6, 320, 350),
+    ('8', 8, 340, 120),
+]
+
+
+def create_default_tables(restaurant_ids):
+    """Give each restaurant in `restaurant_ids` that has no tables the default layout; one INSERT"""
+    restaurant_ids = set(restaurant_ids) - set(
+        Table.objects.filter(restaurant_id__in=restaurant_ids).values_list('restaurant_id', flat=True).distinct()
+    )
+    return Table.objects.bulk_create(
+        Table(restaurant_id=restaurant_id, number=number, capacity=capacity, x=x, y=y)
+        for restaurant_id in sorted(restaurant_ids)
+        for number, capacity, x, y in DEFAULT_TABLE_LAYOUT
+    )
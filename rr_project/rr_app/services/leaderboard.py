@@ -0,0 +1,215 @@
+"""
+Top restaurants leaderboard for the dashboard.
+
+Restaurants are ranked by a Bayesian-weighted rating
+
+    score = (rating_sum + m * C) / (review_count + m)
+
+where C is the mean rating over every review and m is
+LEADERBOARD_PRIOR_REVIEWS. A restaurant with a single 5-star review is
+pulled towards the site mean until it has enough reviews of its own.
+
+The ranking is kept in the Django cache together with the restaurant rows
+(cuisines and tags prefetched), so the dashboard renders it without touching
+the database. Review writes re-rank the cached entry in place. When the
+entry is older than LEADERBOARD_FRESH_SECONDS or has been marked stale,
+readers keep getting it while a background thread rebuilds it
+(stale-while-revalidate).
+"""
+import threading
+import time
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum, Value
+
+from ..models import Restaurant
+
+
+LEADERBOARD_SIZE = 6
+# Ranked restaurants kept beyond the top so one falling out can be replaced without a rebuild
+LEADERBOARD_BUFFER = LEADERBOARD_SIZE * 2
+LEADERBOARD_PRIOR_REVIEWS = 5
+LEADERBOARD_FRESH_SECONDS = 60 * 5
+
+LEADERBOARD_KEY = 'leaderboard:top_restaurants'
+LEADERBOARD_STALE_KEY = 'leaderboard:stale'
+LEADERBOARD_LOCK_KEY = 'leaderboard:lock'
+LEADERBOARD_REFRESH_KEY = 'leaderboard:refreshing'
+LOCK_TIMEOUT = 10
+REFRESH_TIMEOUT = 60
+
+SCORE_FIELD = DecimalField(max_digits=8, decimal_places=4)
+
+
+def _mean_rating(rating_sum, review_count):
+    return Decimal(rating_sum) / review_count if review_count else Decimal('0')
+
+
+def bayesian_score(rating_sum, review_count, mean):
+    prior = LEADERBOARD_PRIOR_REVIEWS
+    return (Decimal(rating_sum) + prior * mean) / (review_count + prior)
+
+
+def bayesian_score_expression(mean):
+    prior = LEADERBOARD_PRIOR_REVIEWS
+    return ExpressionWrapper(
+        (F('rating_sum') + Value(prior * mean)) / (F('review_count') + Value(prior)),
+        output_field=SCORE_FIELD,
+    )
+
+
+def _ranked_restaurants():
+    return (
+        Restaurant.objects.filter(review_count__gt=0)
+        .defer('search_vector')
+        .prefetch_related('cuisines', 'tags')
+    )
+
+
+### Building
+
+def build_leaderboard():
+    """Rank every reviewed restaurant from the stored rating aggregates"""
+    totals = Restaurant.objects.aggregate(rating_sum=Sum('rating_sum'), review_count=Sum('review_count'))
+    rating_sum = totals['rating_sum'] or Decimal('0')
+    review_count = totals['review_count'] or 0
+    mean = _mean_rating(rating_sum, review_count)
+
+    restaurants = list(
+        _ranked_restaurants()
+        .annotate(score=bayesian_score_expression(mean))
+        .order_by('-score', '-id')[:LEADERBOARD_BUFFER]
+    )
+    return {
+        'built_at': time.time(),
+        'rating_sum': rating_sum,
+        'review_count': review_count,
+        'ranking': [(r.score, r.pk) for r in restaurants],
+        'restaurants': {r.pk: r for r in restaurants},
+    }
+
+
+def refresh_leaderboard():
+    """Rebuild the leaderboard and store it; returns the new state"""
+    # Cleared first so changes made while building mark it stale again
+    cache.delete(LEADERBOARD_STALE_KEY)
+    state = build_leaderboard()
+    cache.set(LEADERBOARD_KEY, state, None)
+    return state
+
+
+def _refresh_in_background():
+    try:
+        refresh_leaderboard()
+    finally:
+        cache.delete(LEADERBOARD_REFRESH_KEY)
+        # The thread opened its own database connection
+        connections.close_all()
+
+
+def revalidate_leaderboard():
+    """Start a background rebuild unless one is already running"""
+    if not cache.add(LEADERBOARD_REFRESH_KEY, True, REFRESH_TIMEOUT):
+        return False
+    threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return True
+
+
+def mark_leaderboard_stale():
+    cache.set(LEADERBOARD_STALE_KEY, True, None)
+
+
+### Reading
+
+def get_top_restaurants(limit=LEADERBOARD_SIZE):
+    """
+    The top `limit` restaurants, best first, served from the cache.
+    Only the very first call (empty cache) builds the ranking in the request.
+    """
+    cached = cache.get_many([LEADERBOARD_KEY, LEADERBOARD_STALE_KEY])
+    state = cached.get(LEADERBOARD_KEY)
+    if state is None:
+        state = refresh_leaderboard()
+    elif cached.get(LEADERBOARD_STALE_KEY) or time.time() - state['built_at'] > LEADERBOARD_FRESH_SECONDS:
+        revalidate_leaderboard()
+    return [state['restaurants'][pk] for _, pk in state['ranking'][:limit]]
+
+
+def is_on_leaderboard(restaurant_id):
+    state = cache.get(LEADERBOARD_KEY)
+    return state is not None and restaurant_id in state['restaurants']
+
+
+### Incremental updates (called from signals)
+
+def record_rating_change(restaurant_id, rating_delta, count_delta):
+    """
+    Re-rank the cached leaderboard after a review of `restaurant_id` changed
+    the rating totals by (rating_delta, count_delta). Run after the review's
+    transaction commits so the restaurant row holds the new aggregates.
+    """
+    if not cache.add(LEADERBOARD_LOCK_KEY, True, LOCK_TIMEOUT):
+        # Another process is patching the entry; let the next read rebuild it
+        mark_leaderboard_stale()
+        return
+    try:
+        state = cache.get(LEADERBOARD_KEY)
+        if state is None:
+            return
+        if cache.get(LEADERBOARD_REFRESH_KEY):
+            # A rebuild may already have read the old row
+            mark_leaderboard_stale()
+            return
+        state['rating_sum'] += Decimal(str(rating_delta))
+        state['review_count'] += count_delta
+        _rerank(state, restaurant_id)
+        cache.set(LEADERBOARD_KEY, state, None)
+    finally:
+        cache.delete(LEADERBOARD_LOCK_KEY)
+
+
+def _rerank(state, restaurant_id):
+    mean = _mean_rating(state['rating_sum'], state['review_count'])
+    restaurants = state['restaurants']
+    was_full = len(state['ranking']) >= LEADERBOARD_BUFFER
+    was_ranked = restaurant_id in restaurants
+
+    row = (
+        Restaurant.objects.filter(pk=restaurant_id, review_count__gt=0)
+        .values('avg_rating', 'review_count', 'rating_sum')
+        .first()
+    )
+    if row is None:
+        restaurants.pop(restaurant_id, None)
+    elif was_ranked:
+        for field, value in row.items():
+            setattr(restaurants[restaurant_id], field, value)
+
+    # The site mean moved too, so every kept entry is rescored
+    ranking = sorted(
+        ((bayesian_score(r.rating_sum, r.review_count, mean), pk) for pk, r in restaurants.items()),
+        reverse=True,
+    )
+
+    if row is not None and not was_ranked:
+        entry = (bayesian_score(row['rating_sum'], row['review_count'], mean), restaurant_id)
+        if not was_full or (ranking and entry > ranking[-1]):
+            restaurant = _ranked_restaurants().filter(pk=restaurant_id).first()
+            if restaurant is not None:
+                restaurants[restaurant_id] = restaurant
+                ranking.append(entry)
+                ranking.sort(reverse=True)
+
+    ranking = ranking[:LEADERBOARD_BUFFER]
+    kept = {pk for _, pk in ranking}
+    for pk in list(restaurants):
+        if pk not in kept:
+            del restaurants[pk]
+    state['ranking'] = ranking
+
+    # Restaurants below the buffer are unknown: one that may have been overtaken
+    # by them, or that left a gap, needs a rebuild to backfill
+    if was_ranked and was_full and (restaurant_id not in kept or ranking[-1][1] == restaurant_id):
+        mark_leaderboard_stale()
@@ -0,0 +1,140 @@
+"""
+Month view of a restaurant's availability.
+
+For every day of a month and every SLOT_MINUTES slot of the opening hours,
+the tables and seats not held by an active reservation. The whole month is
+one query: generate_series() lays out the slots, overlapping reservations
+are joined to the tables they list and the result is grouped per slot.
+
+Months are cached per restaurant. Every reservation, table or opening hours
+change of a restaurant bumps its version key, so the next request
+recomputes instead of serving stale capacity.
+"""
+import calendar
+import time
+from datetime import date as date_type
+
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from ..models import TableSlot
+from .availability import ACTIVE_RESERVATION_STATUSES
+
+
+CALENDAR_CACHE_TIMEOUT = 60 * 10
+CALENDAR_VERSION_KEY = 'calendar:version:{}'
+
+# Overnight slots stay on the day the sitting opened (Friday's 1 AM slot is
+# listed under Friday). Reservations from the day before the month can still
+# run into its first slots.
+MONTH_AVAILABILITY_SQL = """
+    WITH slots AS (
+        SELECT d::date AS day, s AS slot_start
+        FROM rr_app_restaurant r
+        CROSS JOIN generate_series(%(first)s::timestamp, %(last)s::timestamp, interval '1 day') AS d
+        CROSS JOIN LATERAL generate_series(
+            d + r.opening_time,
+            d + r.closing_time
+              + CASE WHEN r.closing_time < r.opening_time THEN interval '1 day' ELSE interval '0' END
+              - make_interval(mins => %(slot)s),
+            make_interval(mins => %(slot)s)
+        ) AS s
+        WHERE r.id = %(restaurant)s
+          AND r.opening_time IS NOT NULL AND r.closing_time IS NOT NULL
+    ),
+    held AS (
+        SELECT DISTINCT sl.slot_start, t.id, t.capacity
+        FROM slots sl
+        JOIN rr_app_reservation res
+          ON res.restaurant_id = %(restaurant)s
+         AND res.status = ANY(%(statuses)s)
+         AND res.date BETWEEN %(first)s::date - 1 AND %(last)s::date + 1
+         AND res.date + res.time < sl.slot_start + make_interval(mins => %(slot)s)
+         AND res.date + res.time + make_interval(mins => res.duration_minutes) > sl.slot_start
+        JOIN rr_app_table t
+          ON t.restaurant_id = res.restaurant_id AND t.is_active AND t.number = ANY(res.table_numbers)
+    ),
+    totals AS (
+        SELECT count(*) AS tables, coalesce(sum(capacity), 0) AS seats
+        FROM rr_app_table
+        WHERE restaurant_id = %(restaurant)s AND is_active
+    )
+    SELECT sl.day, sl.slot_start::time,
+           totals.tables - count(h.id),
+           totals.seats - coalesce(sum(h.capacity), 0)
+    FROM slots sl
+    CROSS JOIN totals
+    LEFT JOIN held h ON h.slot_start = sl.slot_start
+    GROUP BY sl.day, sl.slot_start, totals.tables, totals.seats
+    ORDER BY sl.slot_start
+"""
+
+
+def parse_month(value, today=None):
+    """(year, month) from 'YYYY-MM', the current month when empty. Raises ValueError."""
+    if not value:
+        today = today or timezone.localdate()
+        return today.year, today.month
+    year, _, month = value.partition('-')
+    year, month = int(year), int(month)
+    if not 1 <= month <= 12 or not 1 <= year <= 9999:
+        raise ValueError('month must be formatted as YYYY-MM.')
+    return year, month
+
+
+def _calendar_version(restaurant_id):
+    return cache.get_or_set(CALENDAR_VERSION_KEY.format(restaurant_id), time.time_ns(), None)
+
+
+def invalidate_calendar(restaurant_id):
+    cache.set(CALENDAR_VERSION_KEY.format(restaurant_id), time.time_ns(), None)
+
+
+def build_month_availability(restaurant_id, year, month):
+    first = date_type(year, month, 1)
+    last = date_type(year, month, calendar.monthrange(year, month)[1])
+    with connection.cursor() as cursor:
+        cursor.execute(MONTH_AVAILABILITY_SQL, {
+            'restaurant': restaurant_id,
+            'first': first,
+            'last': last,
+            'slot': TableSlot.SLOT_MINUTES,
+            'statuses': list(ACTIVE_RESERVATION_STATUSES),
+        })
+        rows = cursor.fetchall()
+
+    days = {
+        day: {'date': day.isoformat(), 'free_tables': 0, 'free_seats': 0, 'slots': []}
+        for day in (date_type(year, month, n) for n in range(1, last.day + 1))
+    }
+    for day, start, free_tables, free_seats in rows:
+        entry = days[day]
+        entry['slots'].append({
+            'time': start.strftime('%H:%M'),
+            'free_tables': free_tables,
+            'free_seats': free_seats,
+        })
+        # A day is as bookable as its best slot
+        entry['free_tables'] = max(entry['free_tables'], free_tables)
+        entry['free_seats'] = max(entry['free_seats'], free_seats)
+
+    return {
+        'month': f'{year:04d}-{month:02d}',
+        'slot_minutes': TableSlot.SLOT_MINUTES,
+        'days': list(days.values()),
+    }
+
+
+def get_month_availability(restaurant_id, year, month):
+    """
+    {'month', 'slot_minutes', 'days': [{'date', 'free_tables', 'free_seats',
+    'slots': [{'time', 'free_tables', 'free_seats'}]}]} for a restaurant,
+    served from the cache. Closed days have no slots.
+    """
+    key = f'calendar:{restaurant_id}:{year:04d}-{month:02d}:{_calendar_version(restaurant_id)}'
+    availability = cache.get(key)
+    if availability is None:
+        availability = build_month_availability(restaurant_id, year, month)
+        cache.set(key, availability, CALENDAR_CACHE_TIMEOUT)
+    return availability
@@ -0,0 +1,141 @@
+"""
+Reservation exports for restaurant staff.
+
+A restaurant's reservations for a date range are read through a server-side
+cursor (QuerySet.iterator(chunk_size=...)) and turned into CSV or iCalendar
+text one row at a time, so the rows are never all in memory. The view wraps
+the generators in a StreamingHttpResponse; the export_reservations command
+writes them to a file.
+"""
+import csv
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from ..models import Reservation
+
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'ics')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ics': 'text/calendar; charset=utf-8',
+}
+
+EXPORT_FIELDS = [
+    'id', 'date', 'time', 'duration_minutes', 'name', 'email', 'guest_count',
+    'table_numbers', 'status', 'notes', 'created_at',
+]
+
+# iCalendar STATUS of a VEVENT for each reservation status
+ICAL_STATUS = {
+    'PENDING': 'TENTATIVE',
+    'CONFIRMED': 'CONFIRMED',
+    'CANCELLED': 'CANCELLED',
+    'COMPLETED': 'CONFIRMED',
+}
+
+
+def export_rows(restaurant_id, start, end, statuses=None):
+    """Reservation values in sitting order, streamed from a server-side cursor"""
+    reservations = Reservation.objects.filter(restaurant_id=restaurant_id, date__range=(start, end))
+    if statuses:
+        reservations = reservations.filter(status__in=statuses)
+    rows = reservations.order_by('date', 'time', 'id').values(*EXPORT_FIELDS)
+    return rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+### CSV
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    """Guest-supplied text is neutralized with a leading quote so it is never run as a formula"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row['table_numbers'] = ' '.join(row['table_numbers'])
+        yield writer.writerow([_csv_cell(row[field]) for field in EXPORT_FIELDS])
+
+
+### iCalendar (RFC 5545)
+
+def _ical_text(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _ical_time(value):
+    return value.strftime('%Y%m%dT%H%M%SZ')
+
+
+def _fold(line):
+    # Content lines are at most 75 octets; continuations start with a space
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        cut = min(limit, len(encoded))
+        # Do not split a multi-byte character
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def ical_lines(rows, calendar_name='Reservations'):
+    stamp = _ical_time(datetime.now(dt_timezone.utc))
+    yield _fold('BEGIN:VCALENDAR')
+    yield _fold('VERSION:2.0')
+    yield _fold('PRODID:-//Restaurant Reservation//Reservations//EN')
+    yield _fold(f'X-WR-CALNAME:{_ical_text(calendar_name)}')
+    for row in rows:
+        # Reservation dates and times are UTC wall clock (see Reservation.sitting)
+        start = datetime.combine(row['date'], row['time'])
+        end = start + timedelta(minutes=row['duration_minutes'])
+        description = [f"Guests: {row['guest_count']}", f"Email: {row['email']}"]
+        if row['table_numbers']:
+            description.append(f"Tables: {', '.join(row['table_numbers'])}")
+        if row['notes']:
+            description.append(f"Notes: {row['notes']}")
+
+        yield _fold('BEGIN:VEVENT')
+        yield _fold(f"UID:reservation-{row['id']}@rr")
+        yield _fold(f'DTSTAMP:{stamp}')
+        yield _fold(f'DTSTART:{_ical_time(start)}')
+        yield _fold(f'DTEND:{_ical_time(end)}')
+        yield _fold(f"SUMMARY:{_ical_text(row['name'])} ({row['guest_count']})")
+        yield _fold(f"DESCRIPTION:{_ical_text(chr(10).join(description))}")
+        yield _fold(f"STATUS:{ICAL_STATUS.get(row['status'], 'TENTATIVE')}")
+        yield _fold('END:VEVENT')
+    yield _fold('END:VCALENDAR')
+
+
+def export_lines(fmt, restaurant_id, start, end, statuses=None, calendar_name='Reservations'):
+    """Text chunks of the export in `fmt` ('csv' or 'ics')"""
+    rows = export_rows(restaurant_id, start, end, statuses)
+    if fmt == 'ics':
+        return ical_lines(rows, calendar_name)
+    return csv_lines(rows)
+
+
+def export_filename(restaurant_id, start, end, fmt):
+    return f'reservations-{restaurant_id}-{start.isoformat()}-{end.isoformat()}.{fmt}'
@@ -0,0 +1,112 @@
+"""
+Moving past reservations through their lifecycle.
+
+    CONFIRMED -> COMPLETED   once the sitting has ended
+    PENDING   -> COMPLETED   once the sitting has ended
+
+Bookings are PENDING until an admin confirms them, which most never are, so
+an unconfirmed booking whose sitting is over is treated like a confirmed one.
+Nothing is moved while the party may still be seated.
+
+Each batch is one statement: it picks up to `batch_size` due reservations
+through the partial `reservation_active_date_idx` index, flips their status
+and drops their table holds and slot claims. Rows are locked with FOR UPDATE SKIP LOCKED, so
+several workers (or a worker and a guest editing a reservation) never wait
+on each other or move the same reservation twice. Every batch commits on its
+own, keeping locks short however large the backlog is.
+
+Signals are not sent; the calendars of the touched restaurants are
+invalidated once per batch instead.
+"""
+import time
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .reservation_calendar import invalidate_calendar
+
+
+LIFECYCLE_BATCH_SIZE = 500
+
+Transition = namedtuple('Transition', ['from_status', 'to_status', 'due_after'])
+
+TRANSITIONS = [
+    # due_after: the SQL offset from the reservation's start that makes it due
+    Transition('CONFIRMED', 'COMPLETED', 'make_interval(mins => duration_minutes)'),
+    Transition('PENDING', 'COMPLETED', 'make_interval(mins => duration_minutes)'),
+]
+
+# The literal status list lets the planner use the partial index
+ADVANCE_RESERVATIONS_SQL = """
+    WITH batch AS (
+        SELECT id
+        FROM rr_app_reservation
+        WHERE status IN ('PENDING', 'CONFIRMED')
+          AND status = %(from_status)s
+          AND date <= %(today)s
+          AND date + time + {due_after} <= %(now)s
+        ORDER BY date, time
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved AS (
+        UPDATE rr_app_reservation r
+        SET status = %(to_status)s
+        FROM batch
+        WHERE r.id = batch.id
+        RETURNING r.id, r.restaurant_id
+    ),
+    released_holds AS (
+        DELETE FROM rr_app_reservationtable h
+        USING moved
+        WHERE h.reservation_id = moved.id
+    ),
+    released_slots AS (
+        UPDATE rr_app_tableslot s
+        SET state = 'FREE', reservation_id = NULL
+        FROM moved
+        WHERE s.reservation_id = moved.id
+    )
+    SELECT restaurant_id FROM moved
+"""
+
+BatchResult = namedtuple('BatchResult', ['transition', 'count', 'seconds'])
+
+
+def advance_batch(transition, now, batch_size=LIFECYCLE_BATCH_SIZE):
+    """Move one batch of due reservations; returns how many moved"""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(ADVANCE_RESERVATIONS_SQL.format(due_after=transition.due_after), {
+                'from_status': transition.from_status,
+                'to_status': transition.to_status,
+                'today': now.date(),
+                'now': now,
+                'batch_size': batch_size,
+            })
+            rows = cursor.fetchall()
+
+    for restaurant_id in {restaurant_id for restaurant_id, in rows} - {None}:
+        invalidate_calendar(restaurant_id)
+    return len(rows)
+
+
+def advance_reservations(batch_size=LIFECYCLE_BATCH_SIZE, max_batches=None, now=None):
+    """
+    Run every transition in batches until nothing is due (or `max_batches`
+    batches per transition ran). Yields a BatchResult per batch.
+    """
+    if batch_size < 1:
+        raise ValueError(f'batch_size must be at least 1, not {batch_size}')
+    # Reservation dates and times are stored as UTC wall clock (see Reservation.sitting)
+    now = now or datetime.now(dt_timezone.utc).replace(tzinfo=None)
+    for transition in TRANSITIONS:
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            started = time.perf_counter()
+            count = advance_batch(transition, now, batch_size)
+            batches += 1
+            yield BatchResult(transition, count, time.perf_counter() - started)
+            if count < batch_size:
+                break
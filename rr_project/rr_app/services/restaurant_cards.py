@@ -0,0 +1,87 @@
+"""
+Restaurant card JSON built by PostgreSQL.
+
+The SQL below produces the same shape as Restaurant.to_dict(), so the listing
+can pass the database's JSON text straight into the response without
+instantiating a model, a related manager or a dict per row.
+"""
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+
+# Mirrors Restaurant.to_dict(), Restaurant.is_open_now and Restaurant.price_range_display
+CARDS_SQL = """
+    SELECT COALESCE(json_agg(card ORDER BY page.ord), '[]'::json)::text
+    FROM unnest(%(ids)s::bigint[]) WITH ORDINALITY AS page(id, ord)
+    JOIN LATERAL (
+        SELECT json_build_object(
+            'id', r.id,
+            'name', r.name,
+            'address', r.address,
+            'description', r.description,
+            'price_range_display', CASE
+                WHEN r.price_min <> 0 AND r.price_max <> 0
+                THEN '₱' || trunc(r.price_min)::bigint || ' - ₱' || trunc(r.price_max)::bigint
+                ELSE 'Price not available'
+            END,
+            'is_open_now', CASE
+                WHEN r.opening_time IS NULL OR r.closing_time IS NULL THEN false
+                WHEN r.closing_time < r.opening_time
+                THEN %(now)s::time >= r.opening_time OR %(now)s::time <= r.closing_time
+                ELSE r.opening_time <= %(now)s::time AND %(now)s::time <= r.closing_time
+            END,
+            'opening_time', to_char(r.opening_time, 'HH12:MI AM'),
+            'closing_time', to_char(r.closing_time, 'HH12:MI AM'),
+            'avg_rating', r.avg_rating,
+            'review_count', r.review_count,
+            'bookmark_count', (
+                SELECT COUNT(*) FROM rr_app_restaurant_customers rc
+                WHERE rc.restaurant_id = r.id
+            ),
+            'image', CASE WHEN r.image <> '' THEN %(media_url)s || r.image END,
+            'cuisines', (
+                SELECT COALESCE(json_agg(json_build_object('name', c.name, 'id', c.id)
+                                         ORDER BY c.created_at DESC), '[]'::json)
+                FROM rr_app_cuisine c
+                JOIN rr_app_cuisine_restaurant cr ON cr.cuisine_id = c.id
+                WHERE cr.restaurant_id = r.id
+            ),
+            'tags', (
+                SELECT COALESCE(json_agg(json_build_object('tag', t.tag, 'id', t.id)
+                                         ORDER BY t.tag), '[]'::json)
+                FROM rr_app_tags t
+                JOIN rr_app_tags_restaurants tr ON tr.tags_id = t.id
+                WHERE tr.restaurant_id = r.id
+            )
+        ) AS card
+        FROM rr_app_restaurant r
+        WHERE r.id = page.id
+    ) AS cards ON true
+"""
+
+
+def restaurant_cards_json(ids):
+    """Return the JSON array text of the cards for `ids`, in the given order"""
+    if not ids:
+        return '[]'
+    with connection.cursor() as cursor:
+        cursor.execute(CARDS_SQL, {
+            'ids': list(ids),
+            'now': timezone.now().time(),
+            'media_url': settings.MEDIA_URL,
+        })
+        # Cast to text in SQL so the driver hands back the JSON without decoding it
+        return cursor.fetchone()[0]
+
+
+# Same escapes as django.utils.html.json_script, for embedding in a <script> tag
+JSON_SCRIPT_ESCAPES = {
+    ord('>'): '\\u003E',
+    ord('<'): '\\u003C',
+    ord('&'): '\\u0026',
+}
+
+
+def escape_json_for_script(text):
+    return text.translate(JSON_SCRIPT_ESCAPES)
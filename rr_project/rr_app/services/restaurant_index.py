@@ -0,0 +1,259 @@
+"""
+In-process filter index for the restaurant listing.
+
+Every cuisine and tag maps to a bitset of restaurant ids (a Python int where
+bit N is restaurant N), so any filter combination resolves with bitwise OR
+inside a group and AND across groups. Prices are kept as sorted
+(price, id) arrays with PrefixBitsets over them, so a budget range becomes
+two bisects and a few bitwise operations however many restaurants match.
+
+The index is built lazily on first use and then patched by the signals in
+signals.py. Each gunicorn worker holds its own copy; a shared version key in
+the Django cache tells a worker that another process changed the data and it
+has to rebuild. That key is only shared when the cache is (Redis), and
+QuerySet.update() sends no signals at all, so every copy is also rebuilt
+once it is INDEX_MAX_AGE_SECONDS old whatever the version says.
+"""
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from django.core.cache import cache
+
+from ..models import Restaurant, Cuisine, Tags
+
+
+INDEX_VERSION_KEY = 'restaurant_index:version'
+# Bounds how long a change the version key missed stays invisible
+INDEX_MAX_AGE_SECONDS = 60
+# Entries between two stored prefix bitsets: bounds both their memory and the
+# bits a query ORs in on top of the nearest one
+PRICE_BUCKET_SIZE = 256
+
+CUISINES = 'cuisines'
+TAGS = 'tags'
+
+
+def bump_index_version():
+    """Tell every process that its index is stale; returns the new version"""
+    version = time.time_ns()
+    cache.set(INDEX_VERSION_KEY, version, None)
+    return version
+
+
+def bitset_from_ids(ids):
+    """Build a bitset from an iterable of ids in one pass"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    buf = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        buf[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(buf, 'little')
+
+
+def iter_bits(bitset, descending=False):
+    """Yield the set bit positions of a bitset in ascending or descending order"""
+    bits = bin(bitset)[2:]
+    length = len(bits)
+    if descending:
+        pos = bits.find('1')
+        while pos != -1:
+            yield length - 1 - pos
+            pos = bits.find('1', pos + 1)
+    else:
+        pos = bits.rfind('1')
+        while pos != -1:
+            yield length - 1 - pos
+            pos = bits.rfind('1', 0, pos)
+
+
+class PrefixBitsets:
+    """
+    The bitsets of the ids in every prefix of a sorted [(value, id)] list.
+    One is stored every PRICE_BUCKET_SIZE entries; any other prefix is the
+    stored one before it plus fewer than PRICE_BUCKET_SIZE ids. Ids are
+    unique, so a suffix is the total XOR the prefix before it.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.checkpoints = [0]
+        bits = 0
+        for start in range(0, len(entries), PRICE_BUCKET_SIZE):
+            bits |= bitset_from_ids(pk for _, pk in entries[start:start + PRICE_BUCKET_SIZE])
+            self.checkpoints.append(bits)
+        self.total = bits
+
+    def prefix(self, end):
+        """Bitset of the ids of entries[:end]"""
+        bucket = end // PRICE_BUCKET_SIZE
+        rest = self.entries[bucket * PRICE_BUCKET_SIZE:end]
+        return self.checkpoints[bucket] | bitset_from_ids(pk for _, pk in rest)
+
+    def suffix(self, start):
+        """Bitset of the ids of entries[start:]"""
+        return self.total ^ self.prefix(start)
+
+
+class RestaurantFilterIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self.built = False
+        self.built_at = 0.0
+        self.all = 0
+        self.labels = {CUISINES: {}, TAGS: {}}
+        self.prices = {}
+        self.price_min = []
+        self.price_max = []
+        # PrefixBitsets over price_min and price_max; None after a change until the next query
+        self.price_bits = None
+
+    ### Building
+
+    def rebuild(self):
+        # Read the version first so a change made during the rebuild triggers another one
+        version = cache.get(INDEX_VERSION_KEY)
+        if version is None:
+            version = bump_index_version()
+        started = time.monotonic()
+
+        restaurants = list(Restaurant.objects.values_list('id', 'price_min', 'price_max'))
+        cuisine_links = Cuisine.restaurant.through.objects.values_list('cuisine_id', 'restaurant_id')
+        tag_links = Tags.restaurants.through.objects.values_list('tags_id', 'restaurant_id')
+
+        labels = {CUISINES: {}, TAGS: {}}
+        for group, links in ((CUISINES, cuisine_links), (TAGS, tag_links)):
+            members = {}
+            for label_id, restaurant_id in links.iterator():
+                members.setdefault(label_id, []).append(restaurant_id)
+            labels[group] = {label_id: bitset_from_ids(ids) for label_id, ids in members.items()}
+
+        prices = {pk: (low, high) for pk, low, high in restaurants if high}
+
+        with self._lock:
+            self.all = bitset_from_ids(pk for pk, _, _ in restaurants)
+            self.labels = labels
+            self.prices = prices
+            self.price_min = sorted((low, pk) for pk, (low, high) in prices.items())
+            self.price_max = sorted((high, pk) for pk, (low, high) in prices.items())
+            self.price_bits = self._price_bitsets()
+            self.version = version
+            self.built = True
+            self.built_at = started
+
+    def ensure_current(self):
+        version = cache.get(INDEX_VERSION_KEY)
+        if (
+            not self.built or version is None or version != self.version
+            or time.monotonic() - self.built_at > INDEX_MAX_AGE_SECONDS
+        ):
+            self.rebuild()
+
+    ### Incremental updates (called from signals)
+
+    def _apply(self, change):
+        """
+        Apply a local change and publish a new version so other processes rebuild.
+        If another process changed the data since our last sync, this copy is
+        marked stale instead so the next query rebuilds it too.
+        """
+        with self._lock:
+            previous = cache.get(INDEX_VERSION_KEY)
+            version = bump_index_version()
+            if not self.built:
+                return
+            change()
+            self.version = version if previous == self.version else None
+
+    def link(self, group, label_id, restaurant_ids):
+        def change():
+            bits = self.labels[group].get(label_id, 0)
+            for pk in restaurant_ids:
+                bits |= 1 << pk
+            self.labels[group][label_id] = bits
+        self._apply(change)
+
+    def unlink(self, group, label_id, restaurant_ids):
+        def change():
+            bits = self.labels[group].get(label_id, 0)
+            for pk in restaurant_ids:
+                bits &= ~(1 << pk)
+            self.labels[group][label_id] = bits
+        self._apply(change)
+
+    def drop_label(self, group, label_id):
+        self._apply(lambda: self.labels[group].pop(label_id, None))
+
+    def _remove_price(self, pk):
+        old = self.prices.pop(pk, None)
+        if old is None:
+            return
+        low, high = old
+        del self.price_min[bisect_left(self.price_min, (low, pk))]
+        del self.price_max[bisect_left(self.price_max, (high, pk))]
+        self.price_bits = None
+
+    def set_restaurant(self, pk, price_min, price_max):
+        def change():
+            self.all |= 1 << pk
+            self._remove_price(pk)
+            if price_max:
+                self.prices[pk] = (price_min, price_max)
+                insort(self.price_min, (price_min, pk))
+                insort(self.price_max, (price_max, pk))
+                self.price_bits = None
+        self._apply(change)
+
+    def remove_restaurant(self, pk):
+        def change():
+            mask = ~(1 << pk)
+            self.all &= mask
+            for members in self.labels.values():
+                for label_id, bits in members.items():
+                    members[label_id] = bits & mask
+            self._remove_price(pk)
+        self._apply(change)
+
+    ### Queries
+
+    def _any_of(self, group, label_ids):
+        bits = 0
+        members = self.labels[group]
+        for label_id in label_ids:
+            bits |= members.get(label_id, 0)
+        return bits
+
+    def _price_bitsets(self):
+        return PrefixBitsets(self.price_min), PrefixBitsets(self.price_max)
+
+    def _price_overlap(self, low, high):
+        """Restaurants whose [price_min, price_max] overlaps [low, high]"""
+        if self.price_bits is None:
+            # Rebuilt once after a batch of price changes, not per query
+            self.price_bits = self._price_bitsets()
+        by_min, by_max = self.price_bits
+        starts_before_high = by_min.total
+        if high is not None:
+            starts_before_high = by_min.prefix(bisect_right(self.price_min, (high, float('inf'))))
+        ends_after_low = by_max.total
+        if low is not None:
+            ends_after_low = by_max.suffix(bisect_left(self.price_max, (low, -1)))
+        return starts_before_high & ends_after_low
+
+    def resolve(self, cuisine_ids=None, tag_ids=None, price_low=None, price_high=None):
+        """Return the bitset of restaurants matching every active filter"""
+        self.ensure_current()
+        with self._lock:
+            result = self.all
+            if cuisine_ids:
+                result &= self._any_of(CUISINES, cuisine_ids)
+            if tag_ids:
+                result &= self._any_of(TAGS, tag_ids)
+            if price_low is not None or price_high is not None:
+                result &= self._price_overlap(price_low, price_high)
+            return result
+
+
+restaurant_index = RestaurantFilterIndex()
@@ -0,0 +1,558 @@
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.backends.postgresql.psycopg_any import NumericRange
+from django.db.models import (
+    BooleanField, Case, CharField, Count, DecimalField, Exists, F, Func, IntegerField, Max, Min,
+    OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Least, Round
+from django.utils import timezone
+
+from ..models import Restaurant, Cuisine, Tags, Review
+from ..utils.pagination import CursorPaginator, encode_cursor, decode_cursor, InvalidCursor
+from .restaurant_index import restaurant_index, iter_bits
+from .restaurant_cards import restaurant_cards_json
+
+
+DEFAULT_PAGE_SIZE = 12
+MAX_PAGE_SIZE = 48
+
+# Above this many filter matches the id list is not inlined into SQL;
+# the EXISTS filters are used instead
+INDEX_IN_CLAUSE_LIMIT = 5000
+
+# Maps the sort keys used by the listing page to the column to order by.
+# "newest" uses id, which is assigned in creation order.
+SORT_FIELDS = {
+    'newest': 'id',
+    'rating': 'avg_rating',
+    'bookmarks': 'bookmark_count',
+    'open': 'is_open',
+}
+
+TRUE_VALUES = {'1', 'true', 'on', 'yes'}
+
+
+def parse_id_list(params, key):
+    """
+    Read a list of integer ids from a QueryDict.
+    Accepts both repeated keys (?tags=1&tags=2) and comma-separated values (?tags=1,2).
+    """
+    ids = []
+    for value in params.getlist(key):
+        for part in value.split(','):
+            part = part.strip()
+            if part.isdigit():
+                ids.append(int(part))
+    return ids
+
+
+def parse_page_size(value):
+    """Clamp the requested page size to a sane range"""
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+def parse_price(value):
+    """Read a non-negative price from a query param, None when missing or invalid"""
+    try:
+        price = Decimal(value)
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+
+def parse_flag(value):
+    """Read a boolean query param such as ?open_now=1"""
+    return (value or '').strip().lower() in TRUE_VALUES
+
+
+def parse_budget(params):
+    """
+    Read the price_min/price_max budget from a QueryDict as (low, high).
+    Swapped bounds are put back in order.
+    """
+    low = parse_price(params.get('price_min'))
+    high = parse_price(params.get('price_max'))
+    if low is not None and high is not None and low > high:
+        low, high = high, low
+    return low, high
+
+
+def price_overlap(price_low=None, price_high=None):
+    """
+    The budget [price_low, price_high] as a numrange for `price_range__overlap`,
+    or None when no bound is given. A missing bound is left open.
+    """
+    if price_low is None and price_high is None:
+        return None
+    return NumericRange(price_low, price_high, '[]')
+
+
+def filter_restaurants(queryset, cuisine_ids=None, tag_ids=None, price_low=None, price_high=None):
+    """
+    Keep restaurants that have at least one of the selected cuisines,
+    at least one of the selected tags and a price range overlapping
+    [price_low, price_high].
+
+    Uses EXISTS over the M2M through tables so no duplicate rows are produced
+    and no DISTINCT is needed. The budget is an `&&` on the GiST-indexed
+    price_range column; restaurants without prices have a NULL range and never match.
+    """
+    if cuisine_ids:
+        queryset = queryset.filter(Exists(
+            Cuisine.restaurant.through.objects.filter(
+                restaurant_id=OuterRef('pk'),
+                cuisine_id__in=cuisine_ids,
+            )
+        ))
+    if tag_ids:
+        queryset = queryset.filter(Exists(
+            Tags.restaurants.through.objects.filter(
+                restaurant_id=OuterRef('pk'),
+                tags_id__in=tag_ids,
+            )
+        ))
+    budget = price_overlap(price_low, price_high)
+    if budget is not None:
+        queryset = queryset.filter(price_range__overlap=budget)
+    return queryset
+
+
+def open_at_q(at):
+    """
+    Q matching restaurants open at time `at`, the SQL counterpart of
+    Restaurant.is_open_now. A closing time earlier than the opening time
+    means the restaurant closes after midnight. Restaurants without hours
+    never match since comparisons with NULL are false.
+    """
+    same_day = Q(closing_time__gte=F('opening_time')) & Q(opening_time__lte=at, closing_time__gte=at)
+    overnight = Q(closing_time__lt=F('opening_time')) & (Q(opening_time__lte=at) | Q(closing_time__gte=at))
+    return same_day | overnight
+
+
+def is_open_expression(at):
+    """Boolean column expression of open_at_q(), for annotating and sorting"""
+    return Case(When(open_at_q(at), then=Value(True)), default=Value(False), output_field=BooleanField())
+
+
+def filter_open_at(queryset, at=None):
+    """Keep restaurants open at time `at` (now when None)"""
+    return queryset.filter(open_at_q(at or timezone.now().time()))
+
+
+def sort_ordering(sort_by='newest', order='asc'):
+    """order_by() arguments for a sort key, with id as a unique tie-breaker"""
+    field = SORT_FIELDS.get(sort_by, SORT_FIELDS['newest'])
+    prefix = '-' if order == 'desc' else ''
+    if field == 'id':
+        return [f'{prefix}id']
+    return [f'{prefix}{field}', f'{prefix}id']
+
+
+def sort_restaurants(queryset, sort_by='newest', order='asc', at=None):
+    """
+    Order the queryset by one of SORT_FIELDS, using id as a stable tie-breaker.
+    "open" sorts on whether the restaurant is open at `at` (now when None).
+    """
+    if sort_by == 'bookmarks':
+        queryset = queryset.annotate(bookmark_count=Count('customers', distinct=True))
+    elif sort_by == 'open':
+        queryset = queryset.annotate(is_open=is_open_expression(at or timezone.now().time()))
+    return queryset.order_by(*sort_ordering(sort_by, order))
+
+
+def paginate_restaurants(queryset, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """Return a JSON-serializable payload holding a single page of the queryset"""
+    paginator = Paginator(queryset, page_size)
+    page_obj = paginator.get_page(page)
+
+    # Prefetch only for the rows on this page
+    rows = page_obj.object_list.defer('search_vector').prefetch_related('cuisines', 'tags')
+
+    return {
+        'results': [r.to_dict() for r in rows],
+        'count': paginator.count,
+        'page': page_obj.number,
+        'num_pages': paginator.num_pages,
+        'has_next': page_obj.has_next(),
+    }
+
+
+def _ids_after(candidates, last_id, descending):
+    """Drop every bit up to and including last_id in the paging direction"""
+    if descending:
+        return candidates & ((1 << last_id) - 1)
+    return candidates & ~((1 << (last_id + 1)) - 1)
+
+
+def get_restaurant_page_ids(cuisine_ids=None, tag_ids=None, sort_by='newest', order='asc',
+                            cursor=None, page_size=DEFAULT_PAGE_SIZE, price_low=None, price_high=None,
+                            open_now=False):
+    """
+    Filter, sort and paginate restaurants down to the ids of one page.
+    Returns (ids, count, next_cursor).
+
+    Filters are resolved against the in-memory bitmap index, which also gives
+    the exact result count. For "newest" the page ids come straight from the
+    bitset; other sorts run a keyset-paginated SQL query over the matched ids
+    that only reads the sort columns. Opening hours depend on the current
+    time, so open_now is always applied in SQL.
+    Raises InvalidCursor for a tampered or mismatched cursor.
+    """
+    candidates = restaurant_index.resolve(cuisine_ids, tag_ids, price_low, price_high)
+    count = candidates.bit_count()
+    descending = order == 'desc'
+    if sort_by not in SORT_FIELDS:
+        sort_by = 'newest'
+
+    if sort_by == 'newest' and not open_now:
+        remaining = candidates
+        if cursor:
+            values = decode_cursor(cursor)
+            # Restaurant ids are bit positions: a negative one cannot be shifted (and bools are ints)
+            if len(values) != 1 or type(values[0]) is not int or values[0] < 0:
+                raise InvalidCursor('Invalid pagination cursor.')
+            remaining = _ids_after(candidates, values[0], descending)
+
+        ids = list(islice(iter_bits(remaining, descending=descending), page_size + 1))
+        next_cursor = encode_cursor([ids[page_size - 1]]) if len(ids) > page_size else None
+        return ids[:page_size], count, next_cursor
+
+    restaurants = Restaurant.objects.all()
+    if cuisine_ids or tag_ids or price_low is not None or price_high is not None:
+        if count <= INDEX_IN_CLAUSE_LIMIT:
+            restaurants = restaurants.filter(pk__in=list(iter_bits(candidates)))
+        else:
+            restaurants = filter_restaurants(restaurants, cuisine_ids, tag_ids, price_low, price_high)
+    now = timezone.now().time()
+    if open_now:
+        restaurants = filter_open_at(restaurants, now)
+        count = restaurants.count()
+    sort_field = SORT_FIELDS[sort_by]
+    restaurants = sort_restaurants(restaurants, sort_by, order, at=now).values(*dict.fromkeys(('id', sort_field)))
+
+    page = CursorPaginator(restaurants, sort_ordering(sort_by, order), page_size).page(cursor)
+    return [row['id'] for row in page.items], count, page.next_cursor
+
+
+def get_restaurant_page_json(**kwargs):
+    """
+    One listing page as JSON text, ready to be written into a response.
+    The cards themselves are built by PostgreSQL (see restaurant_cards.py).
+    """
+    ids, count, next_cursor = get_restaurant_page_ids(**kwargs)
+    return '{"results": %s, "count": %d, "next_cursor": %s, "has_next": %s}' % (
+        restaurant_cards_json(ids),
+        count,
+        json.dumps(next_cursor),
+        json.dumps(next_cursor is not None),
+    )
+
+
+### Full-text search
+
+SEARCH_CONFIG = 'english'
+
+
+def _related_names(model, restaurant_lookup, name_field):
+    """Subquery aggregating the related names of a restaurant into one string"""
+    return Subquery(
+        model.objects.filter(**{restaurant_lookup: OuterRef('pk')})
+        .order_by()
+        .values(restaurant_lookup)
+        .annotate(names=StringAgg(name_field, delimiter=' '))
+        .values('names')
+    )
+
+
+def search_vector_expression():
+    """
+    Weighted document for Restaurant.search_vector:
+    name (A), cuisine and tag names (B), description (C), address (D).
+    """
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            _related_names(Cuisine, 'restaurant', 'name'),
+            _related_names(Tags, 'restaurants', 'tag'),
+            weight='B', config=SEARCH_CONFIG,
+        )
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+        + SearchVector('address', weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(restaurant_ids=None):
+    """
+    Recompute the stored search vector of the given restaurants (all when None)
+    in a single UPDATE. Returns the number of restaurants updated.
+    """
+    restaurants = Restaurant.objects.all()
+    if restaurant_ids is not None:
+        restaurant_ids = list(restaurant_ids)
+        if not restaurant_ids:
+            return 0
+        restaurants = restaurants.filter(pk__in=restaurant_ids)
+    return restaurants.update(search_vector=search_vector_expression())
+
+
+def search_restaurants(query, page=1, page_size=DEFAULT_PAGE_SIZE, price_low=None, price_high=None):
+    """
+    Match restaurants against the GIN-indexed search vector and order them
+    by ts_rank, best rated first on ties. An optional budget narrows the
+    matches to restaurants whose price range overlaps it.
+    """
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    restaurants = filter_restaurants(
+        Restaurant.objects.filter(search_vector=search_query),
+        price_low=price_low, price_high=price_high,
+    )
+    restaurants = (
+        restaurants
+        .annotate(rank=SearchRank(F('search_vector'), search_query))
+        .order_by('-rank', '-avg_rating', '-id')
+    )
+    payload = paginate_restaurants(restaurants, page, page_size)
+    payload['query'] = query
+    payload['mode'] = 'fulltext'
+    return payload
+
+
+### Fuzzy (trigram) search
+
+DEFAULT_FUZZY_LIMIT = 10
+
+
+def fuzzy_search_restaurants(query, limit=DEFAULT_FUZZY_LIMIT, price_low=None, price_high=None):
+    """
+    Typo-tolerant lookup on restaurant and cuisine names.
+
+    Both candidate queries use the `<%` (word similarity) operator so they are
+    served by the gin_trgm_ops indexes; only the top `limit` of each is read,
+    merged by best score and fetched in one final query.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    budget = price_overlap(price_low, price_high)
+    scores = {}
+
+    name_matches = Restaurant.objects.filter(name__trigram_word_similar=query)
+    cuisine_matches = Cuisine.restaurant.through.objects.filter(cuisine__name__trigram_word_similar=query)
+    if budget is not None:
+        name_matches = name_matches.filter(price_range__overlap=budget)
+        cuisine_matches = cuisine_matches.filter(restaurant__price_range__overlap=budget)
+
+    name_matches = (
+        name_matches
+        .annotate(score=TrigramWordSimilarity(query, 'name'))
+        .order_by('-score')
+        .values_list('id', 'score')[:limit]
+    )
+    for restaurant_id, score in name_matches:
+        scores[restaurant_id] = score
+
+    cuisine_matches = (
+        cuisine_matches
+        .annotate(score=TrigramWordSimilarity(query, 'cuisine__name'))
+        .order_by('-score', '-restaurant__avg_rating')
+        .values_list('restaurant_id', 'score')[:limit]
+    )
+    for restaurant_id, score in cuisine_matches:
+        scores[restaurant_id] = max(score, scores.get(restaurant_id, 0))
+
+    top_ids = sorted(scores, key=lambda pk: scores[pk], reverse=True)[:limit]
+    restaurants = (
+        Restaurant.objects.filter(pk__in=top_ids)
+        .defer('search_vector')
+        .prefetch_related('cuisines', 'tags')
+    )
+    rows = sorted(restaurants, key=lambda r: scores[r.pk], reverse=True)
+
+    return {
+        'results': [r.to_dict() for r in rows],
+        'count': len(rows),
+        'page': 1,
+        'num_pages': 1,
+        'has_next': False,
+        'query': query,
+        'mode': 'fuzzy',
+    }
+
+
+### Facet counts
+
+FACET_CACHE_TIMEOUT = 60 * 10
+FACET_VERSION_KEY = 'restaurant_facets:version'
+PRICE_HISTOGRAM_BUCKETS = 10
+
+
+def invalidate_facet_counts():
+    """
+    Drop every cached facet combination at once by moving to a new cache
+    version; old entries simply expire.
+    """
+    cache.set(FACET_VERSION_KEY, time.time_ns(), None)
+
+
+def _facet_cache_key(cuisine_ids, tag_ids, price_low, price_high):
+    version = cache.get_or_set(FACET_VERSION_KEY, time.time_ns(), None)
+    cuisines = ','.join(str(pk) for pk in sorted(set(cuisine_ids or [])))
+    tags = ','.join(str(pk) for pk in sorted(set(tag_ids or [])))
+    budget = f'{price_low if price_low is not None else ""}-{price_high if price_high is not None else ""}'
+    return f'restaurant_facets:{version}:c{cuisines}:t{tags}:p{budget}'
+
+
+def _facet_query(through, label_field, facet, restaurants):
+    rows = through.objects.order_by()
+    if restaurants is not None:
+        rows = rows.filter(restaurant_id__in=restaurants.values('pk'))
+    return (
+        rows.values(label_field)
+        .annotate(facet=Value(facet, output_field=CharField()), count=Count('restaurant_id'))
+        .values_list('facet', label_field, 'count')
+    )
+
+
+def _price_histogram(restaurants):
+    """
+    Count restaurants per starting-price bucket with width_bucket().
+
+    The buckets span the whole catalog's prices, not just the selection, so
+    they stay put while the user toggles filters.
+    """
+    priced = Restaurant.objects.filter(price_range__isnull=False)
+    bounds = priced.aggregate(low=Min('price_min'), high=Max('price_max'))
+    low, high = bounds['low'], bounds['high']
+    if low is None or high <= low:
+        return []
+
+    buckets = PRICE_HISTOGRAM_BUCKETS
+    # width_bucket() puts a value equal to the upper bound into bucket n + 1
+    bucket = Least(
+        Func(F('price_min'), Value(low), Value(high), Value(buckets),
+             function='width_bucket', output_field=IntegerField()),
+        Value(buckets),
+    )
+    counts = dict(
+        restaurants.filter(price_range__isnull=False)
+        .order_by()
+        .annotate(bucket=bucket)
+        .values('bucket')
+        .annotate(count=Count('id'))
+        .values_list('bucket', 'count')
+    )
+
+    width = (high - low) / buckets
+    return [
+        {
+            'min': round(low + width * (n - 1), 2),
+            'max': round(low + width * n, 2) if n < buckets else high,
+            'count': counts.get(n, 0),
+        }
+        for n in range(1, buckets + 1)
+    ]
+
+
+def get_facet_counts(cuisine_ids=None, tag_ids=None, price_low=None, price_high=None):
+    """
+    Per-cuisine and per-tag restaurant counts for the current selection,
+    plus a price histogram.
+
+    Each group is counted with the filters of the *other* groups applied: a
+    cuisine's count is the number of restaurants with that cuisine among those
+    matching the selected tags and budget, whatever cuisines are selected
+    (likewise for tags).
+    Both label groups come from one UNION ALL of grouped queries over the
+    through tables and are cached per filter combination.
+    """
+    key = _facet_cache_key(cuisine_ids, tag_ids, price_low, price_high)
+    facets = cache.get(key)
+    if facets is not None:
+        return facets
+
+    restaurants = Restaurant.objects.all()
+    has_budget = price_low is not None or price_high is not None
+    cuisine_scope = tag_scope = None
+    if tag_ids or has_budget:
+        cuisine_scope = filter_restaurants(restaurants, tag_ids=tag_ids, price_low=price_low, price_high=price_high)
+    if cuisine_ids or has_budget:
+        tag_scope = filter_restaurants(restaurants, cuisine_ids=cuisine_ids, price_low=price_low, price_high=price_high)
+    price_scope = filter_restaurants(restaurants, cuisine_ids=cuisine_ids, tag_ids=tag_ids)
+
+    cuisine_counts = _facet_query(Cuisine.restaurant.through, 'cuisine_id', 'cuisines', cuisine_scope)
+    tag_counts = _facet_query(Tags.restaurants.through, 'tags_id', 'tags', tag_scope)
+
+    facets = {'cuisines': {}, 'tags': {}, 'price_histogram': _price_histogram(price_scope)}
+    for facet, label_id, count in cuisine_counts.union(tag_counts, all=True):
+        facets[facet][label_id] = count
+
+    cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
+
+
+### Rating aggregates
+
+AVG_RATING_FIELD = DecimalField(max_digits=3, decimal_places=2)
+
+
+def apply_rating_delta(restaurant_id, rating_delta, count_delta):
+    """
+    Atomically shift a restaurant's stored rating aggregates.
+
+    All three columns are updated in a single UPDATE whose right-hand sides
+    read the pre-update row, so concurrent review writes never lose increments.
+    """
+    if restaurant_id is None:
+        return
+    rating_delta = Decimal(str(rating_delta))
+    new_sum = F('rating_sum') + rating_delta
+    new_count = F('review_count') + count_delta
+
+    Restaurant.objects.filter(pk=restaurant_id).update(
+        rating_sum=new_sum,
+        review_count=new_count,
+        avg_rating=Case(
+            When(review_count__gt=-count_delta, then=Cast(new_sum / new_count, AVG_RATING_FIELD)),
+            default=Value(Decimal('0.00')),
+            output_field=AVG_RATING_FIELD,
+        ),
+    )
+
+
+def rebuild_rating_aggregates(queryset=None):
+    """
+    Recompute the stored rating aggregates from the Review table.
+    Returns the number of restaurants updated.
+    """
+    if queryset is None:
+        queryset = Restaurant.objects.all()
+
+    stats = (
+        Review.objects.filter(restaurant=OuterRef('pk'))
+        .order_by()
+        .values('restaurant')
+    )
+    review_count = Subquery(stats.annotate(c=Count('id')).values('c'))
+    rating_sum = Subquery(stats.annotate(s=Sum('rating')).values('s'))
+
+    return queryset.update(
+        review_count=Coalesce(review_count, 0),
+        rating_sum=Coalesce(rating_sum, Value(Decimal('0.00'))),
+        avg_rating=Coalesce(
+            Cast(Round(rating_sum / review_count, 2), AVG_RATING_FIELD),
+            Value(Decimal('0.00')),
+            output_field=AVG_RATING_FIELD,
+        ),
+    )
@@ -0,0 +1,24 @@
+from ..models import Review
+from ..utils.pagination import CursorPaginator
+
+
+REVIEWS_PAGE_SIZE = 10
+REVIEW_ORDERING = ('-created_at', '-id')
+
+
+def get_reviews_page(restaurant_id, cursor=None, page_size=REVIEWS_PAGE_SIZE):
+    """
+    One page of a restaurant's reviews, newest first, keyset-paginated on the
+    (restaurant, -created_at, -id) index. Reviewer names come from the same
+    query, so rendering a page never looks up customer.user per review.
+    Raises InvalidCursor for a tampered cursor.
+    """
+    reviews = (
+        Review.objects.filter(restaurant_id=restaurant_id)
+        .select_related('customer__user')
+        .only(
+            'rating', 'comment', 'created_at', 'restaurant_id',
+            'customer__user__first_name', 'customer__user__last_name',
+        )
+    )
+    return CursorPaginator(reviews, REVIEW_ORDERING, page_size).page(cursor)
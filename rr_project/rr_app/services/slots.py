@@ -0,0 +1,186 @@
+"""
+Precomputed slot inventory.
+
+Every active table gets one TableSlot row per SLOT_MINUTES of opening hours,
+generated a few weeks ahead by the generate_table_slots command. A booking
+claims the FREE rows covering its sitting with
+
+    SELECT ... FOR UPDATE SKIP LOCKED
+
+and marks them BOOKED in the booking's transaction. A row another booker is
+claiming at the same moment is skipped instead of waited on, so concurrent
+bookings of a busy evening never queue behind each other: whoever comes
+second sees the slot as taken and gets an immediate answer.
+
+Rows that were never generated (a date past the horizon, a table added since
+the last run) are not claimable; those bookings fall back to the
+`reservation_table_no_overlap` exclusion constraint alone, which stays the
+backstop for every booking.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.db import connection
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from ..models import TableSlot
+
+
+SLOT_MINUTES = TableSlot.SLOT_MINUTES
+SLOT_HORIZON_DAYS = 28
+
+# One row per (table, slot start) of every day between first and last,
+# following overnight opening hours past midnight. Slots must end by closing.
+GENERATE_SLOTS_SQL = """
+    INSERT INTO rr_app_tableslot (restaurant_id, table_id, date, start, state)
+    SELECT t.restaurant_id, t.id, s::date, s::time, %(free)s
+    FROM rr_app_table t
+    JOIN rr_app_restaurant r ON r.id = t.restaurant_id
+    CROSS JOIN generate_series(%(first)s::timestamp, %(last)s::timestamp, interval '1 day') AS d
+    CROSS JOIN LATERAL generate_series(
+        d + r.opening_time,
+        d + r.closing_time
+          + CASE WHEN r.closing_time < r.opening_time THEN interval '1 day' ELSE interval '0' END
+          - make_interval(mins => %(slot)s),
+        make_interval(mins => %(slot)s)
+    ) AS s
+    WHERE t.is_active
+      AND r.opening_time IS NOT NULL AND r.closing_time IS NOT NULL
+      {restaurant_filter}
+    ON CONFLICT (table_id, date, start) DO NOTHING
+"""
+
+# Slots created over tables that existing reservations already hold
+MARK_HELD_SLOTS_SQL = """
+    UPDATE rr_app_tableslot s
+    SET state = %(booked)s, reservation_id = h.reservation_id
+    FROM rr_app_reservationtable h
+    WHERE h.table_id = s.table_id
+      AND s.state = %(free)s
+      AND s.date BETWEEN %(first)s AND %(last)s
+      AND h.sitting && tstzrange(
+          (s.date + s.start) AT TIME ZONE 'UTC',
+          (s.date + s.start + make_interval(mins => %(slot)s)) AT TIME ZONE 'UTC',
+          '[)'
+      )
+      {restaurant_filter}
+"""
+
+
+### Generation
+
+def generate_slots(first=None, days=SLOT_HORIZON_DAYS, restaurant_ids=None):
+    """
+    Create the missing slots of `days` days from `first` (today by default)
+    and mark the ones existing reservations hold as BOOKED. Safe to re-run.
+    Returns the number of slots created.
+    """
+    first = first or timezone.localdate()
+    # Overnight hours put the last day's late slots on the day after
+    last = first + timedelta(days=days - 1)
+    params = {
+        'first': first,
+        'last': last,
+        'slot': SLOT_MINUTES,
+        'free': TableSlot.FREE,
+        'booked': TableSlot.BOOKED,
+    }
+    restaurant_filter = ''
+    if restaurant_ids is not None:
+        params['restaurant_ids'] = list(restaurant_ids)
+        restaurant_filter = 'AND {}restaurant_id = ANY(%(restaurant_ids)s)'
+
+    with connection.cursor() as cursor:
+        cursor.execute(GENERATE_SLOTS_SQL.format(restaurant_filter=restaurant_filter.format('t.')), params)
+        created = cursor.rowcount
+        params['last'] = last + timedelta(days=1)
+        cursor.execute(MARK_HELD_SLOTS_SQL.format(restaurant_filter=restaurant_filter.format('s.')), params)
+    return created
+
+
+def prune_slots(before=None):
+    """Delete the slots of days before `before` (yesterday by default)"""
+    before = before or timezone.localdate() - timedelta(days=1)
+    return TableSlot.objects.filter(date__lt=before).delete()[0]
+
+
+### Lookup
+
+def sitting_slots(date, time, duration):
+    """(date, start) of every slot overlapping a sitting of `duration` minutes"""
+    start = datetime.combine(date, time)
+    end = start + timedelta(minutes=duration)
+    slot = start.replace(minute=start.minute - start.minute % SLOT_MINUTES, second=0, microsecond=0)
+    slots = []
+    while slot < end:
+        slots.append((slot.date(), slot.time()))
+        slot += timedelta(minutes=SLOT_MINUTES)
+    return slots
+
+
+def covering_q(slots):
+    by_date = defaultdict(list)
+    for date, start in slots:
+        by_date[date].append(start)
+    q = Q()
+    for date, starts in by_date.items():
+        q |= Q(date=date, start__in=starts)
+    return q
+
+
+def slot_availability(restaurant_id, date, time, duration):
+    """
+    {table_id: available} for the tables whose slots covering the sitting have
+    all been generated; one indexed query. Tables missing from the result have
+    no complete inventory for the sitting.
+    """
+    slots = sitting_slots(date, time, duration)
+    rows = (
+        TableSlot.objects.filter(covering_q(slots), restaurant_id=restaurant_id)
+        .values('table_id')
+        .annotate(total=Count('id'), free=Count('id', filter=Q(state=TableSlot.FREE)))
+    )
+    return {
+        row['table_id']: row['free'] == len(slots)
+        for row in rows
+        if row['total'] == len(slots)
+    }
+
+
+### Claiming
+
+def claim_slots(reservation, tables):
+    """
+    Mark the slots covering the reservation's sitting on `tables` as BOOKED.
+
+    Returns the table numbers that are taken: some slot is already booked or
+    is being claimed by a concurrent booking right now. Nothing is claimed
+    then, and the caller should refuse the booking. Must run in a transaction.
+    """
+    if not tables:
+        return set()
+    slots = sitting_slots(reservation.date, reservation.time, reservation.duration_minutes)
+    covering = TableSlot.objects.filter(covering_q(slots), table__in=tables)
+    claimed = list(
+        covering.filter(state=TableSlot.FREE)
+        .select_for_update(skip_locked=True)
+        .values_list('pk', flat=True)
+    )
+    if len(claimed) < len(tables) * len(slots):
+        # Generated rows we could not lock are booked or mid-claim elsewhere;
+        # rows that were never generated are left to the exclusion constraint
+        taken = set(covering.exclude(pk__in=claimed).values_list('table__number', flat=True))
+        if taken:
+            return taken
+    if claimed:
+        TableSlot.objects.filter(pk__in=claimed).update(state=TableSlot.BOOKED, reservation=reservation)
+    return set()
+
+
+def release_slots(reservation):
+    """Free every slot a reservation has claimed"""
+    return (
+        TableSlot.objects.filter(reservation=reservation)
+        .update(state=TableSlot.FREE, reservation=None)
+    )
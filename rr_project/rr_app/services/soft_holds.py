@@ -0,0 +1,86 @@
+"""
+Soft table holds while a guest fills in the reservation form.
+
+Selecting tables on the floor plan holds them for SOFT_HOLD_SECONDS in the
+cache, never in the database. Each table and slot of the sitting is its own
+key holding the session key of the guest who has it; taking it is a
+cache.add(), which only one session can win. Holds simply expire with their
+keys, so an abandoned form costs no write at all.
+
+Availability and table suggestions treat tables held by other sessions as
+taken, and the booking POST refuses them.
+"""
+from django.core.cache import cache
+
+from .slots import sitting_slots
+
+
+SOFT_HOLD_SECONDS = 5 * 60
+
+SLOT_HOLD_KEY = 'softhold:{restaurant}:{table}:{date}:{start}'
+SESSION_HOLDS_KEY = 'softhold:session:{}'
+
+
+def _slot_keys(restaurant_id, table_number, date, time, duration):
+    return [
+        SLOT_HOLD_KEY.format(
+            restaurant=restaurant_id, table=table_number,
+            date=slot_date.isoformat(), start=start.strftime('%H%M'),
+        )
+        for slot_date, start in sitting_slots(date, time, duration)
+    ]
+
+
+def _keys_by_table(restaurant_id, table_numbers, date, time, duration):
+    return {
+        number: _slot_keys(restaurant_id, number, date, time, duration)
+        for number in table_numbers
+    }
+
+
+def held_by_others(restaurant_id, table_numbers, date, time, duration, session_key=None):
+    """The table numbers another session holds for any part of the sitting; one cache read"""
+    keys = _keys_by_table(restaurant_id, table_numbers, date, time, duration)
+    holders = cache.get_many([key for table_keys in keys.values() for key in table_keys])
+    return {
+        number
+        for number, table_keys in keys.items()
+        if any(holders.get(key) not in (None, session_key) for key in table_keys)
+    }
+
+
+def release_session_holds(session_key):
+    """Drop every soft hold of a session that it still owns"""
+    if not session_key:
+        return
+    keys = cache.get(SESSION_HOLDS_KEY.format(session_key)) or []
+    holders = cache.get_many(keys)
+    cache.delete_many([key for key, holder in holders.items() if holder == session_key])
+    cache.delete(SESSION_HOLDS_KEY.format(session_key))
+
+
+def hold_for_session(session_key, restaurant_id, table_numbers, date, time, duration):
+    """
+    Replace the session's soft holds with the given tables for the sitting.
+    Returns the table numbers other sessions already hold; nothing is held
+    then. An empty `table_numbers` just releases the session's holds.
+    """
+    release_session_holds(session_key)
+    keys = _keys_by_table(restaurant_id, table_numbers, date, time, duration)
+
+    taken = set()
+    added = []
+    for number, table_keys in keys.items():
+        for key in table_keys:
+            if cache.add(key, session_key, SOFT_HOLD_SECONDS):
+                added.append(key)
+            elif cache.get(key) != session_key:
+                taken.add(number)
+                break
+    if taken:
+        cache.delete_many(added)
+        return taken
+
+    if added:
+        cache.set(SESSION_HOLDS_KEY.format(session_key), added, SOFT_HOLD_SECONDS)
+    return set()
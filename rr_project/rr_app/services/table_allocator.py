@@ -0,0 +1,117 @@
+"""
+Table combinations for a party.
+
+best_combination() picks, among the free tables, the set that seats the party
+while leaving the fewest empty chairs, then the one with the fewest tables.
+It is a small knapsack search: tables are considered in a fixed order and
+each state (next table, guests still unseated, tables still allowed) is
+solved once and memoized, so the cost is bounded by
+tables x party size x MAX_COMBINED_TABLES instead of every subset.
+
+check_table_choice() uses it to refuse bookings that would waste seats the
+restaurant needs for other parties; bookings that pick no table at all are
+not checked.
+"""
+from functools import lru_cache
+
+from .availability import get_free_tables, get_table_availability
+from .booking import BookingError, normalize_table_numbers
+
+
+MAX_COMBINED_TABLES = 3
+# Extra empty chairs a guest may choose over the best combination
+SEAT_WASTE_TOLERANCE = 2
+
+
+class PoorTableChoice(BookingError):
+    pass
+
+
+def best_combination(tables, guests, max_tables=MAX_COMBINED_TABLES):
+    """
+    The tables (dicts with 'number' and 'capacity') seating `guests` with the
+    least waste, fewest tables on ties; [] when no combination of up to
+    `max_tables` tables fits.
+    """
+    if guests <= 0:
+        return []
+    # Largest first; among equal solutions the earliest tables win
+    tables = sorted(tables, key=lambda t: -t['capacity'])
+    capacities = tuple(t['capacity'] for t in tables)
+
+    @lru_cache(maxsize=None)
+    def solve(i, need, left):
+        # (empty seats, table count, chosen indexes) or None when infeasible
+        if need <= 0:
+            return (-need, 0, ())
+        if i == len(capacities) or left == 0:
+            return None
+        best = solve(i + 1, need, left)
+        taken = solve(i + 1, need - capacities[i], left - 1)
+        if taken is not None:
+            taken = (taken[0], taken[1] + 1, (i,) + taken[2])
+            if best is None or taken[:2] <= best[:2]:
+                best = taken
+        return best
+
+    result = solve(0, guests, max_tables)
+    return [tables[i] for i in result[2]] if result else []
+
+
+def wasted_seats(tables, guests):
+    return sum(t['capacity'] for t in tables) - guests
+
+
+def _numbers(tables):
+    return normalize_table_numbers(t['number'] for t in tables)
+
+
+def check_table_choice(chosen, free_tables, guests):
+    """
+    Raise PoorTableChoice when the `chosen` tables cannot seat `guests`, include
+    a table the party does not need, or leave more than SEAT_WASTE_TOLERANCE
+    more empty chairs than the best combination of `free_tables`.
+    The error carries the suggested table numbers.
+    """
+    seats = sum(t['capacity'] for t in chosen)
+    candidates = {t['number']: t for t in free_tables}
+    candidates.update((t['number'], t) for t in chosen)
+    best = best_combination(candidates.values(), guests)
+
+    if seats < guests:
+        message = f"The selected tables seat {seats}, not enough for {guests} guests."
+    elif any(seats - t['capacity'] >= guests for t in chosen):
+        message = f"Not all of the selected tables are needed for {guests} guests."
+    elif best and wasted_seats(chosen, guests) > wasted_seats(best, guests) + SEAT_WASTE_TOLERANCE:
+        message = f"The selected tables leave {wasted_seats(chosen, guests)} seats empty."
+    else:
+        return
+
+    if best:
+        message += f" We suggest table {', '.join(_numbers(best))}."
+    raise PoorTableChoice(message, _numbers(best))
+
+
+def suggest_tables(restaurant_id, date, time, duration, guests, session_key=None):
+    """The best free tables for a party at the given sitting, [] when none fit"""
+    return best_combination(get_free_tables(restaurant_id, date, time, duration, session_key), guests)
+
+
+def check_reservation_tables(reservation, session_key=None):
+    """
+    check_table_choice() for an unsaved reservation against its sitting's
+    free tables. Reservations without tables are left alone: table_numbers
+    is optional and the restaurant then seats the party on arrival.
+    """
+    numbers = set(normalize_table_numbers(reservation.table_numbers))
+    if not numbers:
+        return
+    tables = get_table_availability(
+        reservation.restaurant_id, reservation.date, reservation.time, reservation.duration_minutes,
+        session_key,
+    )
+    chosen = [t for t in tables if t['number'] in numbers]
+    if len(chosen) < len(numbers):
+        # Unknown numbers are reported by hold_tables()
+        return
+    check_table_choice(chosen, [t for t in tables if t['available']], reservation.guest_count)
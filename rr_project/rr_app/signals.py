@@ -0,0 +1,262 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Restaurant, Cuisine, Tags, Review, Reservation, Table
+from .services.restaurant_service import (
+    apply_rating_delta, update_search_vectors, invalidate_facet_counts,
+)
+from .services.restaurant_index import restaurant_index, CUISINES, TAGS
+from .services.leaderboard import record_rating_change, is_on_leaderboard, mark_leaderboard_stale
+from .services.booking import hold_tables, normalize_table_numbers
+from .services.floor_plan import create_default_tables
+from .services.slots import release_slots
+from .services.reservation_calendar import invalidate_calendar
+
+
+### Review rating aggregates
+
+def _apply_rating_delta(restaurant_id, rating_delta, count_delta):
+    apply_rating_delta(restaurant_id, rating_delta, count_delta)
+    if restaurant_id is not None:
+        # Re-rank once the new aggregates are visible to other connections
+        transaction.on_commit(lambda: record_rating_change(restaurant_id, rating_delta, count_delta))
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """Keep the stored rating/restaurant so an edit can be applied as a delta"""
+    instance._previous_rating = None
+    if instance.pk:
+        previous = (
+            Review.objects.filter(pk=instance.pk)
+            .values('restaurant_id', 'rating')
+            .first()
+        )
+        instance._previous_rating = previous
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    rating = Decimal(str(instance.rating))
+
+    with transaction.atomic():
+        if created or previous is None:
+            _apply_rating_delta(instance.restaurant_id, rating, 1)
+        elif previous['restaurant_id'] == instance.restaurant_id:
+            _apply_rating_delta(instance.restaurant_id, rating - previous['rating'], 0)
+        else:
+            # Review moved to another restaurant
+            _apply_rating_delta(previous['restaurant_id'], -previous['rating'], -1)
+            _apply_rating_delta(instance.restaurant_id, rating, 1)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    _apply_rating_delta(instance.restaurant_id, -instance.rating, -1)
+
+
+### Restaurant search vectors
+
+SEARCH_SOURCE_FIELDS = {'name', 'description', 'address'}
+
+
+@receiver(post_save, sender=Restaurant)
+def update_search_vector_on_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not SEARCH_SOURCE_FIELDS.intersection(update_fields):
+        return
+    update_search_vectors([instance.pk])
+
+
+def _linked_restaurant_ids(instance):
+    """Ids of the restaurants a Cuisine or Tags row is attached to"""
+    if isinstance(instance, Cuisine):
+        return list(instance.restaurant.values_list('pk', flat=True))
+    return list(instance.restaurants.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Cuisine)
+@receiver(post_save, sender=Tags)
+def update_search_vector_on_label_save(sender, instance, created, **kwargs):
+    # A brand new cuisine/tag has no restaurants yet; links are handled by m2m_changed
+    if not created:
+        update_search_vectors(_linked_restaurant_ids(instance))
+
+
+@receiver(pre_delete, sender=Cuisine)
+@receiver(pre_delete, sender=Tags)
+def remember_label_restaurants(sender, instance, **kwargs):
+    instance._linked_restaurant_ids = _linked_restaurant_ids(instance)
+
+
+@receiver(post_delete, sender=Cuisine)
+@receiver(post_delete, sender=Tags)
+def update_search_vector_on_label_delete(sender, instance, **kwargs):
+    update_search_vectors(getattr(instance, '_linked_restaurant_ids', []))
+    invalidate_facet_counts()
+
+
+@receiver(m2m_changed, sender=Cuisine.restaurant.through)
+@receiver(m2m_changed, sender=Tags.restaurants.through)
+def update_search_vector_on_link_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Links can be edited from either side: cuisine.restaurant.add(...) (forward)
+    or restaurant.cuisines.add(...) (reverse).
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_facet_counts()
+
+    if reverse:
+        # instance is the Restaurant
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_search_vectors([instance.pk])
+        return
+
+    # instance is the Cuisine/Tags row
+    if action == 'pre_clear':
+        instance._linked_restaurant_ids = _linked_restaurant_ids(instance)
+    elif action == 'post_clear':
+        update_search_vectors(getattr(instance, '_linked_restaurant_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        update_search_vectors(pk_set or [])
+
+
+### Facet counts
+
+PRICE_FIELDS = {'price_min', 'price_max'}
+
+
+@receiver(post_save, sender=Restaurant)
+def invalidate_facets_on_price_change(sender, instance, created, update_fields=None, **kwargs):
+    # New restaurants and price edits move the price histogram
+    if created or update_fields is None or PRICE_FIELDS.intersection(update_fields):
+        invalidate_facet_counts()
+
+
+@receiver(post_delete, sender=Restaurant)
+def invalidate_facets_on_restaurant_delete(sender, instance, **kwargs):
+    # Through rows are removed by cascade, which does not send m2m_changed
+    invalidate_facet_counts()
+
+
+### Dashboard leaderboard
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def mark_leaderboard_stale_on_restaurant_change(sender, instance, **kwargs):
+    # The leaderboard caches whole rows, so edits to a listed restaurant need a rebuild
+    if is_on_leaderboard(instance.pk):
+        mark_leaderboard_stale()
+
+
+@receiver(m2m_changed, sender=Cuisine.restaurant.through)
+@receiver(m2m_changed, sender=Tags.restaurants.through)
+def mark_leaderboard_stale_on_link_change(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse or is_on_leaderboard(instance.pk):
+            mark_leaderboard_stale()
+
+
+### Listing filter index
+
+def _index_group(sender):
+    return CUISINES if sender is Cuisine.restaurant.through else TAGS
+
+
+@receiver(post_save, sender=Restaurant)
+def update_filter_index_on_save(sender, instance, **kwargs):
+    restaurant_index.set_restaurant(instance.pk, instance.price_min, instance.price_max)
+
+
+@receiver(post_delete, sender=Restaurant)
+def update_filter_index_on_delete(sender, instance, **kwargs):
+    restaurant_index.remove_restaurant(instance.pk)
+
+
+@receiver(post_delete, sender=Cuisine)
+@receiver(post_delete, sender=Tags)
+def update_filter_index_on_label_delete(sender, instance, **kwargs):
+    restaurant_index.drop_label(CUISINES if sender is Cuisine else TAGS, instance.pk)
+
+
+@receiver(m2m_changed, sender=Cuisine.restaurant.through)
+@receiver(m2m_changed, sender=Tags.restaurants.through)
+def update_filter_index_on_link_change(sender, instance, action, reverse, pk_set, **kwargs):
+    group = _index_group(sender)
+
+    if reverse:
+        # instance is the Restaurant, pk_set holds cuisine/tag ids
+        stash = f'_cleared_{group}_ids'
+        if action == 'pre_clear':
+            related = instance.cuisines if group == CUISINES else instance.tags
+            setattr(instance, stash, list(related.values_list('pk', flat=True)))
+        elif action == 'post_clear':
+            for label_id in getattr(instance, stash, []):
+                restaurant_index.unlink(group, label_id, [instance.pk])
+        elif action == 'post_add':
+            for label_id in pk_set:
+                restaurant_index.link(group, label_id, [instance.pk])
+        elif action == 'post_remove':
+            for label_id in pk_set:
+                restaurant_index.unlink(group, label_id, [instance.pk])
+        return
+
+    # instance is the Cuisine/Tags row, pk_set holds restaurant ids
+    if action == 'post_add':
+        restaurant_index.link(group, instance.pk, pk_set)
+    elif action == 'post_remove':
+        restaurant_index.unlink(group, instance.pk, pk_set)
+    elif action == 'post_clear':
+        restaurant_index.drop_label(group, instance.pk)
+
+
+### Floor plan
+
+@receiver(post_save, sender=Restaurant)
+def create_floor_plan(sender, instance, created, raw=False, **kwargs):
+    # Fixtures bring their own tables
+    if created and not raw:
+        create_default_tables([instance.pk])
+
+
+### Reservation table holds
+
+@receiver(pre_save, sender=Reservation)
+def normalize_reservation_tables(sender, instance, **kwargs):
+    instance.table_numbers = normalize_table_numbers(instance.table_numbers)
+
+
+@receiver(post_save, sender=Reservation)
+def hold_reservation_tables(sender, instance, **kwargs):
+    # Raises TablesTaken/UnknownTables; callers save reservations inside transaction.atomic()
+    hold_tables(instance)
+
+
+@receiver(pre_delete, sender=Reservation)
+def release_reservation_slots(sender, instance, **kwargs):
+    # The slot foreign key is SET_NULL, which would leave the slots BOOKED
+    release_slots(instance)
+
+
+### Availability calendar
+
+HOURS_FIELDS = {'opening_time', 'closing_time'}
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def invalidate_calendar_on_booking_change(sender, instance, **kwargs):
+    if instance.restaurant_id:
+        restaurant_id = instance.restaurant_id
+        transaction.on_commit(lambda: invalidate_calendar(restaurant_id))
+
+
+@receiver(post_save, sender=Restaurant)
+def invalidate_calendar_on_hours_change(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or HOURS_FIELDS.intersection(update_fields)):
+        transaction.on_commit(lambda: invalidate_calendar(instance.pk))
@@ -1,3 +1,1255 @@
-from django.test import TestCase
+import csv
+import json
+import random
+import smtplib
+import threading
+import time as time_module
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import combinations
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.mail.backends import locmem
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.template.loader import get_template
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import urls as rr_urls
+from .models import (
+    Customer, OutboxEmail, Reservation, ReservationTable, Restaurant, Review, TableSlot, User, UserRole,
+)
+from .services.availability import IntervalIndex, get_table_availability
+from .services.booking import TablesTaken, UnknownTables, cancel_reservation
+from .services.email_outbox import (
+    EXPIRED_ERROR, OUTBOX_LEASE_MARGIN_SECONDS, OUTBOX_MAX_ATTEMPTS, OUTBOX_MAX_BACKOFF_SECONDS,
+    backoff, claim_batch, drain_outbox, enqueue_email, extend_lease, lease_seconds,
+)
+from .services.email_rendering import (
+    compile_email, inline_css, inline_stylesheets, parse_stylesheet, render_email, text_source,
+)
+from .services.email_service import send_password_reset_code_email
+from .services.floor_plan import DEFAULT_TABLE_LAYOUT
+from .services.restaurant_index import (
+    CUISINES, INDEX_MAX_AGE_SECONDS, TAGS, PrefixBitsets, RestaurantFilterIndex, bitset_from_ids, bump_index_version,
+    iter_bits, restaurant_index,
+)
+from .services.reservation_export import EXPORT_FIELDS, _csv_cell, csv_lines
+from .services.reservation_lifecycle import advance_reservations
+from .services.restaurant_service import (
+    PRICE_HISTOGRAM_BUCKETS, filter_restaurants, get_facet_counts, get_restaurant_page_ids,
+)
+from .services.slots import generate_slots, sitting_slots
+from .services.table_allocator import (
+    MAX_COMBINED_TABLES, PoorTableChoice, best_combination, check_reservation_tables, check_table_choice,
+)
+from .utils.pagination import CursorPaginator, InvalidCursor, decode_cursor, encode_cursor
+from .utils.query_budget import assert_view_query_budget, get_query_budget
+from .utils.rate_limit import Limit, check_limits, client_ip, post_field, rate_limit, view_kwarg
+
+
+### Query budgets
+
+class ViewQueryBudgetTests(TestCase):
+    """
+    Request every URL of rr_app.urls the way the app uses it and fail when a
+    view runs more queries than its @query_budget (or repeats a query shape,
+    the N+1 signature). The cache is cleared first, so cached pages are
+    measured cold.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='guest', email='guest@example.com', password='secret123',
+            first_name='Guest', is_active=True, email_verified=True,
+        )
+        cls.customer = Customer.objects.create(user=cls.user)
+        cls.staff = User.objects.create_user(
+            username='staff', email='staff@example.com', password='secret123',
+            role=UserRole.ADMIN, is_staff=True, is_active=True, email_verified=True,
+        )
+        cls.unverified = User.objects.create_user(
+            username='new', email='new@example.com', password='secret123',
+            is_active=False, email_verified=False,
+        )
+        # Creating the restaurant also creates its default tables (signals.py)
+        cls.restaurant = Restaurant.objects.create(
+            name='Budget Bistro', address='1 Main Street', email='bistro@example.com',
+            phone_number='555-0100', description='Pasta and grill', max_guest_count=8,
+            price_min=100, price_max=500, opening_time=time(10), closing_time=time(22),
+        )
+        Review.objects.create(customer=cls.customer, restaurant=cls.restaurant, rating=4, comment='Good')
+        cls.tomorrow = timezone.localdate() + timedelta(days=1)
+        Reservation.objects.create(
+            customer=cls.customer, restaurant=cls.restaurant, name='Guest', email='guest@example.com',
+            guest_count=2, date=cls.tomorrow, time=time(12), table_numbers=['2'],
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def cases(self):
+        """(url name, kwargs, method, data, user) for every request to measure"""
+        restaurant = {'restaurant_id': self.restaurant.id}
+        sitting = {'date': self.tomorrow.isoformat(), 'time': '19:00'}
+        return [
+            ('home', {}, 'get', {}, None),
+            ('signup', {}, 'get', {}, None),
+            ('login', {}, 'get', {}, None),
+            ('login', {}, 'post', {'username': 'guest@example.com', 'password': 'secret123'}, None),
+            ('logout', {}, 'get', {}, self.user),
+            ('verify_email', {'token': self.unverified.verification_token}, 'get', {}, None),
+            ('resend_verification', {'user_id': self.unverified.id}, 'post', {}, None),
+            ('forgot_password', {}, 'get', {}, None),
+            ('forgot_password', {}, 'post', {'email': 'guest@example.com'}, None),
+            ('verify_reset_code', {}, 'post', {'user_id': self.user.id, 'code': '000000'}, None),
+            ('reset_password', {}, 'post', {
+                'user_id': self.user.id, 'code': '000000',
+                'new_password': 'another123', 'confirm_password': 'another123',
+            }, None),
+            ('resend_reset_code', {}, 'post', {'user_id': self.user.id}, None),
+            ('dashboard', {}, 'get', {}, self.user),
+            ('restaurants', {}, 'get', {}, None),
+            ('restaurant_list_api', {}, 'get', {'sort_by': 'rating', 'order': 'desc'}, None),
+            ('restaurant_facets_api', {}, 'get', {'price_min': 50}, None),
+            ('restaurant_search', {}, 'get', {'q': 'bistro'}, None),
+            ('restaurant_search_api', {}, 'get', {'q': 'bistro'}, None),
+            ('reservation_management', {}, 'get', {}, self.user),
+            ('restaurant_detail', restaurant, 'get', {}, self.user),
+            ('restaurant_detail', restaurant, 'post', {
+                'name': 'Guest', 'email': 'guest@example.com', 'guest_count': 2,
+                'table_numbers': '1', 'notes': '', **sitting,
+            }, self.user),
+            ('restaurant_reviews', restaurant, 'get', {}, self.user),
+            ('restaurant_tables', restaurant, 'get', sitting, self.user),
+            ('restaurant_table_hold', restaurant, 'post', {'table_numbers': '3', **sitting}, self.user),
+            ('restaurant_table_suggestion', restaurant, 'get', {'guests': 4, **sitting}, self.user),
+            ('restaurant_reservations_export', restaurant, 'get', {'start': self.tomorrow.isoformat()}, self.staff),
+            ('restaurant_calendar', restaurant, 'get', {'month': self.tomorrow.strftime('%Y-%m')}, self.user),
+        ]
+
+    def test_views_stay_within_their_query_budget(self):
+        for name, kwargs, method, data, user in self.cases():
+            with self.subTest(name=name, method=method):
+                cache.clear()
+                client = self.client_class()
+                if user is not None:
+                    client.force_login(user)
+                response = assert_view_query_budget(
+                    client, reverse(f'rr_app:{name}', kwargs=kwargs), method, data=data,
+                )
+                self.assertLess(response.status_code, 500)
+
+    def test_every_view_has_a_budget_and_a_case(self):
+        measured = {name for name, *_ in self.cases()}
+        for pattern in rr_urls.urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertIsNotNone(get_query_budget(pattern.callback))
+                self.assertIn(pattern.name, measured)
+
+
+### Table allocation
+
+def _tables(*capacities):
+    return [{'number': str(i), 'capacity': capacity} for i, capacity in enumerate(capacities, 1)]
+
+
+def _brute_force(tables, guests, max_tables=MAX_COMBINED_TABLES):
+    """(empty seats, table count) of the best combination by trying every one, None when none fits"""
+    best = None
+    for size in range(1, max_tables + 1):
+        for combo in combinations(tables, size):
+            seats = sum(t['capacity'] for t in combo)
+            if seats >= guests and (best is None or (seats - guests, size) < best):
+                best = (seats - guests, size)
+    return best
+
+
+class BestCombinationTests(SimpleTestCase):
+    def test_matches_brute_force(self):
+        rng = random.Random(2026)
+        for _ in range(300):
+            tables = _tables(*(rng.choice([2, 2, 4, 4, 6, 8]) for _ in range(rng.randint(0, 9))))
+            guests = rng.randint(1, 20)
+            with self.subTest(tables=[t['capacity'] for t in tables], guests=guests):
+                chosen = best_combination(tables, guests)
+                expected = _brute_force(tables, guests)
+                if expected is None:
+                    self.assertEqual(chosen, [])
+                else:
+                    self.assertEqual((sum(t['capacity'] for t in chosen) - guests, len(chosen)), expected)
+                    self.assertEqual(len({t['number'] for t in chosen}), len(chosen))
+
+    def test_prefers_fewer_tables_on_equal_waste(self):
+        self.assertEqual(best_combination(_tables(2, 2, 4), 4), [{'number': '3', 'capacity': 4}])
+
+    def test_no_guests_need_no_tables(self):
+        self.assertEqual(best_combination(_tables(2, 4), 0), [])
+
+
+class CheckTableChoiceTests(SimpleTestCase):
+    def setUp(self):
+        self.free = _tables(2, 2, 4, 4, 6, 8)
+
+    def pick(self, *numbers):
+        return [t for t in self.free if t['number'] in numbers]
+
+    def test_refuses_too_few_seats(self):
+        with self.assertRaisesMessage(PoorTableChoice, 'not enough for 5 guests'):
+            check_table_choice(self.pick('3'), self.free, 5)
+
+    def test_refuses_an_unneeded_table(self):
+        with self.assertRaisesMessage(PoorTableChoice, 'Not all of the selected tables are needed'):
+            check_table_choice(self.pick('1', '3'), self.free, 4)
+
+    def test_refuses_wasting_more_than_the_tolerance(self):
+        with self.assertRaises(PoorTableChoice) as raised:
+            check_table_choice(self.pick('6'), self.free, 2)
+        self.assertIn('6 seats empty', str(raised.exception))
+        # The error suggests the best combination
+        self.assertEqual(raised.exception.table_numbers, ['1'])
+
+    def test_accepts_waste_within_the_tolerance(self):
+        # Two more empty chairs than table 1 would leave
+        check_table_choice(self.pick('3'), self.free, 2)
+
+    def test_accepts_the_best_combination(self):
+        check_table_choice(self.pick('5', '6'), self.free, 14)
+
+
+
+class CheckReservationTablesTests(SimpleTestCase):
+    def setUp(self):
+        tables = [dict(t, available=True) for t in _tables(2, 4, 6)]
+        availability = mock.patch('rr_app.services.table_allocator.get_table_availability', return_value=tables)
+        self.availability = availability.start()
+        self.addCleanup(availability.stop)
+
+    def reservation(self, table_numbers, guests=4):
+        return Reservation(
+            restaurant_id=1, guest_count=guests, date=date(2030, 5, 6), time=time(19), table_numbers=table_numbers,
+        )
+
+    def test_reservations_without_tables_are_allowed(self):
+        for table_numbers in ([], ['', ' ']):
+            with self.subTest(table_numbers=table_numbers):
+                check_reservation_tables(self.reservation(table_numbers))
+        self.availability.assert_not_called()
+
+    def test_chosen_tables_are_checked(self):
+        check_reservation_tables(self.reservation(['2']))
+        with self.assertRaises(PoorTableChoice):
+            check_reservation_tables(self.reservation(['1']))
+
+### Keyset pagination
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        token = encode_cursor([Decimal('4.50'), date(2026, 1, 2), 7])
+        self.assertEqual(decode_cursor(token), ['4.50', '2026-01-02', 7])
+
+    def test_tampered_cursor_is_rejected(self):
+        token = encode_cursor([1, 2])
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(token + 'x')
+        with self.assertRaises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+    def test_after_honours_each_direction(self):
+        paginator = CursorPaginator(Reservation.objects.all(), ('-date', 'time', '-id'), 10)
+        self.assertEqual(
+            paginator._after([date(2026, 1, 2), time(19), 7]),
+            Q(date__lt=date(2026, 1, 2))
+            | (Q(date=date(2026, 1, 2)) & Q(time__gt=time(19)))
+            | (Q(date=date(2026, 1, 2)) & Q(time=time(19)) & Q(id__lt=7)),
+        )
+
+    def test_cursor_values_are_coerced_to_the_field_type(self):
+        paginator = CursorPaginator(Reservation.objects.all(), ('-date', '-id'), 10)
+        self.assertEqual(paginator._coerce('date', '2026-01-02'), date(2026, 1, 2))
+        with self.assertRaises(InvalidCursor):
+            paginator._coerce('date', 'yesterday')
+
+
+class NewestPageTests(SimpleTestCase):
+    """The "newest" listing pages straight off the filter index bitset"""
+
+    def setUp(self):
+        resolve = mock.patch.object(restaurant_index, 'resolve', return_value=bitset_from_ids([0, 2, 3, 5, 8]))
+        resolve.start()
+        self.addCleanup(resolve.stop)
+
+    def pages(self, order):
+        ids, cursor = [], None
+        while True:
+            page, count, cursor = get_restaurant_page_ids(order=order, cursor=cursor, page_size=2)
+            self.assertEqual(count, 5)
+            ids.append(page)
+            if cursor is None:
+                return ids
+
+    def test_pages_in_each_direction(self):
+        self.assertEqual(self.pages('asc'), [[0, 2], [3, 5], [8]])
+        self.assertEqual(self.pages('desc'), [[8, 5], [3, 2], [0]])
+
+    def test_malformed_cursors_are_invalid(self):
+        for values in ([-1], [-5], [True], ['3'], [1.5], [3, 4], []):
+            with self.subTest(values=values):
+                with self.assertRaises(InvalidCursor):
+                    get_restaurant_page_ids(cursor=encode_cursor(values))
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        restaurant = Restaurant.objects.create(
+            name='Pager', address='2 Main Street', email='pager@example.com',
+            phone_number='555-0101', description='', max_guest_count=4,
+        )
+        # Repeated ratings, so pages break inside runs of equal sort keys
+        for rating in [5, 4, 4, 4, 3, 3, 2, 5, 4, 1, 3]:
+            Review.objects.create(restaurant=restaurant, rating=rating, comment='')
+        cls.reviews = Review.objects.filter(restaurant=restaurant)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        ordering = ('-rating', '-id')
+        paginator = CursorPaginator(self.reviews, ordering, 3)
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(review.id for review in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, list(self.reviews.order_by(*ordering).values_list('id', flat=True)))
+
+    def test_values_rows(self):
+        page = CursorPaginator(self.reviews.values('id', 'rating'), ('rating', 'id'), 20).page()
+        self.assertEqual(len(page), 11)
+        self.assertFalse(page.has_next)
+
+    def test_cursor_of_another_length_is_rejected(self):
+        with self.assertRaises(InvalidCursor):
+            CursorPaginator(self.reviews, ('-rating', '-id'), 3).page(encode_cursor([4]))
+
+
+### Listing filter index
+
+class BitsetTests(SimpleTestCase):
+    def test_bitset_from_ids(self):
+        self.assertEqual(bitset_from_ids([]), 0)
+        self.assertEqual(bitset_from_ids([0, 3, 9]), (1 << 0) | (1 << 3) | (1 << 9))
+        self.assertEqual(bitset_from_ids([5, 5]), 1 << 5)
+
+    def test_iter_bits(self):
+        ids = [0, 1, 7, 8, 63, 64, 1000]
+        bits = bitset_from_ids(ids)
+        self.assertEqual(list(iter_bits(bits)), ids)
+        self.assertEqual(list(iter_bits(bits, descending=True)), ids[::-1])
+        self.assertEqual(list(iter_bits(0)), [])
+
+
+class PrefixBitsetsTests(SimpleTestCase):
+    def test_matches_the_slices(self):
+        rng = random.Random(6)
+        entries = sorted((rng.randint(0, 50), pk) for pk in rng.sample(range(2000), 300))
+        for bucket_size in (1, 7, 256, 1000):
+            with self.subTest(bucket_size=bucket_size), mock.patch(
+                'rr_app.services.restaurant_index.PRICE_BUCKET_SIZE', bucket_size,
+            ):
+                bitsets = PrefixBitsets(entries)
+                for i in range(len(entries) + 1):
+                    self.assertEqual(bitsets.prefix(i), bitset_from_ids(pk for _, pk in entries[:i]))
+                    self.assertEqual(bitsets.suffix(i), bitset_from_ids(pk for _, pk in entries[i:]))
+
+    def test_empty(self):
+        bitsets = PrefixBitsets([])
+        self.assertEqual((bitsets.prefix(0), bitsets.suffix(0), bitsets.total), (0, 0, 0))
+
+
+class RestaurantFilterIndexTests(SimpleTestCase):
+    """Incremental updates and queries on an index that is never rebuilt from the database"""
+
+    def setUp(self):
+        cache.clear()
+        self.index = RestaurantFilterIndex()
+        self.index.version = bump_index_version()
+        self.index.built = True
+        self.index.built_at = time_module.monotonic()
+        for pk, low, high in [(1, 100, 300), (2, 250, 600), (3, 0, 0), (4, 700, 900)]:
+            self.index.set_restaurant(pk, low, high)
+        self.index.link(CUISINES, 10, [1, 2])
+        self.index.link(CUISINES, 11, [3])
+        self.index.link(TAGS, 20, [2, 3, 4])
+
+    def ids(self, **filters):
+        return list(iter_bits(self.index.resolve(**filters)))
+
+    def test_or_within_a_group_and_across_groups(self):
+        self.assertEqual(self.ids(), [1, 2, 3, 4])
+        self.assertEqual(self.ids(cuisine_ids=[10, 11]), [1, 2, 3])
+        self.assertEqual(self.ids(cuisine_ids=[10, 11], tag_ids=[20]), [2, 3])
+        self.assertEqual(self.ids(cuisine_ids=[99]), [])
+
+    def test_price_overlap(self):
+        # Restaurants without prices never match a budget
+        self.assertEqual(self.ids(price_low=280, price_high=320), [1, 2])
+        self.assertEqual(self.ids(price_low=650), [4])
+        self.assertEqual(self.ids(price_high=100), [1])
+
+    def test_price_overlap_matches_brute_force(self):
+        rng = random.Random(61)
+        # Restaurants 1, 2 and 4 from setUp, 3 has no prices
+        prices = {1: (100, 300), 2: (250, 600), 4: (700, 900)}
+        for pk in range(5, 400):
+            low = rng.randint(0, 1000)
+            prices[pk] = (low, low + rng.randint(0, 300))
+            self.index.set_restaurant(pk, *prices[pk])
+        with mock.patch('rr_app.services.restaurant_index.PRICE_BUCKET_SIZE', 16):
+            for _ in range(200):
+                low, high = sorted(rng.sample(range(-10, 1400), 2))
+                low, high = rng.choice([(low, high), (low, None), (None, high)])
+                expected = sorted(
+                    pk for pk, (price_min, price_max) in prices.items()
+                    if (high is None or price_min <= high) and (low is None or price_max >= low)
+                )
+                self.assertEqual(self.ids(price_low=low, price_high=high), expected)
+
+    def test_price_bitsets_are_built_once_per_change(self):
+        with mock.patch.object(self.index, '_price_bitsets', wraps=self.index._price_bitsets) as build:
+            self.ids(price_low=100)
+            self.ids(price_high=500)
+            self.assertEqual(build.call_count, 1)
+            self.index.set_restaurant(5, 10, 20)
+            self.assertEqual(self.ids(price_high=20), [5])
+            self.assertEqual(build.call_count, 2)
+
+    def test_updates(self):
+        self.index.unlink(CUISINES, 10, [1])
+        self.index.set_restaurant(2, 50, 80)
+        self.index.remove_restaurant(4)
+        self.assertEqual(self.ids(cuisine_ids=[10]), [2])
+        self.assertEqual(self.ids(price_high=90), [2])
+        self.assertEqual(self.ids(tag_ids=[20]), [2, 3])
+        self.index.drop_label(TAGS, 20)
+        self.assertEqual(self.ids(tag_ids=[20]), [])
+
+    def test_rebuilds_when_another_process_changed_the_data(self):
+        bump_index_version()
+        with mock.patch.object(self.index, 'rebuild') as rebuild:
+            self.index.ensure_current()
+        rebuild.assert_called_once()
+
+    def test_rebuilds_once_too_old(self):
+        with mock.patch.object(self.index, 'rebuild') as rebuild:
+            self.index.ensure_current()
+            rebuild.assert_not_called()
+            self.index.built_at -= INDEX_MAX_AGE_SECONDS + 1
+            self.index.ensure_current()
+        rebuild.assert_called_once()
+
+
+### Price filters
+
+def _restaurant(name, price_min=0, price_max=0, **fields):
+    fields = {
+        'address': '1 Main Street', 'email': 'owner@example.com', 'phone_number': '555-0100',
+        'description': name, 'max_guest_count': 8, 'opening_time': time(10), 'closing_time': time(22),
+        **fields,
+    }
+    return Restaurant.objects.create(name=name, price_min=price_min, price_max=price_max, **fields)
+
+
+class PriceFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cheap = _restaurant('Cheap', 100, 200)
+        cls.middle = _restaurant('Middle', 300, 500)
+        cls.dear = _restaurant('Dear', 900, 1100)
+        cls.fixed = _restaurant('Fixed', 1100, 1100)
+        cls.unpriced = _restaurant('Unpriced')
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, price_low=None, price_high=None):
+        restaurants = filter_restaurants(Restaurant.objects.all(), price_low=price_low, price_high=price_high)
+        return sorted(restaurants.values_list('name', flat=True))
+
+    def test_overlap(self):
+        self.assertEqual(self.names(250, 350), ['Middle'])
+        self.assertEqual(self.names(Decimal('199.99'), 300), ['Cheap', 'Middle'])
+        self.assertEqual(self.names(600, 800), [])
+
+    def test_bounds_are_inclusive(self):
+        self.assertEqual(self.names(500, 500), ['Middle'])
+        self.assertEqual(self.names(200, 300), ['Cheap', 'Middle'])
+
+    def test_missing_bound_is_open(self):
+        self.assertEqual(self.names(price_high=150), ['Cheap'])
+        self.assertEqual(self.names(price_low=1000), ['Dear', 'Fixed'])
+
+    def test_no_budget_keeps_unpriced_restaurants(self):
+        self.assertEqual(len(self.names()), 5)
+        self.assertNotIn('Unpriced', self.names(0, 10000))
+
+    def test_inverted_prices_are_refused(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            _restaurant('Inverted', 500, 300)
+
+    def test_histogram_buckets(self):
+        histogram = get_facet_counts()['price_histogram']
+        # Buckets of 100 between the lowest and the highest price in the catalog
+        self.assertEqual(len(histogram), PRICE_HISTOGRAM_BUCKETS)
+        self.assertEqual((histogram[0]['min'], histogram[0]['max']), (100, 200))
+        self.assertEqual(histogram[-1]['max'], 1100)
+        # By starting price; one equal to the upper bound goes in the last bucket
+        self.assertEqual(
+            {n: bucket['count'] for n, bucket in enumerate(histogram, 1) if bucket['count']},
+            {1: 1, 3: 1, 9: 1, 10: 1},
+        )
+
+    def test_histogram_ignores_the_budget(self):
+        # The budget narrows the other facets, not the histogram it is picked from
+        self.assertEqual(
+            get_facet_counts(price_low=250, price_high=350)['price_histogram'],
+            get_facet_counts()['price_histogram'],
+        )
+
+    def test_no_histogram_without_a_price_spread(self):
+        Restaurant.objects.exclude(pk=self.fixed.pk).delete()
+        self.assertEqual(get_facet_counts()['price_histogram'], [])
+
+
+### Availability
+
+class IntervalIndexTests(SimpleTestCase):
+    def test_overlapping(self):
+        index = IntervalIndex([(-60, 60, 'late'), (0, 30, 'a'), (100, 200, 'b'), (1500, 1560, 'next day')])
+        self.assertEqual(sorted(index.overlapping(0, 10)), ['a', 'late'])
+        # Intervals are half-open
+        self.assertEqual(list(index.overlapping(60, 100)), [])
+        self.assertEqual(list(index.overlapping(1410, 1530)), ['next day'])
+
+
+class TableAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = _restaurant('Late Night', opening_time=time(18), closing_time=time(2))
+        cls.day = date(2030, 5, 6)
+
+    def book(self, day, at, table_number, duration_minutes=120):
+        with transaction.atomic():
+            Reservation.objects.create(
+                restaurant=self.restaurant, name='Guest', email='guest@example.com', guest_count=2,
+                date=day, time=time(*at), duration_minutes=duration_minutes, table_numbers=[table_number],
+            )
+
+    def taken(self, at, duration=120):
+        tables = get_table_availability(self.restaurant.id, self.day, time(*at), duration)
+        return sorted(table['number'] for table in tables if not table['available'])
+
+    def test_new_restaurants_get_the_default_floor_plan(self):
+        self.assertEqual(
+            sorted(self.restaurant.tables.values_list('number', 'capacity', 'x', 'y')),
+            sorted(DEFAULT_TABLE_LAYOUT),
+        )
+
+    def test_sitting_overlapping_the_same_day(self):
+        self.book(self.day, (19, 0), '1')
+        self.assertEqual(self.taken((20, 0)), ['1'])
+        self.assertEqual(self.taken((21, 0)), [])
+
+    def test_reservation_from_the_day_before(self):
+        self.book(self.day - timedelta(days=1), (23, 30), '2')
+        self.assertEqual(self.taken((0, 30)), ['2'])
+        self.assertEqual(self.taken((1, 30)), [])
+
+    def test_sitting_running_into_the_next_day(self):
+        self.book(self.day + timedelta(days=1), (0, 30), '3', duration_minutes=60)
+        self.assertEqual(self.taken((23, 30)), ['3'])
+        self.assertEqual(self.taken((22, 0)), [])
+        self.assertEqual(self.taken((22, 0), duration=180), ['3'])
+
+
+### Booking
+
+class BookingTestCase(TransactionTestCase):
+    """Bookings are saved the way the views save them, each in its own transaction"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='guest', email='guest@example.com', password='secret123')
+        self.customer = Customer.objects.create(user=self.user)
+        self.restaurant = _restaurant('Booked Up')
+        self.day = timezone.localdate() + timedelta(days=7)
+
+    def book(self, at, table_numbers, **fields):
+        with transaction.atomic():
+            return Reservation.objects.create(
+                customer=self.customer, restaurant=self.restaurant, name='Guest', email='guest@example.com',
+                guest_count=2, date=self.day, time=time(*at), table_numbers=table_numbers, **fields,
+            )
+
+    def held(self, reservation):
+        return sorted(reservation.held_tables.values_list('table__number', flat=True))
+
+
+class BookingTests(BookingTestCase):
+    """
+    The reservation_table_no_overlap exclusion constraint, through the
+    post_save signal that holds a reservation's tables. No slots are
+    generated, so the constraint alone decides.
+    """
+
+    def test_overlapping_booking_of_a_table_is_refused(self):
+        first = self.book((19, 0), ['1', '2'])
+        self.assertEqual(self.held(first), ['1', '2'])
+        with self.assertRaises(TablesTaken) as refused:
+            self.book((20, 0), ['2', '3'])
+        # The constraint violation is reported with the table that was taken
+        self.assertIsInstance(refused.exception.__cause__, IntegrityError)
+        self.assertEqual(refused.exception.table_numbers, ['2'])
+        # The booking was rolled back with its holds
+        self.assertEqual(Reservation.objects.count(), 1)
+        self.assertEqual(ReservationTable.objects.count(), 2)
+
+    def test_adjacent_sittings_and_other_tables_are_allowed(self):
+        self.book((19, 0), ['1'])
+        # Sittings are [start, end): the next one may start when this one ends
+        self.book((21, 0), ['1'])
+        self.book((17, 0), ['1'])
+        self.book((20, 0), ['2'])
+        self.assertEqual(ReservationTable.objects.count(), 4)
+
+    def test_unknown_table_is_refused(self):
+        with self.assertRaises(UnknownTables) as refused:
+            self.book((19, 0), ['1', '99'])
+        self.assertEqual(refused.exception.table_numbers, ['99'])
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_editing_a_booking_onto_its_own_tables(self):
+        reservation = self.book((19, 0), ['1', '2'])
+        # Overlaps its own previous sitting, which it gives up
+        reservation.time = time(20)
+        reservation.table_numbers = ['2']
+        with transaction.atomic():
+            reservation.save()
+        self.assertEqual(self.held(reservation), ['2'])
+        self.assertEqual(ReservationTable.objects.get().sitting, reservation.sitting)
+        self.book((19, 0), ['1'])
+
+    def test_cancelling_frees_the_tables(self):
+        reservation = self.book((19, 0), ['1'])
+        self.assertEqual(cancel_reservation(reservation.id, self.user), 'Booked Up')
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'CANCELLED')
+        self.assertEqual(self.held(reservation), [])
+        self.book((19, 0), ['1'])
+        # Nothing left to cancel
+        self.assertIsNone(cancel_reservation(reservation.id, self.user))
+
+    def test_inactive_reservations_hold_nothing(self):
+        reservation = self.book((19, 0), ['1'])
+        reservation.status = 'COMPLETED'
+        with transaction.atomic():
+            reservation.save()
+        self.assertEqual(self.held(reservation), [])
+        self.book((19, 0), ['1'])
+
+    def test_concurrent_bookings_of_a_table(self):
+        outcome = {}
+
+        def book_the_same_table():
+            try:
+                self.book((20, 0), ['1'])
+                outcome['second'] = 'booked'
+            except TablesTaken as e:
+                outcome['second'] = e.table_numbers
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            self.book((19, 0), ['1'])
+            second = threading.Thread(target=book_the_same_table)
+            second.start()
+            # The second booking waits on the first one's uncommitted hold
+            second.join(timeout=1)
+            self.assertTrue(second.is_alive())
+        second.join()
+        self.assertEqual(outcome['second'], ['1'])
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+class TableSlotTests(BookingTestCase):
+    def setUp(self):
+        super().setUp()
+        generate_slots(self.day, days=1, restaurant_ids=[self.restaurant.id])
+
+    def booked(self, reservation):
+        return list(
+            TableSlot.objects.filter(reservation=reservation, state=TableSlot.BOOKED)
+            .order_by('table__number', 'start').values_list('table__number', 'start')
+        )
+
+    def test_generates_the_opening_hours(self):
+        slots = TableSlot.objects.filter(table__number='1')
+        # 10:00 to 22:00, the last slot ending at closing time
+        self.assertEqual(slots.count(), 24)
+        self.assertEqual((slots.earliest('start').start, slots.latest('start').start), (time(10), time(21, 30)))
+        self.assertEqual(generate_slots(self.day, days=1, restaurant_ids=[self.restaurant.id]), 0)
+
+    def test_generates_overnight_hours(self):
+        night_club = _restaurant('Night Club', opening_time=time(18), closing_time=time(2))
+        created = generate_slots(self.day, days=1, restaurant_ids=[night_club.id])
+        self.assertEqual(created, 16 * night_club.tables.count())
+        slots = TableSlot.objects.filter(table__restaurant=night_club, table__number='1')
+        # Slots after midnight belong to the next day
+        self.assertEqual(
+            [(slot.date, slot.start) for slot in slots.order_by('date', 'start')],
+            sitting_slots(self.day, time(18), 8 * 60),
+        )
+        self.assertEqual(slots.filter(date=self.day + timedelta(days=1)).count(), 4)
+
+    def test_existing_holds_are_marked_when_generating(self):
+        later = self.day + timedelta(days=1)
+        reservation = self.book((19, 0), ['1'], date=later)
+        self.assertEqual(self.booked(reservation), [])
+        generate_slots(later, days=1, restaurant_ids=[self.restaurant.id])
+        self.assertEqual(len(self.booked(reservation)), 4)
+
+    def test_booking_claims_its_slots(self):
+        reservation = self.book((19, 0), ['1'])
+        self.assertEqual(
+            self.booked(reservation), [('1', time(19)), ('1', time(19, 30)), ('1', time(20)), ('1', time(20, 30))],
+        )
+        with self.assertRaises(TablesTaken) as refused:
+            self.book((20, 30), ['1', '2'])
+        # The slot claim refused it before the constraint was reached
+        self.assertIsNone(refused.exception.__cause__)
+        self.assertEqual(refused.exception.table_numbers, ['1'])
+        self.assertEqual(TableSlot.objects.filter(state=TableSlot.BOOKED).count(), 4)
+
+    def test_editing_releases_and_claims_again(self):
+        reservation = self.book((19, 0), ['1'])
+        reservation.time = time(20)
+        reservation.table_numbers = ['2']
+        with transaction.atomic():
+            reservation.save()
+        self.assertEqual(
+            self.booked(reservation), [('2', time(20)), ('2', time(20, 30)), ('2', time(21)), ('2', time(21, 30))],
+        )
+        self.assertEqual(TableSlot.objects.filter(state=TableSlot.BOOKED).count(), 4)
+        self.book((19, 0), ['1'])
+
+    def test_cancelling_and_deleting_free_the_slots(self):
+        cancelled = self.book((12, 0), ['1'])
+        deleted = self.book((19, 0), ['1'])
+        cancel_reservation(cancelled.id, self.user)
+        deleted.delete()
+        self.assertFalse(TableSlot.objects.exclude(state=TableSlot.FREE).exists())
+
+    def test_a_slot_being_claimed_is_refused_without_waiting(self):
+        outcome = {}
+
+        def book_the_same_table():
+            try:
+                self.book((20, 0), ['1'])
+                outcome['second'] = 'booked'
+            except TablesTaken as e:
+                outcome['second'] = e.table_numbers
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            self.book((19, 0), ['1'])
+            second = threading.Thread(target=book_the_same_table)
+            second.start()
+            # SKIP LOCKED: the second booker does not wait for this transaction
+            second.join(timeout=10)
+            self.assertFalse(second.is_alive())
+        self.assertEqual(outcome['second'], ['1'])
+        self.assertEqual(Reservation.objects.count(), 1)
+
+
+### Reservation lifecycle
+
+class AdvanceReservationsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.restaurant = _restaurant('Lunch Spot')
+        cls.day = date(2030, 5, 6)
+        generate_slots(cls.day, days=1, restaurant_ids=[cls.restaurant.id])
+
+    def book(self, table_number, at=(12, 0), status='CONFIRMED', **fields):
+        with transaction.atomic():
+            return Reservation.objects.create(
+                restaurant=self.restaurant, name='Guest', email='guest@example.com', guest_count=2,
+                date=self.day, time=time(*at), table_numbers=[table_number], status=status, **fields,
+            )
+
+    def advance(self, hour, minute=0, **kwargs):
+        # Naive UTC wall clock, as the reservations are stored
+        now = datetime.combine(self.day, time(hour, minute))
+        return [
+            (batch.transition.from_status, batch.count)
+            for batch in advance_reservations(now=now, **kwargs)
+        ]
+
+    def status(self, reservation):
+        reservation.refresh_from_db()
+        return reservation.status
+
+    def test_completed_once_the_sitting_has_ended(self):
+        confirmed = self.book('1')
+        pending = self.book('2', status='PENDING')
+        longer = self.book('3', duration_minutes=180)
+        cancelled = self.book('4', status='CANCELLED')
+
+        self.assertEqual(self.advance(13, 59), [('CONFIRMED', 0), ('PENDING', 0)])
+        self.assertEqual(self.status(confirmed), 'CONFIRMED')
+        self.assertEqual(self.status(pending), 'PENDING')
+
+        self.assertEqual(self.advance(14), [('CONFIRMED', 1), ('PENDING', 1)])
+        self.assertEqual(
+            [self.status(reservation) for reservation in (confirmed, pending, longer, cancelled)],
+            ['COMPLETED', 'COMPLETED', 'CONFIRMED', 'CANCELLED'],
+        )
+        self.assertEqual(self.advance(15), [('CONFIRMED', 1), ('PENDING', 0)])
+        self.assertEqual(self.status(longer), 'COMPLETED')
+
+    def test_frees_holds_and_slots(self):
+        done = self.book('1')
+        seated = self.book('2', at=(13, 0))
+        self.assertEqual(TableSlot.objects.filter(reservation=done).count(), 4)
+
+        self.advance(14)
+        self.assertFalse(ReservationTable.objects.filter(reservation=done).exists())
+        self.assertFalse(TableSlot.objects.filter(reservation=done).exists())
+        self.assertEqual(
+            TableSlot.objects.filter(table__number='1', state=TableSlot.BOOKED).count(), 0,
+        )
+        # The party still seated keeps its tables
+        self.assertTrue(ReservationTable.objects.filter(reservation=seated).exists())
+        self.assertEqual(TableSlot.objects.filter(reservation=seated, state=TableSlot.BOOKED).count(), 4)
+        # The table can be booked again for a sitting that overlaps the completed one
+        self.book('1', at=(13, 30))
+
+    def test_batches_until_nothing_is_due(self):
+        for number in '12345':
+            self.book(number)
+        self.assertEqual(
+            self.advance(14, batch_size=2),
+            [('CONFIRMED', 2), ('CONFIRMED', 2), ('CONFIRMED', 1), ('PENDING', 0)],
+        )
+        self.assertEqual(self.advance(14, batch_size=2), [('CONFIRMED', 0), ('PENDING', 0)])
+
+    def test_max_batches(self):
+        for number in '123':
+            self.book(number)
+        self.assertEqual(self.advance(14, batch_size=1, max_batches=2), [('CONFIRMED', 1), ('CONFIRMED', 1), ('PENDING', 0)])
+        self.assertEqual(Reservation.objects.filter(status='CONFIRMED').count(), 1)
+
+    def test_batch_size_must_be_positive(self):
+        for batch_size in (0, -1):
+            with self.subTest(batch_size=batch_size):
+                with self.assertRaises(ValueError):
+                    self.advance(14, batch_size=batch_size)
+                with self.assertRaises(CommandError):
+                    call_command('advance_reservations', batch_size=batch_size)
+
+
+### Reservation export
+
+class CsvExportTests(SimpleTestCase):
+    def test_formula_triggers_are_neutralized(self):
+        for value in ('=1+1', '+1', '-2+3', '@SUM(A1:A2)', '\tcmd', '\rcmd', '=HYPERLINK("http://x")'):
+            with self.subTest(value=value):
+                self.assertEqual(_csv_cell(value), "'" + value)
+
+    def test_other_values_pass_through(self):
+        for value in ('Guest', 'a=b', 'O\'Brien', ' =1', '', 12, -3, None, Decimal('-1.5'), date(2030, 5, 6)):
+            with self.subTest(value=value):
+                self.assertEqual(_csv_cell(value), value)
+
+    def test_csv_lines(self):
+        row = dict.fromkeys(EXPORT_FIELDS, '')
+        row.update(id=7, guest_count=2, name='=cmd|\'/C calc\'!A0', notes='Window seat', table_numbers=['1', '2'])
+        header, line = list(csv_lines([row]))
+        self.assertEqual(header, ','.join(EXPORT_FIELDS) + '\r\n')
+        self.assertEqual(next(csv.reader([line])), [
+            '7', '', '', '', "'=cmd|'/C calc'!A0", '', '2', '1 2', '', 'Window seat', '',
+        ])
+
+
+### Email outbox
+
+class BouncingEmailBackend(locmem.EmailBackend):
+    """A local SMTP stand-in that refuses every address at bounce.example.com"""
+
+    def send_messages(self, messages):
+        for message in messages:
+            if message.to[0].endswith('@bounce.example.com'):
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, b'No such user')})
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='rr_app.tests.BouncingEmailBackend', DEFAULT_FROM_EMAIL='rr@example.com')
+class EmailOutboxTests(TestCase):
+    def drain(self, **kwargs):
+        return [tuple(result) for result in drain_outbox(**kwargs)]
+
+    def test_sends_queued_emails(self):
+        enqueue_email('Hello', 'a@example.com', 'Hi', '<p>Hi</p>')
+        enqueue_email('Hello', 'b@example.com', 'Hi')
+        self.assertEqual(self.drain(), [(2, 0, 0, 0)])
+        messages = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(sorted(messages), ['a@example.com', 'b@example.com'])
+        self.assertEqual(messages['a@example.com'].alternatives, [('<p>Hi</p>', 'text/html')])
+        self.assertEqual(messages['a@example.com'].from_email, 'rr@example.com')
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+        self.assertEqual(self.drain(), [])
+
+    def test_failures_are_retried_with_backoff(self):
+        email = enqueue_email('Hello', 'x@bounce.example.com', 'Hi')
+        enqueue_email('Hello', 'a@example.com', 'Hi')
+        # One refused address does not hold up the rest of the batch
+        self.assertEqual(self.drain(), [(1, 1, 0, 0)])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 1))
+        self.assertIn('SMTPRecipientsRefused', email.last_error)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=25))
+        # Not due again until the backoff has passed
+        self.assertEqual(self.drain(), [])
+
+        OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.drain(), [(0, 1, 0, 0)])
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=55))
+
+    def test_backoff_doubles_up_to_a_cap(self):
+        self.assertEqual([backoff(n).total_seconds() for n in range(1, 6)], [30, 60, 120, 240, 480])
+        self.assertEqual(backoff(20).total_seconds(), OUTBOX_MAX_BACKOFF_SECONDS)
+
+    def test_dead_lettered_after_the_last_attempt(self):
+        email = enqueue_email('Hello', 'x@bounce.example.com', 'Hi')
+        OutboxEmail.objects.filter(pk=email.pk).update(attempts=OUTBOX_MAX_ATTEMPTS - 1)
+        self.assertEqual(self.drain(), [(0, 0, 1, 0)])
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.DEAD, OUTBOX_MAX_ATTEMPTS))
+        self.assertIn('SMTPRecipientsRefused', email.last_error)
+        OutboxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.drain(), [])
+
+    def test_leased_emails_are_not_claimed_by_another_worker(self):
+        for n in range(3):
+            enqueue_email('Hello', f'{n}@example.com', 'Hi')
+        first, second = claim_batch(2), claim_batch(2)
+        self.assertEqual((len(first), len(second)), (2, 1))
+        self.assertFalse({email.pk for email in first} & {email.pk for email in second})
+        self.assertEqual(claim_batch(), [])
+        # The emails of a worker that died are claimed again once their lease ends
+        later = timezone.now() + timedelta(seconds=lease_seconds() + 1)
+        self.assertEqual(len(claim_batch(now=later)), 3)
+
+    def test_lease_covers_one_send_and_is_renewed_for_the_rest(self):
+        with self.settings(EMAIL_TIMEOUT=10):
+            self.assertEqual(lease_seconds(), OUTBOX_LEASE_MARGIN_SECONDS + 30)
+        for n in range(3):
+            enqueue_email('Hello', f'{n}@example.com', 'Hi')
+        with mock.patch('rr_app.services.email_outbox.extend_lease', wraps=extend_lease) as extend:
+            self.assertEqual(self.drain(), [(3, 0, 0, 0)])
+        # Claimed, then renewed before the second and the third send
+        self.assertEqual([len(call.args[0]) for call in extend.call_args_list], [3, 2, 1])
+
+    def test_expired_emails_are_dropped(self):
+        expired = enqueue_email('Code', 'a@example.com', '111111', expires_at=timezone.now() - timedelta(minutes=1))
+        enqueue_email('Code', 'b@example.com', '222222', expires_at=timezone.now() + timedelta(minutes=15))
+        self.assertEqual(self.drain(), [(0, 0, 0, 1), (1, 0, 0, 0)])
+        self.assertEqual([message.to[0] for message in mail.outbox], ['b@example.com'])
+        expired.refresh_from_db()
+        self.assertEqual((expired.status, expired.last_error), (OutboxEmail.DEAD, EXPIRED_ERROR))
+
+    def test_not_retried_past_its_expiry(self):
+        email = enqueue_email('Code', 'x@bounce.example.com', '111111', expires_at=timezone.now() + timedelta(seconds=10))
+        self.assertEqual(self.drain(), [(0, 0, 1, 0)])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.DEAD)
+        self.assertIn(EXPIRED_ERROR, email.last_error)
+
+    def test_reset_code_email_expires_with_the_code(self):
+        user = User.objects.create_user(username='guest', email='guest@example.com', password='secret123')
+        self.assertTrue(send_password_reset_code_email(user, user.generate_password_reset_code()))
+        self.assertEqual(OutboxEmail.objects.get().expires_at, user.password_reset_code_expires)
+
+
+### Rate limiting
+
+RATE_LIMIT_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=RATE_LIMIT_CACHES, RATELIMIT_CACHE='default', RATELIMIT_ENABLED=True, RATELIMIT_PROXY_COUNT=1)
+class RateLimitTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def post(self, ip='10.0.0.1', headers=None, **data):
+        return self.factory.post('/', data, REMOTE_ADDR=ip, headers=headers)
+
+    def test_sliding_window_estimate(self):
+        limits = [Limit(client_ip, 10, 60)]
+        request = self.post()
+        # 10 requests late in the previous window (6000 is a window start)...
+        for _ in range(10):
+            self.assertIsNone(check_limits('test', limits, request, {}, now=5990))
+        # ...still count for half halfway through the next one: 10 * 0.5 + 5 = 10
+        for _ in range(5):
+            self.assertIsNone(check_limits('test', limits, request, {}, now=6030))
+        self.assertEqual(check_limits('test', limits, request, {}, now=6030), 30)
+        # Another tenth of the window later one more fits: 10 * 0.4 + 6 = 10.
+        # It would not if the refused request had been kept on the counter
+        self.assertIsNone(check_limits('test', limits, request, {}, now=6036))
+        self.assertEqual(check_limits('test', limits, request, {}, now=6036), 24)
+        # Two windows later the old requests are gone
+        for _ in range(10):
+            self.assertIsNone(check_limits('test', limits, request, {}, now=6120))
+
+    def test_a_refusal_takes_the_request_off_every_counter(self):
+        limits = [Limit(client_ip, 100, 60), Limit(post_field('username'), 2, 60)]
+        for _ in range(2):
+            self.assertIsNone(check_limits('test', limits, self.post(username='guest'), {}, now=6000))
+        for _ in range(50):
+            self.assertIsNotNone(check_limits('test', limits, self.post(username='guest'), {}, now=6000))
+        # The refused attempts did not use up the address's allowance
+        for n in range(98):
+            self.assertIsNone(check_limits('test', limits, self.post(username=f'user{n}'), {}, now=6000))
+        self.assertIsNotNone(check_limits('test', limits, self.post(username='other'), {}, now=6000))
+
+    def view(self, *limits):
+        @rate_limit('test', *limits)
+        def view(request, **kwargs):
+            return HttpResponse('ok')
+        return view
+
+    def test_per_username_limit(self):
+        view = self.view(Limit(client_ip, 100, 60), Limit(post_field('username'), 2, 60))
+        # Usernames are compared trimmed and case-insensitively, whatever the address
+        for username, ip in [('guest', '10.0.0.1'), (' Guest ', '10.0.0.2')]:
+            self.assertEqual(view(self.post(ip, username=username)).status_code, 200)
+        self.assertEqual(view(self.post('10.0.0.3', username='GUEST')).status_code, 429)
+        self.assertEqual(view(self.post(username='other')).status_code, 200)
+        # A request without the field is only counted against the address
+        self.assertEqual(view(self.post()).status_code, 200)
+
+    def test_per_email_and_per_account_limits(self):
+        view = self.view(Limit(post_field('email'), 1, 60), Limit(view_kwarg('user_id'), 2, 60))
+        self.assertEqual(view(self.post(email='a@example.com'), user_id=1).status_code, 200)
+        self.assertEqual(view(self.post(email='A@example.com'), user_id=2).status_code, 429)
+        self.assertEqual(view(self.post(email='b@example.com'), user_id=1).status_code, 200)
+        self.assertEqual(view(self.post(email='c@example.com'), user_id=1).status_code, 429)
+
+    def test_too_many_requests_response(self):
+        view = self.view(Limit(client_ip, 1, 60))
+        with mock.patch('rr_app.utils.rate_limit.time') as clock:
+            clock.time.return_value = 6045
+            view(self.post())
+            response = view(self.post())
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response['Retry-After'], '15')
+            self.assertEqual(json.loads(response.content), {
+                'success': False, 'message': 'Too many attempts. Please try again later.',
+            })
+            response = view(self.post(headers={'Accept': 'text/html'}))
+            self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+            # Only POSTs are counted; the form can always be shown
+            self.assertEqual(view(self.factory.get('/', REMOTE_ADDR='10.0.0.1')).status_code, 200)
+            with self.settings(RATELIMIT_ENABLED=False):
+                self.assertEqual(view(self.post()).status_code, 200)
+
+    def test_client_ip_behind_proxies(self):
+        forwarded = {'X-Forwarded-For': '6.6.6.6, 1.2.3.4'}
+        # The proxy appended the address it saw; the first entry is the client's own claim
+        self.assertEqual(client_ip(self.post('10.9.9.9', forwarded), {}), '1.2.3.4')
+        self.assertEqual(client_ip(self.post('10.9.9.9'), {}), '10.9.9.9')
+        with self.settings(RATELIMIT_PROXY_COUNT=2):
+            self.assertEqual(client_ip(self.post('10.9.9.9', forwarded), {}), '6.6.6.6')
+        with self.settings(RATELIMIT_PROXY_COUNT=0):
+            self.assertEqual(client_ip(self.post('10.9.9.9', forwarded), {}), '10.9.9.9')
+
+
+### Email rendering
+
+class StylesheetTests(SimpleTestCase):
+    CSS = """
+        /* comment { color: red; } */
+        p { color: #111111; margin: 0; }
+        .note, .warning p { color: #222222; }
+        a:hover { color: #333333; }
+        .box > p { color: #444444; }
+        @media (max-width: 480px) { p { margin: 4px; } }
+    """
+
+    def test_inlinable_rules_and_the_rest(self):
+        rules, kept = parse_stylesheet(self.CSS)
+        self.assertEqual(
+            [(rule.selector, rule.declarations) for rule in rules],
+            [
+                ([('p', frozenset())], ['color: #111111', 'margin: 0']),
+                ([(None, frozenset({'note'}))], ['color: #222222']),
+                ([(None, frozenset({'warning'})), ('p', frozenset())], ['color: #222222']),
+            ],
+        )
+        # Pseudo-classes, other combinators and at-rules stay in the <style> block
+        self.assertIn('a:hover { color: #333333; }', kept)
+        self.assertIn('.box > p { color: #444444; }', kept)
+        self.assertIn('@media (max-width: 480px) { p { margin: 4px; } }', kept)
+        self.assertNotIn('comment', kept)
+
+    def inline(self, css, html):
+        rules, _ = parse_stylesheet(css)
+        return inline_css(html, rules)
+
+    def test_descendant_selectors(self):
+        html = self.inline(
+            '.footer p { color: gray; }',
+            '<p>out</p><div class="footer"><div><p>in</p></div></div><p>after</p>',
+        )
+        self.assertEqual(html, '<p>out</p><div class="footer"><div><p style="color: gray">in</p></div></div><p>after</p>')
+
+    def test_void_and_self_closing_elements_do_not_nest(self):
+        html = self.inline(
+            'img p { color: red; } .x p { color: blue; }',
+            '<div class="x"><img src="a.png"><br/></div><p>after</p>',
+        )
+        self.assertEqual(html, '<div class="x"><img src="a.png"><br/></div><p>after</p>')
+
+    def test_cascade_order(self):
+        html = self.inline(
+            '.lead { color: blue; } p { color: red; font-size: 14px; } p { font-size: 16px; }',
+            '<p class="lead" style="font-size: 20px">hi</p>',
+        )
+        # The class beats the type selector listed after it, the later of two
+        # equal rules wins, and the template's own style attribute comes last
+        self.assertEqual(
+            html, '<p class="lead" style="color: blue; font-size: 16px; font-size: 20px">hi</p>',
+        )
+
+    def test_specificity_beats_source_order(self):
+        css = """
+            .lead.big { color: red; }
+            div .lead { margin: 1px; }
+            p.lead { font-size: 20px; }
+            .lead { color: blue; margin: 2px; font-size: 10px; }
+        """
+        self.assertEqual(
+            self.inline(css, '<div><p class="lead big">hi</p></div>'),
+            '<div><p class="lead big" style="color: red; margin: 1px; font-size: 20px">hi</p></div>',
+        )
+
+    def test_important(self):
+        css = """
+            p { color: red !important; margin: 0 !important; }
+            .lead { color: blue; margin: 4px !important; }
+        """
+        # A plain declaration never overrides an !important one, a more specific !important one does
+        self.assertEqual(
+            self.inline(css, '<p class="lead" style="color: black">hi</p>'),
+            '<p class="lead" style="color: red !important; margin: 4px !important; color: black">hi</p>',
+        )
+
+    def test_media_queries_are_not_inlined(self):
+        css = """
+            .lead { color: blue; }
+            @media screen and (max-width: 480px) {
+                .lead { color: red; }
+                .box p { margin: 0; }
+            }
+        """
+        rules, kept = parse_stylesheet(css)
+        self.assertEqual(len(rules), 1)
+        # Kept whole, nested rules included
+        self.assertEqual(
+            kept, '@media screen and (max-width: 480px) { .lead { color: red; }\n                .box p { margin: 0; } }',
+        )
+        self.assertEqual(inline_css('<p class="lead">hi</p>', rules), '<p class="lead" style="color: blue">hi</p>')
+
+    def test_stylesheet_link_is_replaced(self):
+        source = (
+            '<html><head>{% load static %}'
+            '<link rel="stylesheet" href="{% static \'rr_app/css/email-styles.css\' %}">'
+            '</head><body><div class="footer"><p>x</p></div></body></html>'
+        )
+        html = inline_stylesheets(source)
+        self.assertNotIn('<link', html)
+        self.assertIn('<body style="font-family: Arial, sans-serif;', html)
+        self.assertIn('<p style="margin: 5px 0; line-height: 1.5">', html)
+        style = html[html.index('<style'):html.index('</style>')]
+        self.assertIn('.footer a:hover', style)
+        self.assertIn('@media screen and (max-width: 480px)', style)
+
+
+class TextVersionTests(SimpleTestCase):
+    def test_keeps_variables_and_paragraphs(self):
+        source = (
+            '{% load static %}<!DOCTYPE html><html><head><title>T</title></head><body>'
+            '<!-- note --><svg><path d="M0"/></svg>'
+            '<h2>Hello</h2>\n<p>Hi {{ name }},</p>\n<p>Click <a href="{{ url }}">here</a>.</p>\n'
+            '<p><a href="{{ url }}">{{ url }}</a></p></body></html>'
+        )
+        self.assertEqual(
+            text_source(source),
+            '{% load static %}{% autoescape off %}Hello\n\nHi {{ name }},\n\nClick here: {{ url }}.\n\n{{ url }}\n'
+            '{% endautoescape %}',
+        )
+
+
+class RenderEmailTests(SimpleTestCase):
+    def setUp(self):
+        compile_email.cache_clear()
+
+    def test_verification_email(self):
+        user = type('User', (), {'first_name': "O'Brien", 'username': 'ob', 'email': 'ob@example.com'})
+        html, text = render_email('rr_app/emails/verification_email.html', {
+            'user': user, 'verification_url': 'https://example.com/verify/?a=1&b=2', 'site_name': 'RR',
+        })
+        self.assertNotIn('<link', html)
+        self.assertIn('class="verify-button" style="display: inline-block;', html)
+        self.assertIn('class="detail-label" style="display: block;', html)
+        self.assertIn('alt="Logo"', html)
+        self.assertIn('O&#x27;Brien', html)
+        self.assertIn('https://example.com/verify/?a=1&amp;b=2', html)
+
+        self.assertNotIn('<', text)
+        self.assertIn("Hi O'Brien,", text)
+        self.assertIn('Email Address\nob@example.com\n\nAccount Name\nO\'Brien', text)
+        self.assertIn('Verify Email Address: https://example.com/verify/?a=1&b=2', text)
+
+    @override_settings(SITE_URL='https://rr.example.com')
+    def test_logo_has_an_absolute_url(self):
+        user = {'email': 'a@example.com', 'username': 'a', 'password_reset_code_expires': None}
+        with mock.patch('rr_app.services.email_service.enqueue_email') as enqueue:
+            self.assertTrue(send_password_reset_code_email(type('User', (), user), '123456'))
+            with self.settings(STATIC_URL='https://cdn.example.com/static/'):
+                send_password_reset_code_email(type('User', (), user), '123456')
+        (_, _, _, site_html), _ = enqueue.call_args_list[0]
+        (_, _, _, cdn_html), _ = enqueue.call_args_list[1]
+        self.assertIn('<img src="https://rr.example.com/static/rr_app/images/cloche.png" alt="Logo"', site_html)
+        self.assertIn('<img src="https://cdn.example.com/static/rr_app/images/cloche.png" alt="Logo"', cdn_html)
+
+    def test_compiled_once(self):
+        with self.settings(DEBUG=False):
+            with mock.patch('rr_app.services.email_rendering.get_template', wraps=get_template) as loader:
+                for code in ('111111', '222222'):
+                    _, text = render_email('rr_app/emails/password_reset_code_email.html', {
+                        'user': {'email': 'a@example.com', 'username': 'a'}, 'reset_code': code, 'site_name': 'RR',
+                    })
+                    self.assertIn(code, text)
+        self.assertEqual(loader.call_count, 1)
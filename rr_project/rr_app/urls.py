@@ -24,8 +24,18 @@ urlpatterns = [
     # Main application URLs
     path('dashboard/', restaurant.dashboard_view, name='dashboard'),
     path('restaurants/', restaurant.restaurants_view, name='restaurants'),
+    path('api/restaurants/', restaurant.restaurant_list_api_view, name='restaurant_list_api'),
+    path('api/restaurants/facets/', restaurant.restaurant_facets_api_view, name='restaurant_facets_api'),
+    path('restaurants/search/', restaurant.restaurant_search_view, name='restaurant_search'),
+    path('api/restaurants/search/', restaurant.restaurant_search_api_view, name='restaurant_search_api'),
     path('reservation/manage/', restaurant.reservation_management_view, name='reservation_management'),
     path('restaurant/<int:restaurant_id>/', restaurant.restaurant_detail_view, name='restaurant_detail'),
+    path('restaurant/<int:restaurant_id>/reviews/', restaurant.restaurant_reviews_view, name='restaurant_reviews'),
+    path('restaurant/<int:restaurant_id>/tables/', restaurant.restaurant_tables_view, name='restaurant_tables'),
+    path('restaurant/<int:restaurant_id>/tables/hold/', restaurant.restaurant_table_hold_view, name='restaurant_table_hold'),
+    path('restaurant/<int:restaurant_id>/tables/suggest/', restaurant.restaurant_table_suggestion_view, name='restaurant_table_suggestion'),
+    path('restaurant/<int:restaurant_id>/reservations/export/', restaurant.restaurant_reservations_export_view, name='restaurant_reservations_export'),
+    path('restaurant/<int:restaurant_id>/calendar/', restaurant.restaurant_calendar_view, name='restaurant_calendar'),
     # Redirect root to login
     path('', auth.login_view, name='home'),
 ]
\ No newline at end of file
@@ -0,0 +1,113 @@
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+CURSOR_SALT = 'rr_app.pagination.cursor'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    """Pack the sort key of the last row into an opaque, tamper-proof token"""
+    return signing.dumps([_to_json(v) for v in values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    try:
+        values = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise InvalidCursor('Invalid pagination cursor.')
+    if not isinstance(values, list):
+        raise InvalidCursor('Invalid pagination cursor.')
+    return values
+
+
+def _to_json(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    # Decimal, date, datetime, time: restored with the model field's to_python()
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class CursorPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class CursorPaginator:
+    """
+    Keyset (seek) pagination.
+
+    Instead of OFFSET, each page continues after the sort key of the last row
+    of the previous page, so deep pages cost the same as the first one when
+    an index matches `ordering`. The ordering must end with a unique column
+    (normally '-id' or 'id') and its columns must be non-null.
+    """
+
+    def __init__(self, queryset, ordering, page_size):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.page_size = page_size
+        self.fields = [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    @staticmethod
+    def _value(row, name):
+        # Works for model instances and for .values() rows
+        return row[name] if isinstance(row, dict) else getattr(row, name)
+
+    def _coerce(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotation, e.g. a Count
+            return value
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            raise InvalidCursor('Invalid pagination cursor.')
+
+    def _after(self, values):
+        """
+        Build (a > x) OR (a = x AND b > y) OR ... honouring each column's direction
+        """
+        condition = Q()
+        equal_so_far = Q()
+        for (name, descending), value in zip(self.fields, values):
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+    def page(self, cursor=None):
+        queryset = self.queryset.order_by(*self.ordering)
+
+        if cursor:
+            values = decode_cursor(cursor)
+            if len(values) != len(self.fields):
+                raise InvalidCursor('Invalid pagination cursor.')
+            values = [self._coerce(name, value) for (name, _), value in zip(self.fields, values)]
+            queryset = queryset.filter(self._after(values))
+
+        # One extra row tells us whether there is a next page
+        rows = list(queryset[:self.page_size + 1])
+        items = rows[:self.page_size]
+
+        next_cursor = None
+        if len(rows) > self.page_size:
+            last = items[-1]
+            next_cursor = encode_cursor([self._value(last, name) for name, _ in self.fields])
+        return CursorPage(items, next_cursor)
@@ -0,0 +1,122 @@
+"""
+SQL query counting and N+1 detection.
+
+QueryRecorder hooks into connection.execute_wrapper() and keeps every
+statement with a fingerprint: the SQL with literals and parameter lists
+collapsed, so the same lookup run for different rows shares one fingerprint.
+A fingerprint repeated N_PLUS_ONE_THRESHOLD times in one request is almost
+always a query inside a loop.
+
+Views declare how many queries they may run with @query_budget(n).
+QueryBudgetMiddleware checks every request against it, and
+assert_query_budget() / assert_view_query_budget() do the same in tests
+(see ViewQueryBudgetTests in tests.py). Queries run while a
+StreamingHttpResponse is iterated happen after the view returns and are
+not counted.
+"""
+import re
+import time
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.urls import resolve
+
+
+N_PLUS_ONE_THRESHOLD = 5
+
+RecordedQuery = namedtuple('RecordedQuery', ['sql', 'fingerprint', 'duration'])
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s')
+_VALUE_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Normalize a statement so queries differing only in their values compare equal"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _VALUE_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of SQL queries a view may run per request"""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def get_query_budget(view_func):
+    return getattr(view_func, 'query_budget', None)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(RecordedQuery(sql, fingerprint(sql), time.perf_counter() - start))
+
+    @contextmanager
+    def record(self, using=DEFAULT_DB_ALIAS):
+        with connections[using].execute_wrapper(self):
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """(fingerprint, times) of every query shape run at least `threshold` times"""
+        counts = Counter(query.fingerprint for query in self.queries)
+        return [(shape, times) for shape, times in counts.most_common() if times >= threshold]
+
+    def problems(self, budget=None, threshold=N_PLUS_ONE_THRESHOLD):
+        """Human readable budget and N+1 violations, empty when everything is fine"""
+        problems = []
+        if budget is not None and self.count > budget:
+            problems.append(f'{self.count} queries, budget is {budget}')
+        for shape, times in self.repeated(threshold):
+            problems.append(f'possible N+1, {times}x: {shape}')
+        return problems
+
+
+@contextmanager
+def assert_query_budget(max_queries=None, threshold=N_PLUS_ONE_THRESHOLD, label='block'):
+    """
+    Test helper: fail when the block runs more than `max_queries` queries
+    or repeats one query shape `threshold` times.
+
+        with assert_query_budget(5):
+            client.get(url)
+    """
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    problems = recorder.problems(max_queries, threshold)
+    if problems:
+        raise QueryBudgetExceeded(f'{label}: ' + '; '.join(problems))
+
+
+def assert_view_query_budget(client, path, method='get', threshold=N_PLUS_ONE_THRESHOLD, **kwargs):
+    """
+    Test helper: request `path` with a test client and check it against the
+    budget declared on the view it resolves to. Returns the response.
+    """
+    match = resolve(path.split('?', 1)[0])
+    with assert_query_budget(get_query_budget(match.func), threshold, label=match.view_name):
+        response = getattr(client, method)(path, **kwargs)
+    return response
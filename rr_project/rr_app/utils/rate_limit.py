@@ -0,0 +1,179 @@
+"""
+Sliding-window rate limiting.
+
+Views declare their limits with @rate_limit(scope, Limit(...), ...). Each
+Limit counts requests per key (the client IP, an email address, a user id)
+in fixed windows of `seconds` and estimates the sliding window from the
+current and the previous one:
+
+    hits = previous * (share of the previous window still in view) + current
+
+which smooths out the burst a fixed window allows at its edges, using only
+two counters per key. Counters live in the RATELIMIT_CACHE cache alias, so
+the backend is a setting: local memory (per worker process), a file-based
+cache (shared by the workers of one host) or Redis (shared everywhere).
+
+A rejected request is answered with a 429 before the view runs: a few
+cache round trips, no database query, no password hash and no email.
+Counters are incremented atomically before they are compared, so a burst of
+concurrent requests cannot all slip in under the limit (the file-based
+cache has no atomic increment; use Redis where that matters). A rejected
+request is taken off the counters again, so a client that backs off gets
+in once the window slides past its earlier requests.
+"""
+import hashlib
+import math
+import time
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+
+RATE_LIMIT_KEY = 'ratelimit:{scope}:{name}:{ident}:{window}'
+
+Limit = namedtuple('Limit', ['key', 'count', 'seconds'])
+
+
+### Keys: request -> identifier, or None to skip the limit
+
+def client_ip(request, view_kwargs):
+    """
+    The client address. Each of the RATELIMIT_PROXY_COUNT proxies in front
+    of the app appends the address it saw to X-Forwarded-For, so the entry
+    that many from the end is the client's; REMOTE_ADDR is the last proxy.
+    """
+    proxies = getattr(settings, 'RATELIMIT_PROXY_COUNT', 1)
+    forwarded = [ip.strip() for ip in request.headers.get('X-Forwarded-For', '').split(',') if ip.strip()]
+    if proxies and len(forwarded) >= proxies:
+        # Entries before the ones our proxies added are set by the client
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+client_ip.key_name = 'ip'
+
+
+def post_field(field):
+    """Key on a submitted form field, e.g. the email address of an account"""
+    def key(request, view_kwargs):
+        value = request.POST.get(field, '').strip().lower()
+        return value or None
+    key.key_name = field
+    return key
+
+
+def view_kwarg(name):
+    """Key on a URL parameter, e.g. the user id of the account"""
+    def key(request, view_kwargs):
+        value = view_kwargs.get(name)
+        return None if value is None else str(value)
+    key.key_name = name
+    return key
+
+
+### Counting
+
+def _cache():
+    return caches[getattr(settings, 'RATELIMIT_CACHE', 'default')]
+
+
+def _counter_keys(scope, limit, ident, now):
+    window = int(now // limit.seconds)
+    # Hash identifiers: emails may be long or hold characters some backends refuse in keys
+    ident = hashlib.sha1(ident.encode()).hexdigest()
+    name = getattr(limit.key, 'key_name', limit.key.__name__)
+    return [
+        RATE_LIMIT_KEY.format(scope=scope, name=name, ident=ident, window=window - 1),
+        RATE_LIMIT_KEY.format(scope=scope, name=name, ident=ident, window=window),
+    ]
+
+
+def _increment(cache, key, timeout):
+    """Atomically count one request; the new total"""
+    if cache.add(key, 1, timeout):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr()
+        cache.set(key, 1, timeout)
+        return 1
+
+
+def _give_back(cache, key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        pass
+
+
+def check_limits(scope, limits, request, view_kwargs, now=None):
+    """
+    Count the request against every limit that applies to it. Returns the
+    seconds to wait when one is exhausted (the request is then taken off the
+    counters again), else None.
+
+    Counters are incremented before they are compared, so each of a burst of
+    concurrent requests sees the total including the ones before it and
+    only the first `count` get through.
+    """
+    now = time.time() if now is None else now
+    cache = _cache()
+
+    applicable = []
+    for limit in limits:
+        ident = limit.key(request, view_kwargs)
+        if ident is not None:
+            applicable.append((limit, _counter_keys(scope, limit, ident, now)))
+    if not applicable:
+        return None
+
+    # The previous windows are closed, so reading them first races with nothing
+    previous = cache.get_many([previous_key for _, (previous_key, _) in applicable])
+    counts = [
+        # Both windows must be readable for the whole of the next one
+        _increment(cache, current_key, limit.seconds * 2)
+        for limit, (_, current_key) in applicable
+    ]
+
+    for (limit, (previous_key, _)), current in zip(applicable, counts):
+        elapsed = (now % limit.seconds) / limit.seconds
+        if previous.get(previous_key, 0) * (1 - elapsed) + current > limit.count:
+            for _, (_, current_key) in applicable:
+                _give_back(cache, current_key)
+            # Suggest coming back when the next window starts
+            return max(1, math.ceil(limit.seconds - now % limit.seconds))
+    return None
+
+
+def too_many_requests(request, retry_after, message):
+    if 'text/html' in request.headers.get('Accept', ''):
+        response = HttpResponse(message, status=429, content_type='text/plain; charset=utf-8')
+    else:
+        response = JsonResponse({'success': False, 'message': message}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, *limits, methods=('POST',), message='Too many attempts. Please try again later.'):
+    """
+    Reject requests over any of `limits` with a 429. Only `methods` are
+    counted; a form page can always be displayed. Disabled with
+    RATELIMIT_ENABLED = False.
+
+        @rate_limit('login', Limit(client_ip, 20, 60), Limit(post_field('username'), 5, 300))
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods and getattr(settings, 'RATELIMIT_ENABLED', True):
+                retry_after = check_limits(scope, limits, request, kwargs)
+                if retry_after is not None:
+                    return too_many_requests(request, retry_after, message)
+            return view_func(request, *args, **kwargs)
+        wrapper.rate_limits = limits
+        return wrapper
+    return decorator
@@ -5,12 +5,20 @@ from django.http import JsonResponse
 from django.urls import reverse
 from django.utils import timezone
 from ..utils.validators import MinimumLengthAndNumberValidator 
+from ..utils.query_budget import query_budget
+from ..utils.rate_limit import Limit, client_ip, post_field, rate_limit, view_kwarg
 from ..forms.auth import CustomUserCreationForm, CustomAuthenticationForm
 from ..models import User, UserRole, Customer, Admin
 from ..services.email_service import send_verification_email, send_password_reset_code_email
 from django.core.exceptions import ValidationError
 from django.contrib.auth.hashers import check_password
 
+# Window of the per-IP and per-account limits on the password reset and
+# verification flows, which write a row and send an email per request
+EMAIL_LIMIT_WINDOW = 15 * 60
+
+
+@query_budget(10)
 def signup_view(request):
     """User registration view"""
     if request.method == 'POST':
@@ -59,6 +67,13 @@ def signup_view(request):
     })
 
 
+@query_budget(8)
+@rate_limit(
+    'login',
+    Limit(client_ip, 20, 60),
+    Limit(post_field('username'), 10, 15 * 60),
+    message='Too many login attempts. Please wait a few minutes and try again.',
+)
 def login_view(request):
     """User login view"""
     if request.method == 'POST':
@@ -96,6 +111,7 @@ def login_view(request):
          'first_error': first_error,
         })
 
+@query_budget(4)
 def logout_view(request):
     """User logout view"""
     logout(request)
@@ -103,6 +119,12 @@ def logout_view(request):
     return redirect('rr_app:login')
 
 
+@query_budget(8)
+@rate_limit(
+    'password_reset',
+    Limit(client_ip, 10, EMAIL_LIMIT_WINDOW),
+    Limit(post_field('email'), 3, EMAIL_LIMIT_WINDOW),
+)
 def forgot_password_view(request):
     """Handle forgot password process - Step 1: Email submission"""
     if request.method == 'POST':
@@ -153,6 +175,12 @@ def forgot_password_view(request):
     return render(request, 'rr_app/auth/forgot_pass.html')
 
 
+@query_budget(6)
+@rate_limit(
+    'reset_code_check',
+    Limit(client_ip, 30, EMAIL_LIMIT_WINDOW),
+    Limit(post_field('user_id'), 10, EMAIL_LIMIT_WINDOW),
+)
 def verify_reset_code_view(request):
     """Handle password reset verification - Step 2: Code verification"""
     if request.method == 'POST':
@@ -198,6 +226,12 @@ def verify_reset_code_view(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method.'})
 
 
+@query_budget(8)
+@rate_limit(
+    'reset_password',
+    Limit(client_ip, 30, EMAIL_LIMIT_WINDOW),
+    Limit(post_field('user_id'), 10, EMAIL_LIMIT_WINDOW),
+)
 def reset_password_view(request):
     """Handle password reset - Step 3: New password setup"""
     if request.method == 'POST':
@@ -271,6 +305,12 @@ def reset_password_view(request):
     return JsonResponse({'success': False, 'message': 'Invalid request method.'})
 
 
+@query_budget(8)
+@rate_limit(
+    'password_reset_resend',
+    Limit(client_ip, 10, EMAIL_LIMIT_WINDOW),
+    Limit(post_field('user_id'), 3, EMAIL_LIMIT_WINDOW),
+)
 def resend_reset_code_view(request):
     """Resend password reset code"""
     if request.method == 'POST':
@@ -320,6 +360,7 @@ def resend_reset_code_view(request):
 
 
 
+@query_budget(6)
 def verify_email_view(request, token):
     """Verify email address using token"""
     try:
@@ -351,6 +392,12 @@ def verify_email_view(request, token):
         return redirect('rr_app:signup')
 
 
+@query_budget(8)
+@rate_limit(
+    'verification_resend',
+    Limit(client_ip, 10, EMAIL_LIMIT_WINDOW),
+    Limit(view_kwarg('user_id'), 3, EMAIL_LIMIT_WINDOW),
+)
 def resend_verification_email_view(request, user_id):
     """Resend verification email"""
     if request.method == 'POST':
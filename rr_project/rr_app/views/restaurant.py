@@ -1,72 +1,97 @@
 
 from django.contrib.auth.decorators import login_required
 
-from ..models import Reservation, Restaurant, Review, Customer
+from ..models import Reservation, Restaurant, Customer, UserRole
 from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.http import require_POST
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from ..forms.restaurant import  ReservationForm, ReviewForm
 from django.contrib import messages
+from django.db import transaction
 from django import forms
-from django.db.models import Avg, Count
-from datetime import datetime, timedelta
+from datetime import date as date_type
 from django.utils import timezone
 from ..models import Cuisine, Tags
+from ..utils.pagination import CursorPaginator, InvalidCursor
+from ..utils.query_budget import query_budget
+from ..services.restaurant_cards import escape_json_for_script
+from ..services.leaderboard import get_top_restaurants
+from ..services.review_service import get_reviews_page
+from ..services.availability import get_table_availability, parse_sitting
+from ..services.booking import BookingError, cancel_reservation, normalize_table_numbers, tables_taken
+from ..services.soft_holds import SOFT_HOLD_SECONDS, held_by_others, hold_for_session, release_session_holds
+from ..services.table_allocator import check_reservation_tables, suggest_tables, wasted_seats
+from ..services.reservation_calendar import get_month_availability, parse_month
+from ..services.reservation_export import CONTENT_TYPES, EXPORT_FORMATS, export_filename, export_lines
+from ..services.restaurant_service import (
+    get_restaurant_page_json, get_facet_counts, search_restaurants, fuzzy_search_restaurants,
+    parse_id_list, parse_page_size, parse_budget, parse_flag,
+)
+
+RESERVATIONS_PAGE_SIZE = 20
+MAX_HELD_TABLES = 8
 
 # @login_required
+@query_budget(8)
 def dashboard_view(request):
     """User dashboard"""
     user = request.user
-    restaurants = Restaurant.objects.annotate(
-        avg_rating=Avg('reviews__rating'),
-        review_count=Count('reviews')
-    ).order_by('-avg_rating', '-created_at')[:6]
+    # Served from the cached leaderboard, no aggregate query on this page
+    restaurants = get_top_restaurants()
 
     context = {
         'user': user,
-        'reservations': Reservation.objects.filter(user=user) if hasattr(user, 'reservations') else [],
         'restaurants': restaurants,
     }
     return render(request, 'rr_app/restaurant/dashboard/dashboard.html', context)
 
+@query_budget(8)
 @login_required
 def reservation_management_view(request):
-    """Manage user reservations"""
-    reservations = Reservation.objects.filter(user=request.user).order_by('-date')
-    
+    """List the user's reservations, newest first, and cancel upcoming ones"""
     if request.method == 'POST':
-        # Handle reservation cancellation
-        reservation_id = request.POST.get('cancel_reservation')
-        if reservation_id:
-            try:
-                reservation = get_object_or_404(Reservation, id=reservation_id, user=request.user)
-                restaurant_name = reservation.restaurant.name
-                reservation.delete()
-                messages.success(request, f'Reservation at {restaurant_name} has been cancelled.')
-            except Exception:
-                messages.error(request, 'Failed to cancel reservation. Please try again.')
-            return redirect('rr_app:reservation_management')
-    
-    context = {
-        'reservations': reservations,
-        'has_reservations': reservations.exists()
-    }
-    
-    if not reservations.exists():
-        messages.info(request, 'You have no reservations yet. Start by exploring restaurants and making your first reservation!')
-    
-    return render(request, 'rr_app/restaurant/reservation_management.html', context)
+        reservation_id = request.POST.get('cancel_reservation', '')
+        restaurant_name = cancel_reservation(int(reservation_id), request.user) if reservation_id.isdigit() else None
+        if restaurant_name is None:
+            messages.error(request, 'This reservation can no longer be cancelled.')
+        else:
+            messages.success(request, f'Reservation at {restaurant_name or "the restaurant"} has been cancelled.')
+        return redirect('rr_app:reservation_management')
+
+    reservations = (
+        Reservation.objects.filter(customer__user=request.user)
+        .select_related('restaurant')
+        .only(
+            'date', 'time', 'duration_minutes', 'guest_count', 'notes', 'table_numbers', 'status',
+            'restaurant__id', 'restaurant__name',
+        )
+    )
+    try:
+        page = CursorPaginator(reservations, ('-date', '-id'), RESERVATIONS_PAGE_SIZE).page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return redirect('rr_app:reservation_management')
 
+    return render(request, 'rr_app/restaurant/reservation_management.html', {'reservations': page})
 
+
+# A booking POST checks the tables against the free ones and holds them
+@query_budget(20)
 @login_required
 def restaurant_detail_view(request, restaurant_id):
     """Restaurant detail page"""
-    restaurant = get_object_or_404(Restaurant, id=restaurant_id)
-    reviews = Review.objects.filter(restaurant=restaurant)
-    recent_reviews = reviews.filter(created_at__gte = timezone.now() - timedelta(days=30))
-    avg_rating = reviews.aggregate(avg_rating=Avg('rating'))['avg_rating']
+    restaurant = get_object_or_404(Restaurant.objects.prefetch_related('cuisines', 'tags'), id=restaurant_id)
+    # Only the first page is rendered; the rest is loaded on scroll from restaurant_reviews_view
+    try:
+        reviews_page = get_reviews_page(restaurant.id, request.GET.get('reviews_cursor'))
+    except InvalidCursor:
+        return redirect('rr_app:restaurant_detail', restaurant_id=restaurant.id)
     review_form = None
     
     reserve_form = None
+    status = 200
 
     if request.method == 'POST':
         reserve_form = ReservationForm(request.POST, restaurant=restaurant)
@@ -76,10 +101,29 @@ def restaurant_detail_view(request, restaurant_id):
                 reservation = reserve_form.save(commit=False)
                 reservation.customer = customer
                 reservation.restaurant = restaurant
-                reservation.save()
+                session_key = request.session.session_key
+                taken = held_by_others(
+                    restaurant.id, normalize_table_numbers(reservation.table_numbers),
+                    reservation.date, reservation.time, reservation.duration_minutes, session_key,
+                )
+                if taken:
+                    raise tables_taken(taken)
+                check_reservation_tables(reservation, session_key)
+                # Saving holds the tables (signals.py); a conflict rolls the whole booking back
+                with transaction.atomic():
+                    reservation.save()
+                release_session_holds(session_key)
 
                 messages.success(request, f'You will receive an email once your reservation has been confirmed')
                 return redirect('rr_app:restaurant_detail', restaurant_id=restaurant.id)
+            except BookingError as e:
+                status = 409
+                if request.accepts('application/json') and not request.accepts('text/html'):
+                    return JsonResponse(
+                        {'success': False, 'message': str(e), 'table_numbers': e.table_numbers},
+                        status=status,
+                    )
+                messages.error(request, str(e))
             except Exception as e:
                 messages.error(request, f'An error occured during reservation: {str(e)}')
     else:
@@ -91,30 +135,242 @@ def restaurant_detail_view(request, restaurant_id):
 
     context = {
         'restaurant': restaurant,
-        'reviews': reviews,
-        'recent_reviews': recent_reviews,
-        'avg_rating': avg_rating,
+        'reviews': reviews_page,
+        'avg_rating': restaurant.avg_rating,
+        'review_count': restaurant.review_count,
         'review_form': review_form,
         'reserve_form': reserve_form,
     }
-    return render(request, 'rr_app/restaurant/restaurant_detail.html', context)
+    return render(request, 'rr_app/restaurant/restaurant_detail.html', context, status=status)
+
+
+@query_budget(4)
+@login_required
+def restaurant_reviews_view(request, restaurant_id):
+    """Return the next page of a restaurant's reviews as rendered cards plus the cursor after it"""
+    try:
+        page = get_reviews_page(restaurant_id, request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    html = render_to_string('rr_app/restaurant/partials/review_cards.html', {'reviews': page}, request)
+    return JsonResponse({'html': html, 'next_cursor': page.next_cursor, 'has_next': page.has_next})
+
+
+@query_budget(4)
+@login_required
+def restaurant_tables_view(request, restaurant_id):
+    """
+    Floor plan of a restaurant with each table's availability for
+    ?date=YYYY-MM-DD&time=HH:MM&duration=<minutes> (defaults: now, 120 minutes)
+    """
+    try:
+        date, time, duration = parse_sitting(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({
+        'date': date.isoformat(),
+        'time': time.strftime('%H:%M'),
+        'duration': duration,
+        'tables': get_table_availability(restaurant_id, date, time, duration, request.session.session_key),
+    })
+
+
+@query_budget(3)
+@login_required
+@require_POST
+def restaurant_table_hold_view(request, restaurant_id):
+    """
+    Hold table_numbers (comma separated) for the date, time and duration
+    of the form for SOFT_HOLD_SECONDS while the guest completes it. Holding
+    no tables releases the session's holds. Holds live in the cache only.
+    """
+    try:
+        date, time, duration = parse_sitting(request.POST)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    numbers = normalize_table_numbers(request.POST.get('table_numbers', '').split(','))
+    if len(numbers) > MAX_HELD_TABLES:
+        return JsonResponse({'success': False, 'message': f'At most {MAX_HELD_TABLES} tables can be held.'}, status=400)
+
+    if not request.session.session_key:
+        request.session.save()
+    taken = hold_for_session(request.session.session_key, restaurant_id, numbers, date, time, duration)
+    if taken:
+        error = tables_taken(taken)
+        return JsonResponse({'success': False, 'message': str(error), 'table_numbers': error.table_numbers}, status=409)
+    return JsonResponse({'success': True, 'table_numbers': numbers, 'expires_in': SOFT_HOLD_SECONDS})
+
+
+@query_budget(4)
+@login_required
+def restaurant_table_suggestion_view(request, restaurant_id):
+    """
+    The free tables seating ?guests=<n> with the fewest empty seats for
+    ?date=YYYY-MM-DD&time=HH:MM&duration=<minutes>; no tables when none fit
+    """
+    try:
+        date, time, duration = parse_sitting(request.GET)
+        guests = int(request.GET.get('guests') or 0)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    if guests < 1:
+        return JsonResponse({'success': False, 'message': 'guests must be at least 1.'}, status=400)
+
+    tables = suggest_tables(restaurant_id, date, time, duration, guests, request.session.session_key)
+    return JsonResponse({
+        'guests': guests,
+        'tables': tables,
+        'empty_seats': wasted_seats(tables, guests) if tables else None,
+    })
 
 
+@query_budget(4)
+@login_required
+def restaurant_calendar_view(request, restaurant_id):
+    """
+    Remaining tables and seats per day and per slot of ?month=YYYY-MM
+    (default: the current month), for picking a reservation date
+    """
+    try:
+        year, month = parse_month(request.GET.get('month'))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'month must be formatted as YYYY-MM.'}, status=400)
+    return JsonResponse(get_month_availability(restaurant_id, year, month))
+
+
+# The budget only covers building the response; the export query runs while the
+# body streams, after QueryBudgetMiddleware has stopped counting
+@query_budget(4)
+@login_required
+def restaurant_reservations_export_view(request, restaurant_id):
+    """
+    Staff only: stream the restaurant's reservations from ?start to ?end
+    (YYYY-MM-DD, default today) as ?format=csv (default) or ics
+    """
+    if not (request.user.is_staff or request.user.role == UserRole.ADMIN):
+        raise PermissionDenied
+    restaurant = get_object_or_404(Restaurant.objects.only('id', 'name'), id=restaurant_id)
+
+    fmt = request.GET.get('format', 'csv')
+    try:
+        start = date_type.fromisoformat(request.GET['start']) if request.GET.get('start') else timezone.localdate()
+        end = date_type.fromisoformat(request.GET['end']) if request.GET.get('end') else start
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'start and end must be formatted as YYYY-MM-DD.'}, status=400)
+    if fmt not in EXPORT_FORMATS or end < start:
+        return JsonResponse({'success': False, 'message': 'Invalid export format or date range.'}, status=400)
+
+    response = StreamingHttpResponse(
+        export_lines(fmt, restaurant.id, start, end, calendar_name=f'{restaurant.name} reservations'),
+        content_type=CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(restaurant.id, start, end, fmt)}"'
+    return response
+
+
+@query_budget(10)
 def restaurants_view(request):
-    restaurants = Restaurant.objects.annotate(
-        avg_rating=Avg('reviews__rating'),
-        review_count=Count('reviews')
-    ).select_related().prefetch_related('cuisines', 'tags')
-    
     # Get all cuisines and tags for filters
     cuisines = Cuisine.objects.all().order_by('name')
     tags = Tags.objects.all().order_by('tag')
-    
-    restaurant_list = [r.to_dict() for r in restaurants]
+
+    # Only the first page is embedded; filter.js fetches the rest from restaurant_list_api_view
+    first_page = get_restaurant_page_json()
     context = {
-        'restaurants': restaurant_list,
+        'restaurants_json': escape_json_for_script(first_page),
         'cuisines': cuisines,
         'tags': tags,
     }
     return render(request, 'rr_app/restaurant/restaurants.html', context)
 
+
+@query_budget(8)
+def restaurant_list_api_view(request):
+    """Return one page of filtered and sorted restaurants as JSON"""
+    params = request.GET
+    price_low, price_high = parse_budget(params)
+    try:
+        body = get_restaurant_page_json(
+            cuisine_ids=parse_id_list(params, 'cuisines'),
+            tag_ids=parse_id_list(params, 'tags'),
+            sort_by=params.get('sort_by', 'newest'),
+            order=params.get('order', 'asc'),
+            cursor=params.get('cursor'),
+            page_size=parse_page_size(params.get('page_size')),
+            price_low=price_low,
+            price_high=price_high,
+            open_now=parse_flag(params.get('open_now')),
+        )
+    except InvalidCursor as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    # The body is JSON text built by the database; no re-serialization needed
+    return HttpResponse(body, content_type='application/json')
+
+
+@query_budget(6)
+def restaurant_facets_api_view(request):
+    """
+    Return per-cuisine and per-tag restaurant counts and the price histogram
+    for the current filter selection
+    """
+    price_low, price_high = parse_budget(request.GET)
+    facets = get_facet_counts(
+        cuisine_ids=parse_id_list(request.GET, 'cuisines'),
+        tag_ids=parse_id_list(request.GET, 'tags'),
+        price_low=price_low,
+        price_high=price_high,
+    )
+    return JsonResponse(facets)
+
+
+@query_budget(12)
+def restaurant_search_view(request):
+    """Full-text restaurant search results page"""
+    query = request.GET.get('q', '').strip()
+    price_low, price_high = parse_budget(request.GET)
+    results = None
+    if query:
+        results = search_restaurants(
+            query, page=request.GET.get('page', 1), price_low=price_low, price_high=price_high,
+        )
+        # Nothing matched the exact words, likely a misspelling
+        if not results['count']:
+            results = fuzzy_search_restaurants(query, price_low=price_low, price_high=price_high)
+
+    context = {
+        'query': query,
+        'results': results,
+        'price_min': price_low,
+        'price_max': price_high,
+        # Carried over to the pagination links
+        'budget_query': ''.join(
+            f'&{key}={value}'
+            for key, value in (('price_min', price_low), ('price_max', price_high))
+            if value is not None
+        ),
+    }
+    return render(request, 'rr_app/restaurant/restaurant_search_result.html', context)
+
+
+@query_budget(10)
+def restaurant_search_api_view(request):
+    """
+    Return ranked search results as JSON.
+    mode=fuzzy switches to typo-tolerant trigram matching (top page_size matches).
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'success': False, 'message': 'Search query is required.'}, status=400)
+
+    page_size = parse_page_size(request.GET.get('page_size'))
+    price_low, price_high = parse_budget(request.GET)
+    if request.GET.get('mode') == 'fuzzy':
+        payload = fuzzy_search_restaurants(
+            query, limit=page_size, price_low=price_low, price_high=price_high,
+        )
+    else:
+        payload = search_restaurants(
+            query, page=request.GET.get('page', 1), page_size=page_size,
+            price_low=price_low, price_high=price_high,
+        )
+    return JsonResponse(payload)
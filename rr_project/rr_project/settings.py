@@ -31,6 +31,9 @@ DEBUG = False
 
 ALLOWED_HOSTS = ['restores.onrender.com']
 
+# Prefix of the absolute URLs in emails; mail clients cannot load relative ones
+SITE_URL = config('SITE_URL', default='https://restores.onrender.com')
+
 # Media
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/') 
@@ -51,9 +54,12 @@ if not SUPABASE_URL or not SUPABASE_ANON_KEY:
 
 # Email Configuration for password reset
 # EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
+# Emails are queued in the outbox and sent by `manage.py send_outbox_emails`.
+# A local SMTP stand-in works with EMAIL_HOST=localhost EMAIL_USE_TLS=False.
 EMAIL_HOST = config('EMAIL_HOST')
-EMAIL_PORT = config('EMAIL_PORT')
-EMAIL_USE_TLS = True
+EMAIL_PORT = config('EMAIL_PORT', cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
+EMAIL_TIMEOUT = 30
 EMAIL_HOST_USER = config('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL')
@@ -74,6 +80,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rr_app',
 ]
 
@@ -86,8 +93,14 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'rr_app.middleware.QueryBudgetMiddleware',
 ]
 
+# SQL query budgets (see rr_app/utils/query_budget.py)
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_STRICT = False
+QUERY_BUDGET_N_PLUS_ONE_THRESHOLD = 5
+
 ROOT_URLCONF = 'rr_project.urls'
 
 TEMPLATES = [
@@ -120,6 +133,46 @@ DATABASES = {
 print(DATABASES)
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Soft table holds, leaderboard and facet counts live here. Without REDIS_URL
+# each process gets its own local memory cache, which is fine for development.
+
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Rate limit counters (see rr_app/utils/rate_limit.py). Local memory counts
+# per worker process; RATELIMIT_CACHE_DIR switches to a file-based cache
+# shared by the workers of one host. With Redis they share the default cache.
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+RATELIMIT_CACHE = 'default'
+RATELIMIT_CACHE_DIR = config('RATELIMIT_CACHE_DIR', default='')
+if RATELIMIT_CACHE_DIR and not REDIS_URL:
+    CACHES['ratelimit'] = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': RATELIMIT_CACHE_DIR,
+    }
+    RATELIMIT_CACHE = 'ratelimit'
+# Proxies in front of the app that append the client address to X-Forwarded-For.
+# Render puts one in front of every web service; with 0 the limiter would key
+# on the proxy's address and every client would share one bucket. Requests
+# that did not come through the proxies (runserver) fall back to REMOTE_ADDR.
+RATELIMIT_PROXY_COUNT = config('RATELIMIT_PROXY_COUNT', default=1, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -1,6 +1,13 @@
 document.addEventListener('DOMContentLoaded', () => {
-    const restaurants = JSON.parse(document.getElementById('restaurant-data').textContent);
-    render(restaurants);
+    const grid = document.querySelector('.restaurants-grid');
+    const apiUrl = grid.dataset.apiUrl;
+    const facetsUrl = grid.dataset.facetsUrl;
+    const resultsCount = document.querySelector('.results-count');
+    const loadMoreBtn = document.querySelector('.load-more');
+
+    const dataEl = document.getElementById('restaurant-data');
+    const firstPage = dataEl ? JSON.parse(dataEl.textContent) : null;
+
     const cuisineFContainer = document.querySelector('.cuisines-filter');
     const tagsFContainer = document.querySelector('.tags-filter');
     // Get all checked inputs inside it
@@ -12,11 +19,23 @@ document.addEventListener('DOMContentLoaded', () => {
         tagsFContainer.querySelectorAll('input[name="tags"]')
     );
 
+    const priceMinInput = document.querySelector('input[name="price_min"]');
+    const priceMaxInput = document.querySelector('input[name="price_max"]');
+    const priceHistogram = document.querySelector('.price-histogram');
+    const openNowInput = document.querySelector('input[name="open_now"]');
+
     let checkedCuisines = [];
     let checkedTags = [];
     let sortBy = 'newest';
     let sortOrder = "asc";
+    let nextCursor = null;
+    // Incremented on every new query so stale responses are ignored
+    let requestId = 0;
 
+    if (firstPage) {
+        showPage(firstPage, false);
+    }
+    refreshFacets();
 
     cuisines.forEach(c => {
         c.addEventListener('change', () => {
@@ -24,7 +43,6 @@ document.addEventListener('DOMContentLoaded', () => {
             if (c.checked) {
                 if (!checkedCuisines.includes(cuisineId)) {
                     checkedCuisines.push(cuisineId);
-                    console.log("pushed: ", cuisineId);
                 }
             } else {
                 checkedCuisines = checkedCuisines.filter(v => v !== cuisineId);
@@ -47,6 +65,10 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    [priceMinInput, priceMaxInput, openNowInput].forEach(input => {
+        input.addEventListener('change', applyFiltersAndSort);
+    });
+
     // Sort by radio buttons
     const sortByRadios = Array.from(document.querySelectorAll('input[name="sort_by"]'));
     sortByRadios.forEach(radio => {
@@ -69,67 +91,116 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    loadMoreBtn.addEventListener('click', () => {
+        fetchPage(nextCursor, true);
+    });
+
     function applyFiltersAndSort() {
-        let filtered = filterRestaurants(restaurants, checkedCuisines, checkedTags);
-        if (sortBy) {
-            filtered = sortRestaurants(filtered, sortBy, sortOrder);
-        }
-        render(filtered);
+        fetchPage(null, false);
+        refreshFacets();
     }
-})
-
 
+    function filterParams() {
+        const params = new URLSearchParams();
+        checkedCuisines.forEach(id => params.append('cuisines', id));
+        checkedTags.forEach(id => params.append('tags', id));
+        if (priceMinInput.value) {
+            params.set('price_min', priceMinInput.value);
+        }
+        if (priceMaxInput.value) {
+            params.set('price_max', priceMaxInput.value);
+        }
+        return params;
+    }
 
-function filterRestaurants(restaurants, cuisines, tags) {
-    // cuisines and tags are arrays of selected IDs/values
-    console.log('cusines checked: ', cuisines);
-    return restaurants.filter(restaurant => {
-        // Check if restaurant has at least one of the selected cuisines
-        console.log('cusines: ', restaurant.cuisines);
-        const matchesCuisine = cuisines.length === 0 || restaurant.cuisines.some(c => cuisines.includes(c.id));
-        console.log('matches:', matchesCuisine);
-        // Check if restaurant has at least one of the selected tags
-        const matchesTags = tags.length === 0 || restaurant.tags.some(t => tags.includes(t.id));
+    function buildQuery(cursor) {
+        const params = filterParams();
+        // Opening hours change over time, so they are not part of the cached facet counts
+        if (openNowInput.checked) {
+            params.set('open_now', '1');
+        }
+        params.set('sort_by', sortBy);
+        params.set('order', sortOrder);
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        return params.toString();
+    }
 
-        // Keep restaurant only if it matches both
-        return matchesCuisine && matchesTags;
-    });
-}
+    async function fetchPage(cursor, append) {
+        const thisRequest = ++requestId;
+        loadMoreBtn.disabled = true;
+        try {
+            const response = await fetch(`${apiUrl}?${buildQuery(cursor)}`, {
+                headers: { 'Accept': 'application/json' }
+            });
+            const data = await response.json();
+            if (thisRequest === requestId) {
+                showPage(data, append);
+            }
+        } catch (error) {
+            console.error('Failed to load restaurants:', error);
+        } finally {
+            loadMoreBtn.disabled = false;
+        }
+    }
 
-function sortRestaurants(restaurants, sortBy, sortOrder) {
-    const sorted = [...restaurants];
-    const isAsc = sortOrder === 'asc';
-
-    sorted.sort((a, b) => {
-        let compareValue = 0;
-
-        switch (sortBy) {
-            case 'newest':
-                // Sort by ID (assuming higher ID = newer)
-                compareValue = a.id - b.id;
-                break;
-            case 'rating':
-                // Sort by average rating
-                compareValue = (Number(a.avg_rating) || 0) - (Number(b.avg_rating) || 0);
-                break;
-            case 'bookmarks':
-                // Sort by bookmark count
-                compareValue = (a.bookmark_count || 0) - (b.bookmark_count || 0);
-                break;
-            default:
-                return 0;
+    async function refreshFacets() {
+        try {
+            const response = await fetch(`${facetsUrl}?${filterParams().toString()}`, {
+                headers: { 'Accept': 'application/json' }
+            });
+            const facets = await response.json();
+            showFacetCounts(cuisines, facets.cuisines);
+            showFacetCounts(tags, facets.tags);
+            showPriceHistogram(facets.price_histogram || []);
+        } catch (error) {
+            console.error('Failed to load filter counts:', error);
         }
+    }
 
-        return isAsc ? compareValue : -compareValue;
-    });
+    function showFacetCounts(inputs, counts) {
+        inputs.forEach(input => {
+            const countEl = input.parentElement.querySelector('.facet-count');
+            if (countEl) {
+                countEl.textContent = `(${counts[input.value] || 0})`;
+            }
+        });
+    }
 
-    return sorted;
-}
+    function showPriceHistogram(buckets) {
+        priceHistogram.innerHTML = '';
+        const highest = Math.max(1, ...buckets.map(b => b.count));
+        buckets.forEach(bucket => {
+            const bar = document.createElement('button');
+            bar.type = 'button';
+            bar.className = 'price-bucket';
+            bar.style.height = `${Math.round(bucket.count / highest * 100)}%`;
+            bar.title = `₱${Math.trunc(bucket.min)} - ₱${Math.trunc(bucket.max)} (${bucket.count})`;
+            // Clicking a bar narrows the budget to that bucket
+            bar.addEventListener('click', () => {
+                priceMinInput.value = Math.trunc(bucket.min);
+                priceMaxInput.value = Math.ceil(bucket.max);
+                applyFiltersAndSort();
+            });
+            priceHistogram.append(bar);
+        });
+    }
+
+    function showPage(data, append) {
+        nextCursor = data.next_cursor;
+        resultsCount.textContent = `${data.count} restaurants found`;
+        loadMoreBtn.hidden = !data.has_next;
+        render(data.results, append);
+    }
+})
 
 
-function render(restaurants) {
+function render(restaurants, append = false) {
     const grid = document.querySelector('.restaurants-grid');
-    grid.innerHTML = '';
+    if (!append) {
+        grid.innerHTML = '';
+    }
     restaurants.forEach(restaurant => {
         const card = createRestaurantCard(restaurant);
         card.addEventListener('click', () => {
@@ -137,6 +208,9 @@ function render(restaurants) {
         });
         grid.append(card);
     });
+    if (typeof initStars === 'function') {
+        initStars();
+    }
 }
 
 function createRestaurantCard(restaurant) {
@@ -2,6 +2,7 @@
 
 document.addEventListener('DOMContentLoaded', function () {
     initializeTableSelection();
+    initializeDateAvailability();
 });
 
 // Table Selection System
@@ -37,17 +38,162 @@ function updateTableStates(tables, selectedTables, guestCount) {
     });
 }
 
+// Floor plan rendering
+
+// Chair layouts of the table shapes, picked by capacity
+const TABLE_SHAPES = [
+    { max: 2, size: 2, svg: `<svg width="40" height="60" viewBox="0 0 40 60">
+        <rect x="10" y="20" width="20" height="20" rx="4" fill="currentColor"/>
+        <circle cx="15" cy="15" r="3" fill="currentColor"/>
+        <circle cx="25" cy="15" r="3" fill="currentColor"/>
+    </svg>` },
+    { max: 4, size: 4, svg: `<svg width="60" height="80" viewBox="0 0 60 80">
+        <rect x="15" y="25" width="30" height="30" rx="6" fill="currentColor"/>
+        <circle cx="20" cy="15" r="4" fill="currentColor"/>
+        <circle cx="40" cy="15" r="4" fill="currentColor"/>
+        <circle cx="20" cy="65" r="4" fill="currentColor"/>
+        <circle cx="40" cy="65" r="4" fill="currentColor"/>
+    </svg>` },
+    { max: 6, size: 6, svg: `<svg width="80" height="100" viewBox="0 0 80 100">
+        <rect x="20" y="30" width="40" height="40" rx="8" fill="currentColor"/>
+        <circle cx="25" cy="15" r="5" fill="currentColor"/>
+        <circle cx="55" cy="15" r="5" fill="currentColor"/>
+        <circle cx="15" cy="50" r="5" fill="currentColor"/>
+        <circle cx="65" cy="50" r="5" fill="currentColor"/>
+        <circle cx="25" cy="85" r="5" fill="currentColor"/>
+        <circle cx="55" cy="85" r="5" fill="currentColor"/>
+    </svg>` },
+    { max: Infinity, size: 8, svg: `<svg width="100" height="120" viewBox="0 0 100 120">
+        <rect x="25" y="35" width="50" height="50" rx="10" fill="currentColor"/>
+        <circle cx="30" cy="15" r="6" fill="currentColor"/>
+        <circle cx="50" cy="15" r="6" fill="currentColor"/>
+        <circle cx="70" cy="15" r="6" fill="currentColor"/>
+        <circle cx="15" cy="40" r="6" fill="currentColor"/>
+        <circle cx="85" cy="40" r="6" fill="currentColor"/>
+        <circle cx="15" cy="80" r="6" fill="currentColor"/>
+        <circle cx="85" cy="80" r="6" fill="currentColor"/>
+        <circle cx="50" cy="105" r="6" fill="currentColor"/>
+    </svg>` },
+];
+
+function createTableElement(table) {
+    const shape = TABLE_SHAPES.find(s => table.capacity <= s.max);
+    const el = document.createElement('div');
+    el.className = `table table-${shape.size} ${table.available ? 'available' : 'reserved'}`;
+    el.dataset.table = table.number;
+    el.dataset.capacity = table.capacity;
+    el.style.top = `${table.y}px`;
+    el.style.left = `${table.x}px`;
+    el.innerHTML = shape.svg;
+    const label = document.createElement('span');
+    label.className = 'table-number';
+    label.textContent = table.number;
+    el.append(label);
+    return el;
+}
+
 // Hook into click and guest count change
 function initializeTableSelection() {
-    const tables = document.querySelectorAll('.table.available');
+    const container = document.querySelector('.floor-tables');
     const selectedTableInput = document.getElementById('selected-table');
     const tableStatusElement = document.getElementById('table-status');
     const reserveBtn = document.getElementById('reserve-btn');
     const guestCountSelect = document.querySelector('[name="guest_count"]');
+    const dateInput = document.querySelector('[name="date"]');
+    const timeInput = document.querySelector('[name="time"]');
     const tableSelectionInfo = document.getElementById('selected-table-info');
     const tableNum = document.getElementById('table_num');
 
+    if (!container) return;
+
     let selectedTables = [];
+    let requestId = 0;
+    let holdTimer = null;
+    let heldKey = '';
+
+    function availableTables() {
+        return container.querySelectorAll('.table.available');
+    }
+
+    function sittingParams() {
+        const params = new URLSearchParams();
+        if (dateInput && dateInput.value) params.set('date', dateInput.value);
+        if (timeInput && timeInput.value) params.set('time', timeInput.value);
+        return params;
+    }
+
+    // Keep the selected tables soft-held on the server while the form is filled in
+    function scheduleHold() {
+        if (!container.dataset.holdUrl) return;
+        clearTimeout(holdTimer);
+        holdTimer = setTimeout(holdSelection, 300);
+    }
+
+    async function holdSelection() {
+        const params = sittingParams();
+        params.set('table_numbers', selectedTables.map(t => t.number).join(','));
+        const key = params.toString();
+        if (key === heldKey) return;
+        heldKey = key;
+
+        const csrfInput = document.querySelector('[name="csrfmiddlewaretoken"]');
+        try {
+            const response = await fetch(container.dataset.holdUrl, {
+                method: 'POST',
+                headers: {
+                    'Accept': 'application/json',
+                    'X-CSRFToken': csrfInput ? csrfInput.value : '',
+                },
+                body: params,
+            });
+            if (response.status === 409) {
+                const data = await response.json();
+                heldKey = '';
+                if (window.Notifications) window.Notifications.show(data.message, 'error');
+                // Someone else is booking those tables: drop them and redraw
+                const taken = new Set(data.table_numbers);
+                selectedTables = selectedTables.filter(t => !taken.has(t.number));
+                loadFloorPlan();
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+        } catch (error) {
+            heldKey = '';
+            console.error('Failed to hold tables:', error);
+        }
+    }
+
+    // Pre-select the combination the server finds wastes the fewest seats,
+    // unless the guest already picked tables
+    async function suggestTables() {
+        if (!container.dataset.suggestUrl || !guestCountSelect || selectedTables.length) return;
+        const thisRequest = requestId;
+        const params = sittingParams();
+        params.set('guests', guestCountSelect.value);
+
+        try {
+            const response = await fetch(`${container.dataset.suggestUrl}?${params.toString()}`, {
+                headers: { 'Accept': 'application/json' }
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const data = await response.json();
+            if (thisRequest !== requestId || selectedTables.length) return;
+
+            data.tables.forEach(table => {
+                const el = container.querySelector(`.table.available[data-table="${CSS.escape(table.number)}"]`);
+                if (!el) return;
+                el.classList.add('selected');
+                selectedTables.push({ element: el, number: table.number, capacity: table.capacity });
+            });
+            refreshUI();
+        } catch (error) {
+            console.error('Failed to load table suggestion:', error);
+        }
+    }
 
     function refreshUI() {
         const totalCapacity = selectedTables.reduce((sum, t) => sum + t.capacity, 0);
@@ -56,10 +202,8 @@ function initializeTableSelection() {
 
         // Update input
         if (selectedTableInput) selectedTableInput.value = selectedTables.map(t => t.number).join(',');
-        if (tableNum){
-            tableNum.value = selectedTables.map(t => t.number).join(',');
-            console.log("table numbers", tableNum.value);
-        }
+        if (tableNum) tableNum.value = selectedTables.map(t => t.number).join(',');
+
         // Update table status
         if (tableStatusElement) {
             if (tableCount > 0) {
@@ -86,47 +230,169 @@ function initializeTableSelection() {
         }
 
         // Update table highlighting
-        if (guestCountSelect) updateTableStates(tables, selectedTables, guestCount);
+        if (guestCountSelect) updateTableStates(availableTables(), selectedTables, guestCount);
+
+        scheduleHold();
     }
 
-    tables.forEach(table => {
-        table.addEventListener('click', function () {
-            const tableNumber = this.dataset.table;
-            const tableCapacity = parseInt(this.dataset.capacity);
-            const tableIndex = selectedTables.findIndex(t => t.element === this);
-
-            if (tableIndex > -1) {
-                selectedTables.splice(tableIndex, 1);
-                this.classList.remove('selected');
-            } else {
-                selectedTables.push({ element: this, number: tableNumber, capacity: tableCapacity });
-                this.classList.add('selected');
+    // Fetch the tables free for the chosen date and time and redraw the floor plan
+    async function loadFloorPlan() {
+        const thisRequest = ++requestId;
+        const params = sittingParams();
+
+        try {
+            const response = await fetch(`${container.dataset.url}?${params.toString()}`, {
+                headers: { 'Accept': 'application/json' }
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
             }
+            const data = await response.json();
+            if (thisRequest !== requestId) return;
 
+            const keep = new Set(selectedTables.map(t => t.number));
+            container.innerHTML = '';
+            selectedTables = [];
+            data.tables.forEach(table => {
+                const el = createTableElement(table);
+                // Keep a previous selection while the table is still free
+                if (table.available && keep.has(table.number)) {
+                    el.classList.add('selected');
+                    selectedTables.push({ element: el, number: table.number, capacity: table.capacity });
+                }
+                container.append(el);
+            });
+            if (!data.tables.length && tableSelectionInfo) {
+                tableSelectionInfo.innerHTML = '<p style="color: #666;">This restaurant has not set up its floor plan yet</p>';
+                return;
+            }
             refreshUI();
-        });
+            suggestTables();
+        } catch (error) {
+            console.error('Failed to load table availability:', error);
+        }
+    }
 
-        table.addEventListener('mouseenter', function () {
-            if (tableSelectionInfo && !this.classList.contains('reserved')) {
-                const isSelected = this.classList.contains('selected');
-                tableSelectionInfo.dataset.originalContent = tableSelectionInfo.innerHTML;
-                tableSelectionInfo.innerHTML = `<p style="color: var(--table-hover); font-weight: 600;">Table ${this.dataset.table} - Capacity: ${this.dataset.capacity} guests (Click to ${isSelected ? 'deselect' : 'select'})</p>`;
-            }
-        });
+    container.addEventListener('click', function (event) {
+        const table = event.target.closest('.table.available');
+        if (!table) return;
 
-        table.addEventListener('mouseleave', function () {
-            if (tableSelectionInfo && tableSelectionInfo.dataset.originalContent) {
-                setTimeout(() => {
-                    tableSelectionInfo.innerHTML = tableSelectionInfo.dataset.originalContent;
-                }, 100);
-            }
-        });
+        const tableIndex = selectedTables.findIndex(t => t.element === table);
+        if (tableIndex > -1) {
+            selectedTables.splice(tableIndex, 1);
+            table.classList.remove('selected');
+        } else {
+            selectedTables.push({ element: table, number: table.dataset.table, capacity: parseInt(table.dataset.capacity) });
+            table.classList.add('selected');
+        }
+
+        refreshUI();
+    });
+
+    container.addEventListener('mouseover', function (event) {
+        const table = event.target.closest('.table');
+        if (!table || table.contains(event.relatedTarget)) return;
+        if (tableSelectionInfo && !table.classList.contains('reserved')) {
+            const isSelected = table.classList.contains('selected');
+            tableSelectionInfo.dataset.originalContent = tableSelectionInfo.innerHTML;
+            tableSelectionInfo.innerHTML = `<p style="color: var(--table-hover); font-weight: 600;">Table ${table.dataset.table} - Capacity: ${table.dataset.capacity} guests (Click to ${isSelected ? 'deselect' : 'select'})</p>`;
+        }
+    });
+
+    container.addEventListener('mouseout', function (event) {
+        const table = event.target.closest('.table');
+        if (!table || table.contains(event.relatedTarget)) return;
+        if (tableSelectionInfo && tableSelectionInfo.dataset.originalContent) {
+            setTimeout(() => {
+                tableSelectionInfo.innerHTML = tableSelectionInfo.dataset.originalContent;
+            }, 100);
+        }
     });
 
     if (guestCountSelect) {
-        guestCountSelect.addEventListener('change', refreshUI);
+        guestCountSelect.addEventListener('change', function () {
+            refreshUI();
+            suggestTables();
+        });
     }
+    [dateInput, timeInput].forEach(input => {
+        if (input) input.addEventListener('change', loadFloorPlan);
+    });
 
     // Initial UI refresh
     refreshUI();
-}
\ No newline at end of file
+    loadFloorPlan();
+}
+
+// Month availability: tells the guest whether the picked date still has room
+// and suggests the slots with enough free seats for the party
+function initializeDateAvailability() {
+    const calendar = document.querySelector('.reservation-calendar');
+    const dateInput = document.querySelector('[name="date"]');
+    const timeInput = document.querySelector('[name="time"]');
+    const guestCountSelect = document.querySelector('[name="guest_count"]');
+    const hint = document.getElementById('date-availability');
+    const slotList = document.getElementById('free-slots');
+
+    if (!calendar || !dateInput || !hint) return;
+
+    // One request per month, shared by every date of it
+    const months = new Map();
+
+    function loadMonth(month) {
+        if (!months.has(month)) {
+            const request = fetch(`${calendar.dataset.url}?month=${month}`, {
+                headers: { 'Accept': 'application/json' }
+            }).then(response => {
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                return response.json();
+            });
+            // Drop failed months so the next change retries
+            request.catch(() => months.delete(month));
+            months.set(month, request);
+        }
+        return months.get(month);
+    }
+
+    async function showAvailability() {
+        const date = dateInput.value;
+        hint.textContent = '';
+        hint.classList.remove('full');
+        if (slotList) slotList.innerHTML = '';
+        if (!date) return;
+
+        const guests = guestCountSelect ? parseInt(guestCountSelect.value) || 1 : 1;
+        try {
+            const data = await loadMonth(date.slice(0, 7));
+            if (dateInput.value !== date) return;
+            const day = data.days.find(d => d.date === date);
+            if (!day || !day.slots.length) {
+                hint.textContent = 'Closed on this day';
+                hint.classList.add('full');
+                return;
+            }
+
+            const freeSlots = day.slots.filter(slot => slot.free_seats >= guests && slot.free_tables > 0);
+            if (!freeSlots.length) {
+                hint.textContent = `Fully booked for ${guests} guest${guests > 1 ? 's' : ''}`;
+                hint.classList.add('full');
+                return;
+            }
+            hint.textContent = `${freeSlots.length} time slot${freeSlots.length > 1 ? 's' : ''} available`;
+            if (slotList && timeInput) {
+                freeSlots.forEach(slot => {
+                    const option = document.createElement('option');
+                    option.value = slot.time;
+                    slotList.append(option);
+                });
+                timeInput.setAttribute('list', slotList.id);
+            }
+        } catch (error) {
+            console.error('Failed to load date availability:', error);
+        }
+    }
+
+    dateInput.addEventListener('change', showAvailability);
+    if (guestCountSelect) guestCountSelect.addEventListener('change', showAvailability);
+    showAvailability();
+}
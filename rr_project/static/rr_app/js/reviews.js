@@ -0,0 +1,55 @@
+// Restaurant detail - load more reviews when the end of the list scrolls into view
+
+document.addEventListener('DOMContentLoaded', () => {
+    const moreLink = document.querySelector('.more-reviews');
+    const grid = document.querySelector('.reviews-grid');
+    if (!moreLink || !grid || !('IntersectionObserver' in window)) {
+        // Without JS support the link still pages through the reviews
+        return;
+    }
+
+    const url = moreLink.dataset.url;
+    let cursor = moreLink.dataset.cursor;
+    let loading = false;
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMore();
+        }
+    }, { rootMargin: '200px' });
+    observer.observe(moreLink);
+
+    moreLink.addEventListener('click', (event) => {
+        event.preventDefault();
+        loadMore();
+    });
+
+    async function loadMore() {
+        if (loading || !cursor) {
+            return;
+        }
+        loading = true;
+        try {
+            const response = await fetch(`${url}?cursor=${encodeURIComponent(cursor)}`, {
+                headers: { 'Accept': 'application/json' }
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            const data = await response.json();
+            grid.insertAdjacentHTML('beforeend', data.html);
+            cursor = data.next_cursor;
+            if (typeof initStars === 'function') {
+                initStars();
+            }
+            if (!data.has_next) {
+                observer.disconnect();
+                moreLink.remove();
+            }
+        } catch (error) {
+            console.error('Failed to load reviews:', error);
+        } finally {
+            loading = false;
+        }
+    }
+});